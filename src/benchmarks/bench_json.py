@@ -0,0 +1,101 @@
+"""
+Micro-benchmark of the JSON codec of an API page.
+
+Encoding compares what the server used to do (validating and serializing the
+pydantic models of the page) with dumping pre-serialized dicts with the standard
+library, pydantic-core (the server fallback) and orjson. Decoding compares the standard library with orjson,
+as used by the fetcher.
+
+Usage (from the `src` directory):
+    python -m benchmarks.bench_json --page-size 100 --pages 200
+"""
+
+import argparse
+import json
+import time
+from typing import Callable, List
+
+import pydantic_core
+from pydantic import BaseModel, TypeAdapter
+
+from moovitamix_fastapi.classes_out import TracksOut
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+class TracksPage(BaseModel):
+    """The layout of a fastapi_pagination page of tracks."""
+
+    items: List[TracksOut]
+    total: int
+    page: int
+    size: int
+    pages: int
+
+
+def time_pages(function: Callable[[], object], pages: int, repeat: int) -> float:
+    """
+    Returns the best number of pages processed per second over `repeat` runs.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(pages):
+            function()
+        best = min(best, time.perf_counter() - start)
+    return pages / best
+
+
+def run(page_size: int, pages: int, repeat: int) -> dict:
+    tracks = [TracksOut.generate_fake() for _ in range(page_size)]
+    page_fields = {"total": page_size * pages, "page": 1, "size": page_size, "pages": pages}
+    payload = {"items": [track.model_dump(mode="json") for track in tracks], **page_fields}
+    page_adapter = TypeAdapter(TracksPage)
+    body = json.dumps(payload).encode()
+
+    results = {
+        "page_size": page_size,
+        "body_bytes": len(body),
+        "encode_pages_per_second": {
+            "pydantic": time_pages(lambda: page_adapter.dump_json(page_adapter.validate_python({"items": tracks, **page_fields})), pages, repeat),
+            "json": time_pages(lambda: json.dumps(payload).encode(), pages, repeat),
+            "pydantic_core": time_pages(lambda: pydantic_core.to_json(payload), pages, repeat),
+        },
+        "decode_pages_per_second": {
+            "json": time_pages(lambda: json.loads(body), pages, repeat),
+        },
+    }
+    if orjson is not None:
+        results["encode_pages_per_second"]["orjson"] = time_pages(lambda: orjson.dumps(payload), pages, repeat)
+        results["decode_pages_per_second"]["orjson"] = time_pages(lambda: orjson.loads(body), pages, repeat)
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the JSON encoding and decoding of an API page.")
+    parser.add_argument("--page-size", type=int, default=100, help="Number of records per page.")
+    parser.add_argument("--pages", type=int, default=200, help="Number of pages encoded and decoded per run.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs, the best one is kept.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args()
+
+    results = run(args.page_size, args.pages, args.repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{results['page_size']} records per page, {results['body_bytes']:,} bytes")
+    for stage in ("encode", "decode"):
+        for codec, pages_per_second in results[f"{stage}_pages_per_second"].items():
+            print(f"{stage} {codec:>13}: {pages_per_second:,.0f} pages/s")
+    if orjson is None:
+        print("orjson is not installed, install it with `pip install orjson` to compare it.")
+
+
+if __name__ == "__main__":
+    main()
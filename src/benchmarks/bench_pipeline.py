@@ -0,0 +1,333 @@
+"""
+End-to-end benchmark of the ingestion pipeline.
+
+Starts the MooVitamix API with uvicorn on a random local port, serving a
+generated dataset of the requested size, then runs `DataPipeline` against each
+storage backend. Every backend runs in its own subprocess, so that its peak RSS
+is measured in isolation, and on an empty storage directory.
+
+For each backend, the report gives the rows and pages per second, the peak RSS
+and the time spent in each stage (fetch, clean, save). In streaming or parallel
+mode the stages overlap, so their sum may exceed the wall-clock time, as with
+--workers where the shards of a category are cleaned and saved concurrently (the
+peak RSS is then the one of the pipeline process only).
+
+Usage (from the `src` directory):
+    python -m benchmarks.bench_pipeline --size 100000 --backends csv,parquet,sqlite,duckdb --output bench.json
+
+or `python src/main.py bench ...` with the same options.
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from logger.logger_config import configure_logging
+
+SRC_DIR = Path(__file__).resolve().parents[1]
+API_DIR = SRC_DIR / "moovitamix_fastapi"
+BACKENDS = ("csv", "parquet", "sqlite", "duckdb")
+
+
+class StageTimer:
+    """
+    Accumulates the time spent in the calls of each pipeline stage.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        totals = self.stages.setdefault(stage, {"seconds": 0.0, "calls": 0})
+        totals["seconds"] += seconds
+        totals["calls"] += 1
+
+    def wrap(self, stage: str, function):
+        """
+        Returns `function` timed under `stage`.
+        """
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        return timed
+
+    def wrap_pages(self, stage: str, iter_pages, counters: Dict[str, int]):
+        """
+        Returns `iter_pages` timed under `stage`, counting the pages and rows it yields.
+
+        Only the time spent waiting for a page is counted, not the time the
+        consumer holds it.
+        """
+        @functools.wraps(iter_pages)
+        async def timed(*args, **kwargs):
+            pages = iter_pages(*args, **kwargs)
+            while True:
+                start = time.perf_counter()
+                try:
+                    page_data = await pages.__anext__()
+                except StopAsyncIteration:
+                    self.add(stage, time.perf_counter() - start)
+                    return
+                self.add(stage, time.perf_counter() - start)
+                counters["pages"] += 1
+                counters["rows"] += len(page_data)
+                yield page_data
+        return timed
+
+
+def get_peak_rss_mb() -> Optional[float]:
+    """
+    Returns the peak resident set size of the current process in MiB, if it can be measured.
+    """
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_worker(args: argparse.Namespace) -> dict:
+    """
+    Runs the pipeline once against one backend, in the current process.
+    """
+    from main import create_storage
+    from pipeline.api_data_fetcher_async import APIDataFetcherAsync
+    from pipeline.data_pipeline import DataPipeline
+
+    logging.getLogger().setLevel(logging.WARNING)
+    timer = StageTimer()
+    counters = {"pages": 0, "rows": 0}
+
+    fetcher = APIDataFetcherAsync(
+        api_url=args.api_url,
+        page_size=args.page_size,
+        max_concurrency=args.concurrency,
+        pagination=args.pagination
+    )
+    fetcher.iter_pages = timer.wrap_pages("fetch", fetcher.iter_pages, counters)
+
+    storage = create_storage(args.backend, args.storage_dir)
+    sharded = args.workers > 1 and not args.streaming
+    if not sharded:
+        # The writers of a sharded run are sent to the worker processes, they must not be wrapped
+        storage.save_data = timer.wrap("save", storage.save_data)
+        open_writer = storage.open_writer
+
+        def timed_open_writer(category, unique_key):
+            writer = open_writer(category, unique_key)
+            writer.write = timer.wrap("save", writer.write)
+            writer.close = timer.wrap("save", writer.close)
+            return writer
+
+        storage.open_writer = timed_open_writer
+
+    pipeline = DataPipeline(storage=storage, fetcher=fetcher, chunk_size=args.chunk_size, workers=args.workers)
+    pipeline.clean_data = timer.wrap("clean", pipeline.clean_data)
+
+    start = time.perf_counter()
+    asyncio.run(pipeline.run(parallel=args.parallel, streaming=args.streaming))
+    seconds = time.perf_counter() - start
+
+    if sharded:
+        # The shards are cleaned and saved in the worker processes, their time is only known from the pipeline metrics
+        _, histograms = pipeline.metrics.snapshot()
+        for labels, histogram in histograms.get("moovitamix_stage_duration_seconds", {}).items():
+            stage = dict(labels).get("stage")
+            if stage in ("clean", "save"):
+                totals = timer.stages.setdefault(stage, {"seconds": 0.0, "calls": 0})
+                totals["seconds"] += histogram.sum
+                totals["calls"] += histogram.count
+
+    return {
+        "backend": args.backend,
+        "seconds": seconds,
+        "rows": counters["rows"],
+        "pages": counters["pages"],
+        "rows_per_second": counters["rows"] / seconds,
+        "pages_per_second": counters["pages"] / seconds,
+        "peak_rss_mb": get_peak_rss_mb(),
+        "stages": timer.stages,
+    }
+
+
+def get_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_api(size: int, seed: int, timeout: float) -> Tuple[subprocess.Popen, str]:
+    """
+    Starts the API with uvicorn on a free local port and waits until it answers.
+
+    Raises:
+        RuntimeError: If the API does not answer before the timeout.
+    """
+    port = get_free_port()
+    env = {
+        **os.environ,
+        "MOOVITAMIX_GENERATOR": "vectorized",
+        "MOOVITAMIX_DATA_SIZE": str(size),
+        "MOOVITAMIX_SEED": str(seed),
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=API_DIR,
+        env=env
+    )
+    api_url = f"http://127.0.0.1:{port}"
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"The API exited with code {server.returncode}")
+        try:
+            with urllib.request.urlopen(f"{api_url}/tracks?size=1", timeout=1):
+                return server, api_url
+        except OSError:
+            time.sleep(0.5)
+
+    server.terminate()
+    raise RuntimeError(f"The API did not answer within {timeout} seconds")
+
+
+def run_backend(args: argparse.Namespace, backend: str, api_url: str) -> dict:
+    """
+    Runs the pipeline against one backend in a subprocess, on an empty storage directory.
+    """
+    with tempfile.TemporaryDirectory(prefix=f"bench-{backend}-") as storage_dir:
+        command = [
+            sys.executable, "-m", "benchmarks.bench_pipeline", "--worker",
+            "--backend", backend,
+            "--api-url", api_url,
+            "--storage-dir", storage_dir,
+            "--pagination", args.pagination,
+            "--page-size", str(args.page_size),
+            "--concurrency", str(args.concurrency),
+            "--chunk-size", str(args.chunk_size),
+            "--workers", str(args.workers),
+        ]
+        if args.streaming:
+            command.append("--streaming")
+        if args.parallel:
+            command.append("--parallel")
+
+        completed = subprocess.run(command, cwd=SRC_DIR, capture_output=True, text=True)
+        if completed.returncode != 0:
+            return {"backend": backend, "error": (completed.stderr.strip().splitlines() or ["unknown error"])[-1]}
+        return json.loads(completed.stdout)
+
+
+def get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=SRC_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args: argparse.Namespace) -> dict:
+    backends: List[str] = args.backends.split(",")
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        raise ValueError(f"Unknown storage backends: {', '.join(sorted(unknown))}")
+
+    start = time.perf_counter()
+    server, api_url = start_api(args.size, args.seed, args.startup_timeout)
+    api_startup_seconds = time.perf_counter() - start
+    try:
+        results = [run_backend(args, backend, api_url) for backend in backends]
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "commit": get_commit(),
+        "python": sys.version.split()[0],
+        "config": {
+            "size": args.size,
+            "seed": args.seed,
+            "pagination": args.pagination,
+            "page_size": args.page_size,
+            "concurrency": args.concurrency,
+            "streaming": args.streaming,
+            "parallel": args.parallel,
+            "chunk_size": args.chunk_size,
+            "workers": args.workers,
+        },
+        "api_startup_seconds": api_startup_seconds,
+        "results": results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion pipeline end to end.")
+    parser.add_argument("--size", type=int, default=10_000, help="Number of records generated per category.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--backends", default="csv,parquet,sqlite,duckdb", help="Comma-separated storage backends.")
+    parser.add_argument("--pagination", default="page", choices=("page", "cursor", "export"))
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8, help="Pages fetched concurrently in page mode.")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="Records per chunk in streaming mode.")
+    parser.add_argument("--workers", type=int, default=1, help="Processes cleaning and saving the shards of a category.")
+    parser.add_argument("--streaming", action="store_true", help="Stream the categories in bounded chunks.")
+    parser.add_argument("--parallel", action="store_true", help="Ingest the categories concurrently.")
+    parser.add_argument("--startup-timeout", type=float, default=300, help="Seconds to wait for the API.")
+    parser.add_argument("--output", help="Also write the JSON report to this file.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    # Internal options of the per-backend subprocess
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--api-url", help=argparse.SUPPRESS)
+    parser.add_argument("--storage-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    if args.worker:
+        print(json.dumps(run_worker(args)))
+        return
+
+    report = run(args)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    config = report["config"]
+    print(
+        f"{config['size']:,} records per category, {config['pagination']} pagination "
+        f"(API started in {report['api_startup_seconds']:.1f}s)"
+    )
+    for result in report["results"]:
+        if "error" in result:
+            print(f"{result['backend']:>8}: failed {result['error']}")
+            continue
+        stages = ", ".join(f"{stage} {totals['seconds']:.2f}s" for stage, totals in result["stages"].items())
+        print(
+            f"{result['backend']:>8}: {result['seconds']:.2f}s, {result['rows_per_second']:,.0f} rows/s, "
+            f"{result['pages_per_second']:,.0f} pages/s, peak RSS {result['peak_rss_mb']:,.0f} MiB ({stages})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark of the CSVStorage upsert path.
+
+Compares the vectorized `upsert_records` with the former row-by-row loop
+(`iterrows` + boolean mask per updated row). The legacy loop is O(n * m), so it
+is only timed on a sample of the updates and extrapolated to the full batch.
+
+Usage (from the `src` directory):
+    python -m benchmarks.bench_upsert --existing 1000000 --updates 100000
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from storage.upsert import upsert_records
+
+
+def make_frames(existing_rows: int, update_rows: int, new_fraction: float, seed: int):
+    """
+    Builds an existing table and a batch of changes.
+
+    Args:
+        existing_rows (int): The number of rows already stored.
+        update_rows (int): The number of changed rows.
+        new_fraction (float): The share of changed rows with unknown keys.
+        seed (int): The random seed.
+
+    Returns:
+        tuple: The existing DataFrame and the changes DataFrame.
+    """
+    rng = np.random.default_rng(seed)
+    existing_df = pd.DataFrame({
+        "id": np.arange(existing_rows, dtype=np.int64),
+        "name": rng.integers(0, 1_000_000, existing_rows).astype(str),
+        "charged_at": "2024-10-01T00:00",
+    })
+
+    new_rows = int(update_rows * new_fraction)
+    updated_ids = rng.choice(existing_rows, update_rows - new_rows, replace=False)
+    new_ids = np.arange(existing_rows, existing_rows + new_rows)
+    changes_df = pd.DataFrame({
+        "id": np.concatenate([updated_ids, new_ids]),
+        "name": rng.integers(0, 1_000_000, update_rows).astype(str),
+        "charged_at": "2024-10-02T00:00",
+    })
+    return existing_df, changes_df
+
+
+def legacy_update(existing_df: pd.DataFrame, updated_df: pd.DataFrame, unique_key: str) -> pd.DataFrame:
+    """
+    The former CSVStorage.save_data update loop.
+
+    The row is assigned through `.values`: recent pandas versions align a Series on
+    the row index and reject the original assignment, the cost is the same.
+    """
+    for _, updated_row in updated_df.iterrows():
+        existing_df.loc[existing_df[unique_key] == updated_row[unique_key]] = updated_row.values
+    return existing_df
+
+
+def run(existing_rows: int, update_rows: int, new_fraction: float, repeat: int, legacy_sample: int, seed: int) -> dict:
+    existing_df, changes_df = make_frames(existing_rows, update_rows, new_fraction, seed)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        upsert_records(existing_df, changes_df, "id")
+        timings.append(time.perf_counter() - start)
+    vectorized_seconds = min(timings)
+
+    results = {
+        "existing_rows": existing_rows,
+        "update_rows": update_rows,
+        "vectorized_seconds": vectorized_seconds,
+        "vectorized_rows_per_second": update_rows / vectorized_seconds,
+    }
+
+    if legacy_sample:
+        # The legacy loop only handled keys already stored, inserts were concatenated afterwards
+        sample_df = changes_df[changes_df["id"] < existing_rows].head(legacy_sample)
+        start = time.perf_counter()
+        legacy_update(existing_df.copy(), sample_df, "id")
+        sample_seconds = time.perf_counter() - start
+        legacy_seconds = sample_seconds * update_rows / len(sample_df)
+        results.update({
+            "legacy_sample_rows": len(sample_df),
+            "legacy_estimated_seconds": legacy_seconds,
+            "legacy_rows_per_second": update_rows / legacy_seconds,
+            "speedup": legacy_seconds / vectorized_seconds,
+        })
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the CSVStorage upsert path.")
+    parser.add_argument("--existing", type=int, default=1_000_000, help="Number of existing rows.")
+    parser.add_argument("--updates", type=int, default=100_000, help="Number of changed rows.")
+    parser.add_argument("--new-fraction", type=float, default=0.1, help="Share of changed rows that are inserts.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs of the vectorized upsert.")
+    parser.add_argument("--legacy-sample", type=int, default=200, help="Updated rows timed with the legacy loop (0 to skip).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args()
+
+    results = run(args.existing, args.updates, args.new_fraction, args.repeat, args.legacy_sample, args.seed)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{results['existing_rows']:,} existing rows x {results['update_rows']:,} changed rows")
+    print(f"vectorized: {results['vectorized_seconds']:.3f}s ({results['vectorized_rows_per_second']:,.0f} rows/s)")
+    if "legacy_estimated_seconds" in results:
+        print(
+            f"legacy (estimated from {results['legacy_sample_rows']} rows): "
+            f"{results['legacy_estimated_seconds']:.1f}s ({results['legacy_rows_per_second']:,.0f} rows/s), "
+            f"speedup x{results['speedup']:,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
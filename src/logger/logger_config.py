@@ -1,12 +1,22 @@
 import logging
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.StreamHandler()
-    ]
-)
-
 logger = logging.getLogger(__name__)
 
+
+def configure_logging(level: int = logging.INFO) -> None:
+    """
+    Configures the root logger to print the pipeline logs to the console.
+
+    Called by the entry points (see main.py) rather than at import time, so that
+    importing a module of the pipeline does not change the logging of the caller.
+
+    Args:
+        level (int): The minimum level of the printed messages.
+    """
+    logging.basicConfig(
+        level=level,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        handlers=[
+            logging.StreamHandler()
+        ]
+    )
@@ -1,32 +1,170 @@
-import asyncio
-import time
+"""
+Command line entry point of the MooVitamix ingestion pipeline.
+
+Usage:
+    python src/main.py                              # same as `run`
+    python src/main.py run --category users         # only the given categories
+    python src/main.py compact                      # merge the CSV delta segments into the base files
+    python src/main.py bench --size 100000          # end-to-end benchmark, see benchmarks.bench_pipeline
+
+The pipeline is configured by the environment and the `.env` file (see docs/ANSWERS.md).
+pandas, aiohttp and the storage backends are only imported by the commands that use
+them, so that `--help` and short runs do not pay for their import.
+"""
+
+import argparse
 import os
-from pipeline.api_data_fetcher_async import APIDataFetcherAsync
-from pipeline.data_pipeline import DataPipeline
-from storage.csv_storage import CSVStorage
-from logger.logger_config import logger
-from dotenv import load_dotenv
+import sys
+import time
+from typing import TYPE_CHECKING, List, Optional
+from pipeline.data_category import DataCategory
+from logger.logger_config import configure_logging, logger
+
+if TYPE_CHECKING:
+    from pipeline.metrics import Metrics
+    from storage.storage import Storage
+
+def create_storage(
+    backend: str,
+    storage_dir: str,
+    append_only: bool = False,
+    max_deltas: Optional[int] = None,
+    num_buckets: int = 0
+) -> "Storage":
+    """
+    Creates the storage backend selected by name.
+
+    Args:
+        backend (str): The storage backend: 'csv', 'parquet', 'sqlite' or 'duckdb'.
+        storage_dir (str): The directory where the data is stored.
+        append_only (bool): For the CSV backend, write delta segments instead of rewriting the files.
+        max_deltas (Optional[int]): For the CSV backend, the number of delta segments that triggers a compaction.
+        num_buckets (int): For the CSV backend, the number of buckets of the listen histories, 0 for a single file.
+
+    Returns:
+        Storage: The storage instance.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    if backend == "csv":
+        from storage.csv_storage import CSVStorage
+        return CSVStorage(storage_dir=storage_dir, append_only=append_only, max_deltas=max_deltas, num_buckets=num_buckets)
+    if backend == "parquet":
+        from storage.parquet_storage import ParquetStorage
+        return ParquetStorage(storage_dir=storage_dir)
+    if backend == "sqlite":
+        from storage.database_storage import SQLiteStorage
+        return SQLiteStorage(storage_dir=storage_dir)
+    if backend == "duckdb":
+        from storage.database_storage import DuckDBStorage
+        return DuckDBStorage(storage_dir=storage_dir)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+def create_storage_from_env() -> "Storage":
+    """
+    Creates the storage backend configured by the STORAGE_* and CSV_* environment variables.
 
-load_dotenv()
+    Returns:
+        Storage: The storage instance.
+    """
+    append_only = os.getenv("CSV_APPEND_ONLY", "false").lower() in ("1", "true", "yes")
+    max_deltas = int(os.getenv("CSV_MAX_DELTAS", "0")) or None
+    num_buckets = int(os.getenv("CSV_BUCKETS", "0"))
+    return create_storage(os.getenv("STORAGE_BACKEND", "csv"), os.getenv("STORAGE_DIR", "data"), append_only, max_deltas, num_buckets)
 
-async def main():
+def create_metrics() -> "Metrics":
+    """
+    Creates the metrics registry, with the sinks enabled by the environment.
+
+    METRICS_PROMETHEUS_FILE enables the Prometheus text file and METRICS_JSON_FILE
+    the JSON run summary. Without either, the metrics are only kept in memory.
+
+    Returns:
+        Metrics: The metrics registry.
+    """
+    from pipeline.metrics import JSONSummarySink, Metrics, MetricsSink, PrometheusTextFileSink
+
+    sinks: List[MetricsSink] = []
+    prometheus_file = os.getenv("METRICS_PROMETHEUS_FILE")
+    if prometheus_file:
+        sinks.append(PrometheusTextFileSink(prometheus_file))
+    json_file = os.getenv("METRICS_JSON_FILE")
+    if json_file:
+        sinks.append(JSONSummarySink(json_file))
+    return Metrics(sinks)
+
+async def main(categories: Optional[List[DataCategory]] = None):
     """
     Main function to initialize the pipeline and run the data fetching and saving process.
     The function also measures execution time and logs it.
+
+    Args:
+        categories (Optional[List[DataCategory]]): The categories to ingest, all of them if None.
+
+    Raises:
+        Exception: If the pipeline could not be created or a category failed, once logged.
     """
+    from pipeline.api_data_fetcher_async import APIDataFetcherAsync
+    from pipeline.checkpoint_store import CheckpointStore
+    from pipeline.content_index import ContentIndex
+    from pipeline.data_pipeline import DataPipeline
+    from pipeline.http_cache import HTTPCache
+    from pipeline.retry import RetryPolicy
+    from pipeline.write_behind import WriteBehindQueue
+
     start_time = time.time()
     try:
         logger.info("Starting the data pipeline execution...")
 
         api_url = os.getenv("API_URL", "http://127.0.0.1:8000")
-        fetcher = APIDataFetcherAsync(api_url=api_url)
+        fetch_concurrency = int(os.getenv("FETCH_CONCURRENCY", "8"))
+        metrics = create_metrics()
+        pagination = os.getenv("FETCH_PAGINATION", "page")
+        page_size = int(os.getenv("FETCH_PAGE_SIZE", "100" if pagination == "page" else "5000"))
+        latency_threshold = float(os.getenv("FETCH_LATENCY_THRESHOLD", "0")) or None
+        http_cache_dir = os.getenv("HTTP_CACHE_DIR")
+        http_cache = None
+        if http_cache_dir:
+            http_cache = HTTPCache(http_cache_dir, max_bytes=int(os.getenv("HTTP_CACHE_MAX_MB", "256")) * 1024 * 1024)
+        fetcher = APIDataFetcherAsync(
+            api_url=api_url,
+            page_size=page_size,
+            max_concurrency=fetch_concurrency,
+            pagination=pagination,
+            metrics=metrics,
+            retry_policy=RetryPolicy(max_retries=int(os.getenv("FETCH_MAX_RETRIES", "5"))),
+            request_timeout=float(os.getenv("FETCH_TIMEOUT", "30")),
+            latency_threshold=latency_threshold,
+            http_cache=http_cache
+        )
 
         storage_dir = os.getenv("STORAGE_DIR", "data")
-        csv_storage = CSVStorage(storage_dir=storage_dir)
+        storage = create_storage_from_env()
 
-        pipeline = DataPipeline(storage=csv_storage, fetcher=fetcher)
+        chunk_size = int(os.getenv("PIPELINE_CHUNK_SIZE", "10000"))
+        incremental = os.getenv("PIPELINE_INCREMENTAL", "true").lower() in ("1", "true", "yes")
+        use_checkpoints = os.getenv("PIPELINE_CHECKPOINTS", "true").lower() in ("1", "true", "yes")
+        checkpoints = CheckpointStore(storage_dir) if use_checkpoints else None
+        use_content_index = os.getenv("PIPELINE_CONTENT_INDEX", "true").lower() in ("1", "true", "yes")
+        content_index = ContentIndex(storage_dir) if use_content_index else None
+        use_write_behind = os.getenv("PIPELINE_WRITE_BEHIND", "true").lower() in ("1", "true", "yes")
+        write_behind = WriteBehindQueue() if use_write_behind else None
+        pipeline = DataPipeline(
+            storage=storage,
+            fetcher=fetcher,
+            chunk_size=chunk_size,
+            incremental=incremental,
+            checkpoints=checkpoints,
+            metrics=metrics,
+            workers=int(os.getenv("PIPELINE_WORKERS", "1")),
+            content_index=content_index,
+            write_behind=write_behind
+        )
 
-        await pipeline.run()
+        parallel = os.getenv("PIPELINE_PARALLEL", "true").lower() in ("1", "true", "yes")
+        streaming = os.getenv("PIPELINE_STREAMING", "false").lower() in ("1", "true", "yes")
+        await pipeline.run(parallel=parallel, streaming=streaming, categories=categories)
 
         # Measure and log the execution time
         end_time = time.time()
@@ -35,13 +173,85 @@ async def main():
 
     except Exception as e:
         logger.error(f"An error occurred during the data pipeline execution: {e}")
+        raise
     finally:
         logger.info("Data pipeline execution finished.")
 
-if __name__ == "__main__":
+def compact(categories: Optional[List[DataCategory]] = None) -> int:
+    """
+    Merges the delta segments of the CSV storage into its base files.
+
+    Args:
+        categories (Optional[List[DataCategory]]): The categories to compact, all of them if None.
+
+    Returns:
+        int: The exit code, 1 if the configured storage has no delta segments.
+    """
+    storage = create_storage_from_env()
+    if not hasattr(storage, "compact"):
+        logger.error(f"The {os.getenv('STORAGE_BACKEND', 'csv')} storage has no delta segments to compact.")
+        return 1
+
+    for category in categories or list(DataCategory):
+        storage.compact(category)
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Builds the parser of the command line, `run` being the default command.
+    """
+    parser = argparse.ArgumentParser(description="MooVitamix ingestion pipeline.")
+    commands = parser.add_subparsers(dest="command", metavar="{run,compact,bench}")
+    parser.set_defaults(command="run", category=None)
+
+    category_choices = [category.value for category in DataCategory]
+    run_parser = commands.add_parser("run", help="Fetch the categories from the API and save them (default).")
+    run_parser.add_argument("--category", action="append", choices=category_choices,
+                            help="Category to ingest, can be repeated. All of them by default.")
+    compact_parser = commands.add_parser("compact", help="Merge the CSV delta segments into the base files.")
+    compact_parser.add_argument("--category", action="append", choices=category_choices,
+                                help="Category to compact, can be repeated. All of them by default.")
+    # The options of the benchmark are parsed by benchmarks.bench_pipeline itself
+    commands.add_parser("bench", add_help=False, help="Benchmark the pipeline end to end (see `bench --help`).")
+    return parser
+
+def cli(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs the command given on the command line.
+
+    Args:
+        argv (Optional[List[str]]): The arguments, sys.argv[1:] if None.
+
+    Returns:
+        int: The exit code, 1 if the pipeline failed and 130 if it was interrupted.
+    """
+    parser = build_parser()
+    args, extra_args = parser.parse_known_args(argv)
+    if args.command == "bench":
+        from benchmarks.bench_pipeline import main as bench_main
+        bench_main(extra_args)
+        return 0
+    if extra_args:
+        parser.error(f"unrecognized arguments: {' '.join(extra_args)}")
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    configure_logging()
+
+    categories = [DataCategory(category) for category in args.category] if args.category else None
+    if args.command == "compact":
+        return compact(categories)
+
+    import asyncio
     try:
-        asyncio.run(main())
+        asyncio.run(main(categories))
     except KeyboardInterrupt:
         logger.info("Pipeline execution interrupted by user.")
+        return 130
+    except Exception:
+        # Already logged by main(), the exit code tells schedulers and health checks that the run failed
+        return 1
+    return 0
 
-
+if __name__ == "__main__":
+    sys.exit(cli())
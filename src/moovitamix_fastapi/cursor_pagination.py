@@ -0,0 +1,46 @@
+import base64
+import binascii
+import datetime
+import json
+from typing import Any, Generic, List, Optional, Tuple, TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+class CursorPage(BaseModel, Generic[T]):
+    """
+    A page of a keyset-paginated endpoint.
+
+    Attributes:
+        items (List[T]): The records of the page.
+        next_cursor (Optional[str]): The cursor of the next page, or None on the last page.
+
+    """
+
+    items: List[T]
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(position: Tuple[datetime.datetime, Any]) -> str:
+    """
+    Encode an `(updated_at, key)` position as an opaque, URL-safe cursor.
+    """
+    updated_at, key = position
+    return base64.urlsafe_b64encode(json.dumps([updated_at.isoformat(), key]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, Any]:
+    """
+    Decode a cursor built by `encode_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+
+    """
+    try:
+        updated_at, key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.datetime.fromisoformat(updated_at), key
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
@@ -1,9 +1,22 @@
+import datetime
+import math
+import os
+import random
+from enum import Enum
+from typing import Iterator, List, Optional
+
 from classes_out import ListenHistoryOut, TracksOut, UsersOut
-from fastapi import FastAPI, Query
+from cursor_pagination import CursorPage, decode_cursor, encode_cursor
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.openapi.docs import get_swagger_ui_html
-from fastapi.responses import RedirectResponse
-from fastapi_pagination import Page, add_pagination, paginate
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+from faker import Faker
+from fastapi_pagination import Page
 from generate_fake_data import FakeDataGenerator
+from record_index import RecordIndex
+from responses import FastJSONResponse, PayloadCache, conditional_json_response, dumps
+from vectorized_fake_data import VectorizedFakeDataGenerator
 
 Page = Page.with_custom_options(
     size=Query(100, ge=1, le=100),
@@ -14,7 +27,9 @@ app = FastAPI(
     description="A music recommendation system.",
     version="1.1",
     docs_url=None,
+    default_response_class=FastJSONResponse,
 )
+app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 
 @app.get("/")
@@ -31,24 +46,180 @@ async def overridden_swagger():
     )
 
 
-data_range_observations = 1000
-generator = FakeDataGenerator(data_range_observations)
+# MOOVITAMIX_GENERATOR=vectorized generates large datasets (millions of records) with NumPy,
+# the default Faker generator is limited to 100k records by its unique ids
+data_range_observations = int(os.getenv("MOOVITAMIX_DATA_SIZE", "1000"))
+data_seed = int(os.environ["MOOVITAMIX_SEED"]) if os.getenv("MOOVITAMIX_SEED") else None
+if os.getenv("MOOVITAMIX_GENERATOR", "faker") == "vectorized":
+    generator = VectorizedFakeDataGenerator(data_range_observations, seed=data_seed)
+else:
+    if data_seed is not None:
+        Faker.seed(data_seed)
+        random.seed(data_seed)
+    generator = FakeDataGenerator(data_range_observations)
 tracks, users, listen_history = generator.generate_fake_data()
 
+tracks_index = RecordIndex(tracks, key="id")
+users_index = RecordIndex(users, key="id")
+listen_history_index = RecordIndex(listen_history, key="user_id")
 
-@app.get("/tracks", tags=["HTTP methods"])
-async def get_tracks() -> Page[TracksOut]:
-    return paginate(tracks)
-
-
-@app.get("/users", tags=["HTTP methods"])
-async def get_users() -> Page[UsersOut]:
-    return paginate(users)
+tracks_payloads = PayloadCache(tracks)
+users_payloads = PayloadCache(users)
+listen_history_payloads = PayloadCache(listen_history)
 
+UpdatedSince = Query(None, description="Only return records updated after this date.")
+CreatedSince = Query(
+    None,
+    description="Only return records created after this date. Combined with updated_since, records matching either bound are returned.",
+)
 
-@app.get("/listen_history", tags=["HTTP methods"])
-async def get_listen_history() -> Page[ListenHistoryOut]:
-    return paginate(listen_history)
-
+PageNumber = Query(1, ge=1, description="Page number")
+PageSize = Query(100, ge=1, le=100, description="Page size")
+
+
+def offset_page(request: Request, payloads: PayloadCache, records: List, page: int, size: int) -> Response:
+    """
+    Build a page with the layout of fastapi_pagination's Page from the pre-dumped records.
+
+    The response is returned directly, so FastAPI skips the validation and the
+    serialization of the response model, which is only used for the documentation.
+    It carries an ETag, and is replaced by a 304 when the client already has it.
+    """
+    items = payloads.dump(records[(page - 1) * size:page * size])
+    return conditional_json_response(request, {
+        "items": items,
+        "total": len(records),
+        "page": page,
+        "size": size,
+        "pages": math.ceil(len(records) / size),
+    })
+
+
+@app.get("/tracks", tags=["HTTP methods"], responses={200: {"model": Page[TracksOut]}})
+async def get_tracks(
+    request: Request,
+    page: int = PageNumber,
+    size: int = PageSize,
+    updated_since: Optional[datetime.datetime] = UpdatedSince,
+    created_since: Optional[datetime.datetime] = CreatedSince,
+) -> Response:
+    return offset_page(request, tracks_payloads, tracks_index.changed_since(updated_since, created_since), page, size)
+
+
+@app.get("/users", tags=["HTTP methods"], responses={200: {"model": Page[UsersOut]}})
+async def get_users(
+    request: Request,
+    page: int = PageNumber,
+    size: int = PageSize,
+    updated_since: Optional[datetime.datetime] = UpdatedSince,
+    created_since: Optional[datetime.datetime] = CreatedSince,
+) -> Response:
+    return offset_page(request, users_payloads, users_index.changed_since(updated_since, created_since), page, size)
+
+
+@app.get("/listen_history", tags=["HTTP methods"], responses={200: {"model": Page[ListenHistoryOut]}})
+async def get_listen_history(
+    request: Request,
+    page: int = PageNumber,
+    size: int = PageSize,
+    updated_since: Optional[datetime.datetime] = UpdatedSince,
+    created_since: Optional[datetime.datetime] = CreatedSince,
+) -> Response:
+    return offset_page(request, listen_history_payloads, listen_history_index.changed_since(updated_since, created_since), page, size)
+
+
+Cursor = Query(None, description="The next_cursor returned by the previous page, omit it for the first page.")
+Limit = Query(1000, ge=1, le=10000, description="The maximum number of records of the page.")
+
+
+def cursor_page(
+    request: Request,
+    index: RecordIndex,
+    payloads: PayloadCache,
+    cursor: Optional[str],
+    limit: int,
+    updated_since: Optional[datetime.datetime],
+    created_since: Optional[datetime.datetime],
+) -> Response:
+    """
+    Build a keyset page of records ordered by `(updated_at, key)` from the pre-dumped records,
+    with an ETag as the numbered pages.
+    """
+    try:
+        after = None if cursor is None else decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    items, has_more = index.page_after(after, limit, updated_since, created_since)
+    next_cursor = encode_cursor(index.sort_key(items[-1])) if has_more else None
+    return conditional_json_response(request, {"items": payloads.dump(items), "next_cursor": next_cursor})
+
+
+@app.get("/tracks/cursor", tags=["HTTP methods"], responses={200: {"model": CursorPage[TracksOut]}})
+async def get_tracks_cursor(
+    request: Request,
+    cursor: Optional[str] = Cursor,
+    limit: int = Limit,
+    updated_since: Optional[datetime.datetime] = UpdatedSince,
+    created_since: Optional[datetime.datetime] = CreatedSince,
+) -> Response:
+    return cursor_page(request, tracks_index, tracks_payloads, cursor, limit, updated_since, created_since)
+
+
+@app.get("/users/cursor", tags=["HTTP methods"], responses={200: {"model": CursorPage[UsersOut]}})
+async def get_users_cursor(
+    request: Request,
+    cursor: Optional[str] = Cursor,
+    limit: int = Limit,
+    updated_since: Optional[datetime.datetime] = UpdatedSince,
+    created_since: Optional[datetime.datetime] = CreatedSince,
+) -> Response:
+    return cursor_page(request, users_index, users_payloads, cursor, limit, updated_since, created_since)
+
+
+@app.get("/listen_history/cursor", tags=["HTTP methods"], responses={200: {"model": CursorPage[ListenHistoryOut]}})
+async def get_listen_history_cursor(
+    request: Request,
+    cursor: Optional[str] = Cursor,
+    limit: int = Limit,
+    updated_since: Optional[datetime.datetime] = UpdatedSince,
+    created_since: Optional[datetime.datetime] = CreatedSince,
+) -> Response:
+    return cursor_page(request, listen_history_index, listen_history_payloads, cursor, limit, updated_since, created_since)
+
+
+class ExportCategory(str, Enum):
+    tracks = "tracks"
+    users = "users"
+    listen_history = "listen_history"
+
+
+export_sources = {
+    ExportCategory.tracks: (tracks_index, tracks_payloads),
+    ExportCategory.users: (users_index, users_payloads),
+    ExportCategory.listen_history: (listen_history_index, listen_history_payloads),
+}
+
+
+def iter_ndjson(payloads: PayloadCache, records: List, batch_size: int = 1000) -> Iterator[bytes]:
+    """
+    Serialize records as newline-delimited JSON, one response chunk per batch of records.
+    """
+    for start in range(0, len(records), batch_size):
+        yield b"".join(dumps(payload) + b"\n" for payload in payloads.dump(records[start:start + batch_size]))
+
+
+@app.get("/export/{category}", tags=["HTTP methods"])
+async def export_category(
+    category: ExportCategory,
+    updated_since: Optional[datetime.datetime] = UpdatedSince,
+    created_since: Optional[datetime.datetime] = CreatedSince,
+) -> StreamingResponse:
+    """
+    Stream every record of a category as newline-delimited JSON, gzip compressed when
+    the client accepts it. The body is produced batch by batch, never held in memory.
+    """
+    index, payloads = export_sources[category]
+    records = index.changed_since(updated_since, created_since)
+    return StreamingResponse(iter_ndjson(payloads, records), media_type="application/x-ndjson")
 
-add_pagination(app)
@@ -0,0 +1,143 @@
+import datetime
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Any, Generic, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+def to_naive_utc(value: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    """
+    Convert a timezone-aware datetime to naive UTC so that it compares with the
+    naive timestamps of the generated data.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class RecordIndex(Generic[T]):
+    """
+    Keep records pre-sorted on `updated_at` and `created_at` so that "changed since"
+    queries are answered with a bisect instead of a scan of the whole list.
+
+    The records must not change once indexed: a new index is built for new data.
+
+    Args:
+        records (List[T]): The records, exposing `created_at` and `updated_at` attributes.
+        key (str): The attribute identifying a record, used to break timestamp ties.
+        max_cached_orderings (int): The number of `(updated_since, created_since)` bounds whose
+            merged ordering is kept for the following cursor pages.
+
+    """
+
+    def __init__(self, records: List[T], key: str, max_cached_orderings: int = 16):
+        self.records = records
+        self.key = key
+        self.by_updated_at = sorted(records, key=lambda record: (record.updated_at, getattr(record, key)))
+        self.updated_at_keys = [record.updated_at for record in self.by_updated_at]
+        self.sort_keys = [self.sort_key(record) for record in self.by_updated_at]
+        self.by_created_at = sorted(records, key=lambda record: (record.created_at, getattr(record, key)))
+        self.created_at_keys = [record.created_at for record in self.by_created_at]
+        # Every page of a cursor export repeats the same bounds, their merged ordering is only built once
+        self._merged_ordering = lru_cache(maxsize=max_cached_orderings)(self._build_merged_ordering)
+
+    def changed_since(
+        self,
+        updated_since: Optional[datetime.datetime] = None,
+        created_since: Optional[datetime.datetime] = None,
+    ) -> List[T]:
+        """
+        Return the records updated after `updated_since` or created after `created_since`.
+
+        When both bounds are given, the records matching either of them are returned,
+        which is what an incremental sync needs (new records and changed records).
+
+        Args:
+            updated_since (Optional[datetime.datetime]): Exclusive lower bound on `updated_at`.
+            created_since (Optional[datetime.datetime]): Exclusive lower bound on `created_at`.
+
+        Returns:
+            List[T]: All the records in their original order if no bound is given,
+                otherwise the matching records ordered by `updated_at`.
+
+        """
+        updated_since = to_naive_utc(updated_since)
+        created_since = to_naive_utc(created_since)
+
+        if updated_since is None and created_since is None:
+            return self.records
+
+        updated = []
+        if updated_since is not None:
+            updated = self.by_updated_at[bisect_right(self.updated_at_keys, updated_since):]
+        if created_since is None:
+            return updated
+
+        created = self.by_created_at[bisect_right(self.created_at_keys, created_since):]
+        if updated_since is None:
+            return created
+
+        # Only the (small) matching slices are merged, the full lists are never scanned
+        updated_ids = {id(record) for record in updated}
+        merged = updated + [record for record in created if id(record) not in updated_ids]
+        return sorted(merged, key=self.sort_key)
+
+    def sort_key(self, record: T) -> Tuple[datetime.datetime, Any]:
+        """
+        Return the `(updated_at, key)` position of a record, which orders keyset pages.
+        """
+        return record.updated_at, getattr(record, self.key)
+
+    def page_after(
+        self,
+        after: Optional[Tuple[datetime.datetime, Any]],
+        limit: int,
+        updated_since: Optional[datetime.datetime] = None,
+        created_since: Optional[datetime.datetime] = None,
+    ) -> Tuple[List[T], bool]:
+        """
+        Return the page of records that follow the `(updated_at, key)` position `after`.
+
+        Unlike an offset, the position does not shift when records are added or updated
+        between two pages: an updated record moves after the current position and is
+        returned again by a later page, but no record is skipped.
+
+        Args:
+            after (Optional[Tuple[datetime.datetime, Any]]): The position of the last record of the
+                previous page, or None for the first page.
+            limit (int): The maximum number of records of the page.
+            updated_since (Optional[datetime.datetime]): Exclusive lower bound on `updated_at`.
+            created_since (Optional[datetime.datetime]): Exclusive lower bound on `created_at`.
+
+        Returns:
+            Tuple[List[T], bool]: The records of the page ordered by `(updated_at, key)`, and
+                whether more records follow.
+
+        """
+        if created_since is None:
+            # The bounds and the position are all bisected in the same sorted list
+            records, sort_keys = self.by_updated_at, self.sort_keys
+            updated_since = to_naive_utc(updated_since)
+            start = 0 if updated_since is None else bisect_right(self.updated_at_keys, updated_since)
+        else:
+            records, sort_keys = self._merged_ordering(to_naive_utc(updated_since), to_naive_utc(created_since))
+            start = 0
+
+        if after is not None:
+            start = max(start, bisect_right(sort_keys, after))
+        end = start + limit
+        return records[start:end], end < len(records)
+
+    def _build_merged_ordering(
+        self,
+        updated_since: Optional[datetime.datetime],
+        created_since: datetime.datetime,
+    ) -> Tuple[List[T], List[Tuple[datetime.datetime, Any]]]:
+        """
+        Return the records matching the bounds ordered by `(updated_at, key)`, and their positions.
+        """
+        records = self.changed_since(updated_since, created_since)
+        if updated_since is None:
+            records = sorted(records, key=self.sort_key)
+        return records, [self.sort_key(record) for record in records]
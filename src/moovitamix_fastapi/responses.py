@@ -0,0 +1,82 @@
+import hashlib
+from typing import Any, Dict, List
+
+import pydantic_core
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+    class FastJSONResponse(JSONResponse):
+        """
+        JSON response rendered by pydantic-core, still several times faster than the standard library.
+        """
+
+        def render(self, content: Any) -> bytes:
+            return pydantic_core.to_json(content)
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Encode a JSON-ready value with orjson when it is installed, pydantic-core otherwise.
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return pydantic_core.to_json(value)
+
+
+class PayloadCache:
+    """
+    Keep a JSON-ready dict of each record, dumped once with pydantic.
+
+    The generated records never change, so responses are built from these dicts
+    instead of validating and serializing the models again on every request.
+
+    Args:
+        records (List): The pydantic records.
+
+    """
+
+    def __init__(self, records: List):
+        self.records = records
+        # Dumped in a single call, pydantic-core loops over the records
+        payloads = TypeAdapter(List[Any]).dump_python(records, mode="json")
+        self._payloads: Dict[int, dict] = {id(record): payload for record, payload in zip(records, payloads)}
+
+    def dump(self, records: List) -> List[dict]:
+        """
+        Return the JSON-ready dicts of records of this cache.
+        """
+        return [self._payloads[id(record)] for record in records]
+
+
+def etag_matches(etag: str, if_none_match: str) -> bool:
+    """
+    Whether an `If-None-Match` header matches the ETag, with the weak comparison of RFC 9110.
+    """
+    tokens = [token.strip() for token in if_none_match.split(",")]
+    return "*" in tokens or any(token.removeprefix("W/") == etag for token in tokens)
+
+
+def conditional_json_response(request: Request, content: Any) -> Response:
+    """
+    Render a JSON response with an ETag hashed from its body.
+
+    When the client sends the same ETag in `If-None-Match`, an empty 304 response
+    is returned instead, so an unchanged page costs a round-trip but no payload.
+    """
+    response = FastJSONResponse(content)
+    etag = f'"{hashlib.blake2b(response.body, digest_size=16).hexdigest()}"'
+    # no-cache: clients may store the page but must revalidate it on every use
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return response
@@ -0,0 +1,157 @@
+import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from faker import Faker
+from pydantic import TypeAdapter
+
+from classes_out import ListenHistoryOut, TracksOut, UsersOut, gender_list, genre_list
+
+SECONDS_PER_YEAR = 365 * 24 * 3600
+
+
+class VectorizedFakeDataGenerator:
+    """
+    Generate large fake datasets with NumPy, with the same shape as FakeDataGenerator.
+
+    Ids are shuffled ranges, so they stay unique for any size. Timestamps and the
+    tracks of each listen history are drawn as whole arrays. Text fields are picked
+    from pools of Faker values generated once. The records are then validated in
+    bulk by pydantic instead of being built one by one.
+
+    The same seed always produces the same data, relative to `now`.
+
+    Args:
+        data_range_observations (int): The number of observations to generate for each data type.
+        seed (Optional[int]): The seed of the random generators.
+        tracks_per_user (int): The number of distinct tracks in each listen history.
+        pool_size (int): The number of distinct values generated with Faker for each text field.
+        now (Optional[datetime.datetime]): The upper bound of the generated timestamps, the current time by default.
+
+    """
+
+    def __init__(
+        self,
+        data_range_observations: int,
+        seed: Optional[int] = None,
+        tracks_per_user: int = 5,
+        pool_size: int = 1000,
+        now: Optional[datetime.datetime] = None,
+    ):
+        if tracks_per_user > data_range_observations:
+            raise ValueError("tracks_per_user cannot be greater than the number of tracks.")
+
+        self.data_range_observations = data_range_observations
+        self.seed = seed
+        self.tracks_per_user = tracks_per_user
+        self.pool_size = pool_size
+        self.now = (now or datetime.datetime.now()).replace(microsecond=0)
+
+    def generate_fake_data(self) -> Tuple[List[TracksOut], List[UsersOut], List[ListenHistoryOut]]:
+        """
+        Generate fake data for tracks, users, and listen history.
+
+        Returns:
+            tuple: A tuple containing three lists:
+                - tracks: A list of generated tracks.
+                - users: A list of generated users.
+                - listen_history: A list of generated listen history.
+
+        """
+        tracks, users, listen_history = self.generate_columns()
+        return (
+            TypeAdapter(List[TracksOut]).validate_python(self._to_rows(tracks)),
+            TypeAdapter(List[UsersOut]).validate_python(self._to_rows(users)),
+            TypeAdapter(List[ListenHistoryOut]).validate_python(self._to_rows(listen_history)),
+        )
+
+    def generate_columns(self) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """
+        Generate the columns of tracks, users, and listen history as NumPy arrays.
+
+        Returns:
+            tuple: The columns of the tracks, the users and the listen history, by field name.
+
+        """
+        rng = np.random.default_rng(self.seed)
+        faker = Faker()
+        if self.seed is not None:
+            faker.seed_instance(self.seed)
+        size = self.data_range_observations
+
+        words = self._pool(faker.word)
+        names = self._pool(faker.name)
+        first_names = self._pool(faker.first_name)
+        last_names = self._pool(faker.last_name)
+        emails = self._pool(faker.email)
+        durations = np.array([f"{minute:02d}:{second:02d}" for minute in range(60) for second in range(60)], dtype=object)
+
+        tracks = {
+            "id": rng.permutation(size) + 1,
+            "name": words[rng.integers(0, len(words), size)],
+            "artist": names[rng.integers(0, len(names), size)],
+            "songwriters": names[rng.integers(0, len(names), size)],
+            "duration": durations[rng.integers(0, len(durations), size)],
+            "genres": words[rng.integers(0, len(words), size)],
+            "album": words[rng.integers(0, len(words), size)],
+            "created_at": self._timestamps(rng, size, 2 * SECONDS_PER_YEAR),
+            "updated_at": self._timestamps(rng, size, SECONDS_PER_YEAR),
+        }
+
+        genders = np.array(gender_list(), dtype=object)
+        genres = np.array(genre_list(), dtype=object)
+        users = {
+            "id": rng.permutation(size) + 1,
+            "first_name": first_names[rng.integers(0, len(first_names), size)],
+            "last_name": last_names[rng.integers(0, len(last_names), size)],
+            "email": emails[rng.integers(0, len(emails), size)],
+            "gender": genders[rng.integers(0, len(genders), size)],
+            "favorite_genres": genres[rng.integers(0, len(genres), size)],
+            "created_at": self._timestamps(rng, size, 2 * SECONDS_PER_YEAR),
+            "updated_at": self._timestamps(rng, size, SECONDS_PER_YEAR),
+        }
+
+        # As in FakeDataGenerator, each user has one listen history updated after its creation
+        created_at = self._timestamps(rng, size, 2 * SECONDS_PER_YEAR)
+        age_seconds = (np.datetime64(self.now, "s") - created_at).astype(np.int64)
+        updated_at = created_at + (rng.random(size) * age_seconds).astype(np.int64).astype("timedelta64[s]")
+        listen_history = {
+            "user_id": users["id"],
+            "items": tracks["id"][self._sample_distinct(rng, size, size, self.tracks_per_user)],
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+        return tracks, users, listen_history
+
+    def _pool(self, generate) -> np.ndarray:
+        return np.array([generate() for _ in range(self.pool_size)], dtype=object)
+
+    def _timestamps(self, rng: np.random.Generator, size: int, max_age_seconds: int) -> np.ndarray:
+        """
+        Draw `size` timestamps uniformly between `max_age_seconds` before `now` and `now`.
+        """
+        ages = rng.integers(0, max_age_seconds, size)
+        return np.datetime64(self.now, "s") - ages.astype("timedelta64[s]")
+
+    @staticmethod
+    def _sample_distinct(rng: np.random.Generator, rows: int, population: int, samples: int) -> np.ndarray:
+        """
+        Draw `samples` distinct indexes lower than `population` for each of `rows` rows.
+
+        Every row is drawn at once; the few rows holding a duplicate are drawn again
+        until none is left, instead of sampling each row from the whole population.
+        """
+        indexes = rng.integers(0, population, (rows, samples))
+        while True:
+            sorted_indexes = np.sort(indexes, axis=1)
+            duplicated = (sorted_indexes[:, 1:] == sorted_indexes[:, :-1]).any(axis=1)
+            if not duplicated.any():
+                return indexes
+            indexes[duplicated] = rng.integers(0, population, (int(duplicated.sum()), samples))
+
+    @staticmethod
+    def _to_rows(columns: Dict[str, np.ndarray]) -> List[dict]:
+        # tolist() converts the NumPy values to Python ints, strings, lists and datetimes
+        values = [column.tolist() for column in columns.values()]
+        return [dict(zip(columns, row)) for row in zip(*values)]
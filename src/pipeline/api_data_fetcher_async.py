@@ -1,55 +1,399 @@
+import asyncio
+import itertools
+import math
 import aiohttp
+from collections import deque
+from contextlib import asynccontextmanager
 from logger.logger_config import logger
-from typing import List
+from pipeline import json_codec
+from pipeline.http_cache import HTTPCache
+from pipeline.metrics import Metrics
+from pipeline.retry import AdaptiveConcurrencyLimiter, RetryPolicy
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from urllib.parse import urlencode
 
 class APIDataFetcherAsync:
     """
     A class to asynchronously fetch paginated data from a given API endpoint.
 
+    Two pagination modes are supported:
+    - 'page': numbered pages (`?page=&size=`), which can be fetched concurrently
+      and resumed at a given page number.
+    - 'cursor': the keyset variant of the endpoint (`/<endpoint>/cursor?limit=&cursor=`),
+      walked sequentially with the cursor returned by each page. Pages are stable
+      when the data changes during the fetch and can hold up to 10k records.
+    - 'export': the bulk NDJSON export (`/export/<endpoint>`), a single streamed
+      response read line by line and yielded in batches of page_size records.
+
+    The fetcher can be used as an async context manager, in which case a single
+    pooled aiohttp session is kept open and shared by every call until exit.
+    Outside of a context, each call opens and closes its own session.
+
+    Transient failures (connection errors, timeouts, 429 and 5xx responses) are
+    retried according to retry_policy; a request that still fails raises, so that
+    an error is never mistaken for the end of the data. The page requests share an
+    adaptive concurrency limit: it grows by one request per window of successful
+    requests up to max_concurrency, and is halved when a request fails or is slower
+    than latency_threshold.
+
+    With an http_cache, the pages served with an ETag are stored on disk and
+    revalidated on the next request (`If-None-Match`): an unchanged page costs an
+    empty 304 response and is read back from the cache.
+
     Attributes:
         api_url (str): The base URL of the API.
         page_size (int): The number of items to fetch per page.
+        max_concurrency (int): The maximum number of pages fetched at the same time.
+            A value of 1 walks the pages sequentially. Ignored in cursor mode.
+        limit_per_host (int): The maximum number of pooled connections to the API host.
+        keepalive_timeout (float): How long, in seconds, idle connections are kept alive.
+        ttl_dns_cache (int): How long, in seconds, resolved DNS entries are cached.
+        compress (bool): Whether to ask the API for gzip/deflate compressed responses.
+        pagination (str): The pagination mode, 'page', 'cursor' or 'export'.
+        json_loads (Callable[[bytes], Any]): The function decoding the JSON bodies.
+        metrics (Metrics): The registry recording the requests, response sizes and latencies per endpoint.
+        retry_policy (RetryPolicy): The policy deciding which failed requests are retried, and when.
+        request_timeout (float): The maximum duration of a page request, in seconds. For the export,
+            the maximum time without receiving data.
+        http_cache (Optional[HTTPCache]): The on-disk cache of the pages, disabled when None.
     """
 
-    def __init__(self, api_url: str = 'http://127.0.0.1:8000', page_size: int = 100):
+    PAGINATION_MODES = ("page", "cursor", "export")
+
+    def __init__(
+        self,
+        api_url: str = 'http://127.0.0.1:8000',
+        page_size: int = 100,
+        max_concurrency: int = 1,
+        limit_per_host: int = 30,
+        keepalive_timeout: float = 30.0,
+        ttl_dns_cache: int = 300,
+        compress: bool = True,
+        pagination: str = "page",
+        json_loads: Optional[Callable[[bytes], Any]] = None,
+        metrics: Optional[Metrics] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        request_timeout: float = 30.0,
+        latency_threshold: Optional[float] = None,
+        http_cache: Optional[HTTPCache] = None
+    ):
         """
         Initializes the APIDataFetcherAsync with the provided API URL and page size.
 
         Args:
             api_url (str): The base URL of the API.
             page_size (int): The number of items to fetch per page.
+            max_concurrency (int): The maximum number of pages fetched at the same time.
+            limit_per_host (int): The maximum number of pooled connections to the API host.
+            keepalive_timeout (float): How long, in seconds, idle connections are kept alive.
+            ttl_dns_cache (int): How long, in seconds, resolved DNS entries are cached.
+            compress (bool): Whether to ask the API for gzip/deflate compressed responses.
+            pagination (str): The pagination mode, 'page', 'cursor' or 'export'.
+            json_loads (Optional[Callable[[bytes], Any]]): The function decoding the JSON bodies,
+                orjson when it is installed and the standard library otherwise by default.
+            metrics (Optional[Metrics]): The registry the HTTP metrics are recorded in. A private
+                one is created by default.
+            retry_policy (Optional[RetryPolicy]): The retry policy, 5 retries with exponential
+                backoff and jitter by default.
+            request_timeout (float): The maximum duration of a page request, in seconds.
+            latency_threshold (Optional[float]): The latency, in seconds, above which a page
+                request lowers the concurrency limit. Only failures lower it when None.
+            http_cache (Optional[HTTPCache]): The on-disk cache revalidating the pages with their ETag.
+
+        Raises:
+            ValueError: If max_concurrency is lower than 1 or the pagination mode is unknown.
         """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be greater than or equal to 1.")
+        if pagination not in self.PAGINATION_MODES:
+            raise ValueError(f"pagination must be one of {', '.join(self.PAGINATION_MODES)}.")
+
         self.api_url = api_url
         self.page_size = page_size
+        self.max_concurrency = max_concurrency
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.compress = compress
+        self.pagination = pagination
+        self.json_loads = json_loads or json_codec.loads
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.request_timeout = request_timeout
+        self.http_cache = http_cache
+        self._limiter = AdaptiveConcurrencyLimiter(max_concurrency, latency_threshold=latency_threshold)
+        self._session: Optional[aiohttp.ClientSession] = None
         logger.info(f"Initialized APIDataFetcher with base URL: {self.api_url}")
 
-    async def fetch_all_data(self, endpoint: str) -> List[dict]:
+    @property
+    def can_resume(self) -> bool:
+        """
+        Whether an iteration can be resumed at a page number (not possible with cursors or exports).
+        """
+        return self.pagination == "page"
+
+    async def __aenter__(self) -> "APIDataFetcherAsync":
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def open(self) -> None:
+        """
+        Opens the shared pooled session, if it is not already open.
+        """
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+            logger.info(f"Opened pooled session to {self.api_url} (limit per host: {self.limit_per_host})")
+
+    async def close(self) -> None:
+        """
+        Closes the shared pooled session and releases its connections.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info(f"Closed pooled session to {self.api_url}")
+        self._session = None
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        """
+        Creates an aiohttp session backed by a keep-alive connection pool.
+
+        Returns:
+            aiohttp.ClientSession: The new session.
+        """
+        connector = aiohttp.TCPConnector(
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.ttl_dns_cache
+        )
+        headers = {"Accept-Encoding": "gzip, deflate" if self.compress else "identity"}
+        return aiohttp.ClientSession(connector=connector, headers=headers)
+
+    @asynccontextmanager
+    async def _session_scope(self) -> AsyncIterator[aiohttp.ClientSession]:
+        """
+        Yields the shared session when the fetcher is open, or a short-lived one otherwise.
+        """
+        if self._session is not None and not self._session.closed:
+            yield self._session
+        else:
+            async with self._create_session() as session:
+                yield session
+
+    async def fetch_all_data(self, endpoint: str, params: Optional[Dict[str, str]] = None) -> List[dict]:
         """
         Fetch all pages of data asynchronously from the specified endpoint.
 
         This method fetches paginated data from the API until no more data is available.
+        When max_concurrency is greater than 1, the page count is read from the first
+        page and the remaining pages are fetched concurrently, then reassembled in order.
 
         Args:
             endpoint (str): The API endpoint to fetch data from.
+            params (Optional[Dict[str, str]]): Extra query parameters sent with every page
+                request (e.g. `updated_since` for an incremental sync).
 
         Returns:
             List[dict]: A list of all the fetched data items.
         """
         all_data = []
-        page = 1
-        
-        async with aiohttp.ClientSession() as session:
-            while True:
-                page_data = await self._fetch_page(session, endpoint, page)
-                if not page_data:
-                    break
-                all_data.extend(page_data)
-                page += 1 
+        async for page_data in self.iter_pages(endpoint, params):
+            all_data.extend(page_data)
         
         logger.info(f"Total of {len(all_data)} items fetched from {endpoint}")
         return all_data
+
+    async def iter_pages(self, endpoint: str, params: Optional[Dict[str, str]] = None, start_page: int = 1) -> AsyncIterator[List[dict]]:
+        """
+        Asynchronously iterate over the pages of the specified endpoint, in page order.
+
+        Unlike fetch_all_data, only the pages being fetched or waiting to be consumed
+        are held in memory: at most max_concurrency pages are requested ahead of the
+        consumer, so a slow consumer naturally throttles the requests.
+
+        Args:
+            endpoint (str): The API endpoint to fetch data from.
+            params (Optional[Dict[str, str]]): Extra query parameters sent with every page request.
+            start_page (int): The first page number to fetch, to resume an interrupted iteration.
+                In cursor and export modes, the iteration always starts from the first page.
+
+        Yields:
+            List[dict]: The items of each non-empty page.
+        """
+        async with self._session_scope() as session:
+            if not self.can_resume and start_page > 1:
+                logger.warning(f"{self.pagination.capitalize()} mode cannot start at page {start_page}, fetching {endpoint} from the first record")
+
+            if self.pagination == "cursor":
+                pages = self._iter_cursor_pages(session, endpoint, params)
+            elif self.pagination == "export":
+                pages = self._iter_export_batches(session, endpoint, params)
+            elif self.max_concurrency > 1:
+                pages = self._iter_pages_concurrently(session, endpoint, params, start_page)
+            else:
+                pages = self._iter_pages_sequentially(session, endpoint, params, start_page)
+
+            async for page_data in pages:
+                self.metrics.increment("moovitamix_pages_fetched_total", endpoint=endpoint)
+                yield page_data
+
+    async def _iter_pages_sequentially(self, session: aiohttp.ClientSession, endpoint: str, params: Optional[Dict[str, str]] = None, start_page: int = 1) -> AsyncIterator[List[dict]]:
+        """
+        Fetch pages one at a time, starting at start_page, until an empty page is returned.
+
+        Args:
+            session (aiohttp.ClientSession): The aiohttp session used for the HTTP requests.
+            endpoint (str): The API endpoint to fetch data from.
+            params (Optional[Dict[str, str]]): Extra query parameters sent with every page request.
+            start_page (int): The first page number to fetch.
+
+        Yields:
+            List[dict]: The items of each fetched page.
+        """
+        page = start_page
+
+        while True:
+            page_data = await self._fetch_page(session, endpoint, page, params)
+            if not page_data:
+                break
+            yield page_data
+            page += 1
+
+    async def _iter_pages_concurrently(self, session: aiohttp.ClientSession, endpoint: str, params: Optional[Dict[str, str]] = None, start_page: int = 1) -> AsyncIterator[List[dict]]:
+        """
+        Fetch the first page, then prefetch the remaining pages with at most
+        max_concurrency requests in flight, yielding them in page order.
+
+        Falls back to a sequential walk when the first response does not report
+        the number of pages (e.g. a non fastapi_pagination payload).
+
+        Args:
+            session (aiohttp.ClientSession): The aiohttp session used for the HTTP requests.
+            endpoint (str): The API endpoint to fetch data from.
+            params (Optional[Dict[str, str]]): Extra query parameters sent with every page request.
+            start_page (int): The first page number to fetch.
+
+        Yields:
+            List[dict]: The items of each fetched page, in page order.
+        """
+        first_page = await self._fetch_page_payload(session, endpoint, start_page, params)
+        first_items = first_page.get("items", [])
+        if not first_items:
+            return
+        yield first_items
+
+        total_pages = self._get_total_pages(first_page)
+        if total_pages is None:
+            logger.info(f"No page count returned by {endpoint}, falling back to sequential fetching")
+            async for page_data in self._iter_pages_sequentially(session, endpoint, params, start_page=start_page + 1):
+                yield page_data
+            return
+
+        # Sliding window of in-flight requests: the oldest page is always awaited first,
+        # so pages are yielded in order while the next ones are already downloading.
+        next_pages = iter(range(start_page + 1, total_pages + 1))
+        in_flight = deque()
+        try:
+            for page in itertools.islice(next_pages, self.max_concurrency):
+                in_flight.append(asyncio.create_task(self._fetch_page(session, endpoint, page, params)))
+
+            while in_flight:
+                page_data = await in_flight.popleft()
+                for page in itertools.islice(next_pages, 1):
+                    in_flight.append(asyncio.create_task(self._fetch_page(session, endpoint, page, params)))
+                if page_data:
+                    yield page_data
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    async def _iter_cursor_pages(self, session: aiohttp.ClientSession, endpoint: str, params: Optional[Dict[str, str]] = None) -> AsyncIterator[List[dict]]:
+        """
+        Walk the keyset variant of the endpoint, following the cursor of each page until the last one.
+
+        Args:
+            session (aiohttp.ClientSession): The aiohttp session used for the HTTP requests.
+            endpoint (str): The API endpoint to fetch data from.
+            params (Optional[Dict[str, str]]): Extra query parameters sent with every page request.
+
+        Yields:
+            List[dict]: The items of each non-empty page.
+        """
+        cursor = None
+
+        while True:
+            query = {"limit": self.page_size, **(params or {})}
+            if cursor is not None:
+                query["cursor"] = cursor
+            payload = await self._get_json(session, f"{self.api_url}/{endpoint}/cursor?{urlencode(query)}", endpoint)
+
+            items = payload.get("items", [])
+            if items:
+                yield items
+            cursor = payload.get("next_cursor")
+            if not items or cursor is None:
+                break
+
+    async def _iter_export_batches(self, session: aiohttp.ClientSession, endpoint: str, params: Optional[Dict[str, str]] = None) -> AsyncIterator[List[dict]]:
+        """
+        Read the NDJSON export of the endpoint line by line, in batches of page_size records.
+
+        The body is decoded as it is received, so only the current batch is held in memory.
+
+        Args:
+            session (aiohttp.ClientSession): The aiohttp session used for the HTTP request.
+            endpoint (str): The API endpoint to export.
+            params (Optional[Dict[str, str]]): Extra query parameters sent with the request.
+
+        Yields:
+            List[dict]: The records of each batch.
+        """
+        url = f"{self.api_url}/export/{endpoint}"
+        if params:
+            url = f"{url}?{urlencode(params)}"
+
+        # Only the opening request is retried: once records were yielded, starting the
+        # export over would yield them twice
+        response = await self._send(session, url, endpoint, aiohttp.ClientTimeout(sock_read=self.request_timeout))
+        batch = []
+        try:
+            async with response:
+                async for line in response.content:
+                    self.metrics.increment("moovitamix_http_response_bytes_total", len(line), endpoint=endpoint)
+                    if not line.strip():
+                        continue
+                    batch.append(self.json_loads(line))
+                    if len(batch) >= self.page_size:
+                        yield batch
+                        batch = []
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            self.metrics.increment("moovitamix_http_request_errors_total", endpoint=endpoint)
+            logger.error(f"Failed to read the export from {url}: {e!r}")
+            raise
+
+        if batch:
+            yield batch
+
+    @staticmethod
+    def _get_total_pages(payload: dict) -> Optional[int]:
+        """
+        Read the number of pages from a fastapi_pagination Page payload.
+
+        Args:
+            payload (dict): The decoded JSON body of the first page.
+
+        Returns:
+            Optional[int]: The number of pages, or None if the payload does not report it.
+        """
+        if payload.get("pages") is not None:
+            return int(payload["pages"])
+        if payload.get("total") is not None and payload.get("size"):
+            return math.ceil(payload["total"] / payload["size"])
+        return None
     
-    async def _fetch_page(self, session: aiohttp.ClientSession, endpoint: str, page: int) -> List[dict]:
+    async def _fetch_page(self, session: aiohttp.ClientSession, endpoint: str, page: int, params: Optional[Dict[str, str]] = None) -> List[dict]:
         """
         Fetch a single page of data asynchronously from the specified endpoint.
 
@@ -57,32 +401,147 @@ class APIDataFetcherAsync:
             session (aiohttp.ClientSession): The aiohttp session used for the HTTP request.
             endpoint (str): The API endpoint to fetch data from.
             page (int): The page number to fetch.
+            params (Optional[Dict[str, str]]): Extra query parameters sent with the request.
+
+        Returns:
+            List[dict]: A list of items from the page, empty if no data is found.
+
+        Raises:
+            aiohttp.ClientError: If the request still fails after the retries.
+        """
+        data = await self._fetch_page_payload(session, endpoint, page, params)
+
+        # Ensure 'items' exists in the response, or handle missing keys gracefully
+        return data.get("items", [])
+
+    async def _fetch_page_payload(self, session: aiohttp.ClientSession, endpoint: str, page: int, params: Optional[Dict[str, str]] = None) -> dict:
+        """
+        Fetch the full JSON payload of a single page (items and pagination metadata).
+
+        Args:
+            session (aiohttp.ClientSession): The aiohttp session used for the HTTP request.
+            endpoint (str): The API endpoint to fetch data from.
+            page (int): The page number to fetch.
+            params (Optional[Dict[str, str]]): Extra query parameters sent with the request.
 
         Returns:
-            List[dict]: A list of items from the page. If the request fails or no data is found, an empty list is returned.
+            dict: The decoded page.
+
+        Raises:
+            aiohttp.ClientError: If the request still fails after the retries.
         """
         url = f"{self.api_url}/{endpoint}?page={page}&size={self.page_size}"
+        if params:
+            url = f"{url}&{urlencode(params)}"
+        return await self._get_json(session, url, endpoint)
+
+    async def _get_json(self, session: aiohttp.ClientSession, url: str, endpoint: str) -> dict:
+        """
+        Send a GET request and decode its JSON body, retrying transient failures.
+
+        Each attempt waits for a slot of the adaptive concurrency limiter. The request
+        count, the size of the body and the latency of each attempt are recorded in
+        the metrics under the endpoint label.
+
+        When the URL is in the HTTP cache, the request is conditional and a 304 response
+        is answered with the cached body.
+
+        Args:
+            session (aiohttp.ClientSession): The aiohttp session used for the HTTP request.
+            url (str): The URL to request.
+            endpoint (str): The API endpoint requested, used as the metrics label.
+
+        Returns:
+            dict: The decoded body.
+
+        Raises:
+            aiohttp.ClientError: If the request fails and must not be retried, or still fails after the retries.
+            asyncio.TimeoutError: If the last attempt timed out.
+            ValueError: If the body is not valid JSON.
+        """
+        timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+        cached = await asyncio.to_thread(self.http_cache.get, url) if self.http_cache is not None else None
+        headers = {"If-None-Match": cached.etag} if cached is not None else None
+        attempt = 0
+        while True:
+            self.metrics.increment("moovitamix_http_requests_total", endpoint=endpoint)
+            try:
+                async with self._limiter.acquire():
+                    with self.metrics.time("moovitamix_http_request_duration_seconds", endpoint=endpoint):
+                        async with session.get(url, timeout=timeout, headers=headers) as response:
+                            # Raise an HTTP exception if the status code is not 200-299
+                            response.raise_for_status()
+                            body = await response.read()
+                            etag = response.headers.get("ETag")
+                            not_modified = cached is not None and response.status == 304
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                await self._wait_before_retry(e, attempt, url, endpoint)
+                attempt += 1
+
+        self.metrics.increment("moovitamix_http_response_bytes_total", len(body), endpoint=endpoint)
+        if not_modified:
+            self.metrics.increment("moovitamix_http_cache_hits_total", endpoint=endpoint)
+            body = cached.body
+        elif etag is not None and self.http_cache is not None:
+            await asyncio.to_thread(self.http_cache.put, url, etag, body)
         try:
-            async with session.get(url) as response:
-                # Raise an HTTP exception if the status code is not 200-299
+            # Decoded from the raw body, skipping the text decoding step of response.json()
+            return self.json_loads(body)
+        except ValueError as e:
+            logger.error(f"Invalid JSON received from {url}: {e}")
+            raise
+
+    async def _send(self, session: aiohttp.ClientSession, url: str, endpoint: str, timeout: aiohttp.ClientTimeout) -> aiohttp.ClientResponse:
+        """
+        Send a GET request, retrying transient failures, and return the response with its body unread.
+
+        Args:
+            session (aiohttp.ClientSession): The aiohttp session used for the HTTP request.
+            url (str): The URL to request.
+            endpoint (str): The API endpoint requested, used as the metrics label.
+            timeout (aiohttp.ClientTimeout): The timeouts of the request.
+
+        Returns:
+            aiohttp.ClientResponse: The successful response, to be released by the caller.
+
+        Raises:
+            aiohttp.ClientError: If the request fails and must not be retried, or still fails after the retries.
+            asyncio.TimeoutError: If the last attempt timed out.
+        """
+        attempt = 0
+        while True:
+            self.metrics.increment("moovitamix_http_requests_total", endpoint=endpoint)
+            response = None
+            try:
+                response = await session.get(url, timeout=timeout)
                 response.raise_for_status()
-                data = await response.json()
-
-                # Ensure 'items' exists in the response, or handle missing keys gracefully
-                items = data.get("items", [])
-                return items
-
-        except aiohttp.ClientResponseError as e:
-            # Specific exception handling for HTTP response errors
-            logger.error(f"HTTP error occurred while fetching data from {url}: {e}")
-        except aiohttp.ClientConnectionError as e:
-            # Handle connection issues
-            logger.error(f"Connection error occurred while accessing {url}: {e}")
-        except aiohttp.ClientPayloadError as e:
-            # Handle payload/response format issues
-            logger.error(f"Payload error occurred while parsing response from {url}: {e}")
-        except Exception as e:
-            # General exception handling for any other issues
-            logger.error(f"Unexpected error occurred while fetching data from {url}: {e}")
-
-        return []
+                return response
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if response is not None:
+                    response.release()
+                await self._wait_before_retry(e, attempt, url, endpoint)
+                attempt += 1
+
+    async def _wait_before_retry(self, error: BaseException, attempt: int, url: str, endpoint: str) -> None:
+        """
+        Wait before retrying a failed request, or raise its error when it must not be retried.
+
+        Args:
+            error (BaseException): The error of the failed attempt.
+            attempt (int): The number of the failed attempt, starting at 0.
+            url (str): The URL requested.
+            endpoint (str): The API endpoint requested, used as the metrics label.
+
+        Raises:
+            BaseException: The error, if the request is not retried.
+        """
+        self.metrics.increment("moovitamix_http_request_errors_total", endpoint=endpoint)
+        delay = self.retry_policy.get_delay(error, attempt)
+        if delay is None:
+            logger.error(f"Request to {url} failed after {attempt + 1} attempt(s): {error!r}")
+            raise error
+
+        self.metrics.increment("moovitamix_http_retries_total", endpoint=endpoint)
+        logger.warning(f"Request to {url} failed ({error!r}), retrying in {delay:.2f}s ({attempt + 1}/{self.retry_policy.max_retries})")
+        await asyncio.sleep(delay)
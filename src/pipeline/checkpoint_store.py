@@ -0,0 +1,170 @@
+import json
+import threading
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+from pipeline.data_category import DataCategory
+from storage.atomic_write import atomic_write
+from logger.logger_config import logger
+from typing import Any, Dict, Optional, Tuple, Union
+
+
+class CheckpointStore:
+    """
+    Small JSON file recording the sync progress of each category.
+
+    For every category it keeps:
+    - `watermark`: the start time of the last complete sync, used as the lower bound
+      of the next incremental fetch without reading the stored dataset.
+    - `in_progress`: the sync being run, with its query parameters, the last page
+      whose records are persisted and the writer baseline, so that an interrupted
+      run resumes after that page instead of starting over.
+
+    The file is rewritten atomically (see storage.atomic_write) after each change.
+
+    Attributes:
+        file_path (Path): The JSON file holding the checkpoints.
+    """
+
+    def __init__(self, storage_dir: str = "data", file_name: str = "checkpoints.json"):
+        """
+        Initializes the CheckpointStore and loads the existing checkpoints.
+
+        Args:
+            storage_dir (str): The directory where the checkpoint file is stored.
+            file_name (str): The name of the checkpoint file.
+
+        Raises:
+            OSError: If the directory creation fails.
+        """
+        try:
+            Path(storage_dir).mkdir(parents=True, exist_ok=True)
+            self.file_path = Path(storage_dir) / file_name
+        except OSError as e:
+            logger.error(f"Failed to create or access checkpoint directory: {storage_dir}. Error: {e}")
+            raise
+
+        self._lock = threading.Lock()
+        self._checkpoints: Dict[str, Dict[str, Any]] = self._load()
+
+    def get_watermark(self, category: Union[str, DataCategory]) -> Optional[pd.Timestamp]:
+        """
+        Returns the high-water mark of the last complete sync of a category.
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data.
+
+        Returns:
+            Optional[pd.Timestamp]: The watermark, or None if the category was never fully synced.
+        """
+        with self._lock:
+            watermark = self._checkpoints.get(self._get_category_str(category), {}).get("watermark")
+        return None if watermark is None else pd.Timestamp(watermark)
+
+    def start(
+        self,
+        category: Union[str, DataCategory],
+        params: Optional[Dict[str, str]],
+        baseline: Optional[pd.Timestamp] = None
+    ) -> Tuple[int, Optional[pd.Timestamp]]:
+        """
+        Starts or resumes the sync of a category.
+
+        An interrupted sync is resumed if it was run with the same query parameters,
+        otherwise a new sync is recorded.
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data.
+            params (Optional[Dict[str, str]]): The query parameters of the fetch.
+            baseline (Optional[pd.Timestamp]): The `charged_at` watermark the storage writer compares
+                records against, recorded for a new sync.
+
+        Returns:
+            Tuple[int, Optional[pd.Timestamp]]: The first page to fetch, and the writer baseline
+                of the sync (the one recorded when it first started, if it is resumed).
+        """
+        category_str = self._get_category_str(category)
+        with self._lock:
+            checkpoint = self._checkpoints.setdefault(category_str, {})
+            in_progress = checkpoint.get("in_progress")
+            if in_progress is not None and in_progress["params"] == params:
+                saved_baseline = in_progress.get("baseline")
+                return in_progress["last_page"] + 1, None if saved_baseline is None else pd.Timestamp(saved_baseline)
+
+            checkpoint["in_progress"] = {
+                "started_at": datetime.now().isoformat(),
+                "params": params,
+                "last_page": 0,
+                "baseline": None if baseline is None else baseline.isoformat(),
+            }
+            self._save()
+        return 1, baseline
+
+    def commit_page(self, category: Union[str, DataCategory], page: int) -> None:
+        """
+        Records that the records of every page up to `page` are persisted.
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data.
+            page (int): The last persisted page.
+
+        Raises:
+            ValueError: If no sync of the category is in progress.
+        """
+        with self._lock:
+            in_progress = self._get_in_progress(category)
+            in_progress["last_page"] = page
+            self._save()
+
+    def complete(self, category: Union[str, DataCategory]) -> None:
+        """
+        Marks the sync of a category as complete: its start time becomes the new watermark.
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data.
+
+        Raises:
+            ValueError: If no sync of the category is in progress.
+        """
+        with self._lock:
+            in_progress = self._get_in_progress(category)
+            # The start time is used rather than the end time, so that records changed
+            # while the sync was running are fetched again by the next one
+            self._checkpoints[self._get_category_str(category)] = {"watermark": in_progress["started_at"]}
+            self._save()
+
+    def reset(self, category: Union[str, DataCategory]) -> None:
+        """
+        Forgets the watermark and the sync in progress of a category, e.g. when its stored data is gone.
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data.
+        """
+        with self._lock:
+            if self._checkpoints.pop(self._get_category_str(category), None) is not None:
+                self._save()
+
+    def _get_in_progress(self, category: Union[str, DataCategory]) -> Dict[str, Any]:
+        in_progress = self._checkpoints.get(self._get_category_str(category), {}).get("in_progress")
+        if in_progress is None:
+            raise ValueError(f"No sync in progress for {self._get_category_str(category)}.")
+        return in_progress
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not self.file_path.exists():
+            return {}
+        try:
+            with open(self.file_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            # A lost checkpoint only costs a full sync, it must not prevent the pipeline from running
+            logger.warning(f"Ignoring unreadable checkpoint file {self.file_path}: {e}")
+            return {}
+
+    def _save(self) -> None:
+        with atomic_write(self.file_path) as file:
+            json.dump(self._checkpoints, file, indent=2)
+
+    @staticmethod
+    def _get_category_str(category: Union[str, DataCategory]) -> str:
+        return category.value if hasattr(category, 'value') else str(category)
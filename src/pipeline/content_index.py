@@ -0,0 +1,217 @@
+import threading
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from pipeline.data_category import DataCategory
+from storage.atomic_write import atomic_write
+from logger.logger_config import logger
+
+# Columns that change without the content of a record changing
+NON_CONTENT_COLUMNS = ('created_at', 'updated_at', 'charged_at')
+
+
+class ContentHashes(NamedTuple):
+    """
+    Content hashes of a set of keys, sorted by key hash so that they can be searched.
+
+    Attributes:
+        keys (np.ndarray): The uint64 hash of each key, sorted and unique.
+        hashes (np.ndarray): The uint64 hash of the content of each key.
+    """
+    keys: np.ndarray
+    hashes: np.ndarray
+
+    @classmethod
+    def empty(cls) -> "ContentHashes":
+        return cls(np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint64))
+
+    @classmethod
+    def concat(cls, contents: List["ContentHashes"]) -> "ContentHashes":
+        """
+        Merges the hashes of several chunks, keeping the first hash of a key as the storage writers do.
+        """
+        if not contents:
+            return cls.empty()
+        keys, first = np.unique(np.concatenate([content.keys for content in contents]), return_index=True)
+        return cls(keys, np.concatenate([content.hashes for content in contents])[first])
+
+
+def hash_content(data_df: pd.DataFrame, key_field: str) -> Tuple[np.ndarray, ContentHashes]:
+    """
+    Hashes the content of each key of a DataFrame.
+
+    The timestamps of NON_CONTENT_COLUMNS are left out, so a record whose `updated_at`
+    moved without any other change keeps its hash. The rows of a key spanning several
+    rows (e.g. one row per track) are combined into a single hash.
+
+    Args:
+        data_df (pd.DataFrame): The cleaned records.
+        key_field (str): The field identifying records.
+
+    Returns:
+        Tuple[np.ndarray, ContentHashes]: The hash of the key of each row, and the content hash of each key.
+    """
+    if data_df.empty:
+        return np.empty(0, dtype=np.uint64), ContentHashes.empty()
+
+    content_df = data_df.drop(columns=[column for column in NON_CONTENT_COLUMNS if column in data_df.columns])
+    for column in content_df.columns:
+        # Lists cannot be hashed, their text is
+        if _is_list_column(content_df[column]):
+            content_df[column] = content_df[column].map(str)
+    row_hashes = pd.util.hash_pandas_object(content_df, index=False).to_numpy()
+    row_keys = pd.util.hash_array(data_df[key_field].to_numpy())
+
+    order = np.argsort(row_keys, kind='stable')
+    sorted_keys = row_keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    # Row hashes include every column (e.g. the position of a track), so their wrapping sum is enough
+    hashes = np.add.reduceat(row_hashes[order], starts) if len(starts) < len(order) else row_hashes[order]
+    return row_keys, ContentHashes(sorted_keys[starts], hashes)
+
+
+def _is_list_column(series: pd.Series) -> bool:
+    if isinstance(series.dtype, pd.ArrowDtype):
+        return str(series.dtype.pyarrow_dtype).startswith('list<')
+    if series.dtype == object:
+        first = series.first_valid_index()
+        return first is not None and isinstance(series[first], (list, tuple, np.ndarray))
+    return False
+
+
+def select_changed_content(data_df: pd.DataFrame, key_field: str, known: ContentHashes) -> Tuple[pd.DataFrame, ContentHashes]:
+    """
+    Drops the keys whose content is the same as in the index.
+
+    Args:
+        data_df (pd.DataFrame): The cleaned records.
+        key_field (str): The field identifying records.
+        known (ContentHashes): The content hashes of the stored keys.
+
+    Returns:
+        Tuple[pd.DataFrame, ContentHashes]: The rows of the new and changed keys, and their content hashes.
+    """
+    row_keys, content = hash_content(data_df, key_field)
+    if not len(known.keys) or not len(content.keys):
+        return data_df, content
+
+    positions = np.minimum(np.searchsorted(known.keys, content.keys), len(known.keys) - 1)
+    changed = (known.keys[positions] != content.keys) | (known.hashes[positions] != content.hashes)
+    if changed.all():
+        return data_df, content
+
+    changed_keys = content.keys[changed]
+    return data_df[np.isin(row_keys, changed_keys)], ContentHashes(changed_keys, content.hashes[changed])
+
+
+class ContentIndex:
+    """
+    Persistent index of the content hash of every stored key, per category.
+
+    The storages detect changes from `updated_at`, so a record whose `updated_at`
+    moved but whose content did not is rewritten anyway. The pipeline looks the
+    cleaned records up in this index before writing them (see select_changed_content)
+    and only hands the new and changed keys to the storage.
+
+    Each category is kept as two sorted uint64 arrays (key hash, content hash) in
+    `<storage_dir>/<dir_name>/<category>.npz`, about 16 bytes per key, rewritten
+    atomically (see atomic_write) when new hashes are committed.
+
+    Attributes:
+        index_dir (Path): The directory holding the index of each category.
+    """
+
+    def __init__(self, storage_dir: str = "data", dir_name: str = "content_index"):
+        """
+        Initializes the ContentIndex in the specified directory.
+
+        Args:
+            storage_dir (str): The directory where the index directory is created.
+            dir_name (str): The name of the index directory.
+
+        Raises:
+            OSError: If the directory creation fails.
+        """
+        try:
+            self.index_dir = Path(storage_dir) / dir_name
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            logger.error(f"Failed to create or access content index directory: {storage_dir}. Error: {e}")
+            raise
+
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, ContentHashes] = {}
+
+    def get(self, category: Union[str, DataCategory]) -> ContentHashes:
+        """
+        Returns the content hashes of the stored keys of a category.
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data.
+
+        Returns:
+            ContentHashes: The hashes, empty if the category was never indexed.
+        """
+        category_str = self._get_category_str(category)
+        with self._lock:
+            if category_str not in self._indexes:
+                self._indexes[category_str] = self._load(category_str)
+            return self._indexes[category_str]
+
+    def commit(self, category: Union[str, DataCategory], content: ContentHashes) -> None:
+        """
+        Records the content hashes of keys that were written to the storage.
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data.
+            content (ContentHashes): The hashes of the written keys, replacing those already indexed.
+        """
+        if not len(content.keys):
+            return
+
+        known = self.get(category)
+        kept = ~np.isin(known.keys, content.keys)
+        keys = np.concatenate([known.keys[kept], content.keys])
+        hashes = np.concatenate([known.hashes[kept], content.hashes])
+        order = np.argsort(keys, kind='stable')
+        self._save(self._get_category_str(category), ContentHashes(keys[order], hashes[order]))
+
+    def reset(self, category: Union[str, DataCategory]) -> None:
+        """
+        Forgets the keys of a category, e.g. when its stored data is gone.
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data.
+        """
+        category_str = self._get_category_str(category)
+        with self._lock:
+            self._indexes[category_str] = ContentHashes.empty()
+            self._get_file_path(category_str).unlink(missing_ok=True)
+
+    def _load(self, category_str: str) -> ContentHashes:
+        file_path = self._get_file_path(category_str)
+        if not file_path.exists():
+            return ContentHashes.empty()
+        try:
+            with np.load(file_path) as arrays:
+                return ContentHashes(arrays["keys"], arrays["hashes"])
+        except (OSError, ValueError, KeyError) as e:
+            # A lost index only costs a full write, it must not prevent the pipeline from running
+            logger.warning(f"Ignoring unreadable content index {file_path}: {e}")
+            return ContentHashes.empty()
+
+    def _save(self, category_str: str, content: ContentHashes) -> None:
+        with self._lock:
+            with atomic_write(self._get_file_path(category_str), mode="wb") as file:
+                np.savez(file, keys=content.keys, hashes=content.hashes)
+            self._indexes[category_str] = content
+
+    def _get_file_path(self, category_str: str) -> Path:
+        return self.index_dir / f"{category_str}.npz"
+
+    @staticmethod
+    def _get_category_str(category: Union[str, DataCategory]) -> str:
+        return category.value if hasattr(category, 'value') else str(category)
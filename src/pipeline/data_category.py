@@ -12,4 +12,14 @@ class DataCategory(Enum):
     
     TRACKS = 'tracks'
     USERS = 'users'
-    LISTEN_HISTORY = 'listen_history'
\ No newline at end of file
+    LISTEN_HISTORY = 'listen_history'
+
+    @property
+    def key_field(self) -> str:
+        """
+        The field that uniquely identifies a record of this category.
+
+        Returns:
+            str: 'user_id' for listen history, 'id' otherwise.
+        """
+        return 'user_id' if self is DataCategory.LISTEN_HISTORY else 'id'
@@ -1,8 +1,18 @@
+import asyncio
+import multiprocessing
+import time
 import pandas as pd
-from typing import List, Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from pipeline.api_data_fetcher_async import APIDataFetcherAsync
+from pipeline.checkpoint_store import CheckpointStore
+from pipeline.content_index import ContentHashes, ContentIndex, select_changed_content
 from pipeline.data_category import DataCategory
-from storage.storage import Storage
+from pipeline.metrics import Metrics
+from pipeline.schemas import clean_records
+from pipeline.sharding import clean_and_write_shard, split_records
+from pipeline.write_behind import WriteBehindQueue
+from storage.storage import SaveResult, Storage, StorageWriter
 from logger.logger_config import logger
 
 class DataPipeline:
@@ -13,43 +23,120 @@ class DataPipeline:
     Attributes:
         data_storage (Storage): An instance of the storage handler for saving data.
         data_fetcher (APIDataFetcherAsync): An asynchronous data fetcher to retrieve data from APIs.
+        chunk_size (int): The number of records cleaned and written at once in streaming mode.
+        max_pending_chunks (int): The number of chunks the fetch stage may get ahead of
+            the write stage in streaming mode before it waits.
+        incremental (bool): Whether to only request the records created or updated
+            since the high-water mark of the storage.
+        checkpoints (Optional[CheckpointStore]): The store recording the watermark and the
+            progress of each category, to resume interrupted runs.
+        metrics (Metrics): The registry recording the duration of each stage and the number
+            of rows going through it, per category. It is exported at the end of each run.
+        workers (int): The number of processes cleaning and saving the shards of a category
+            when it is loaded in memory at once (see fetch_and_save). 1 keeps all the work
+            in the pipeline process.
+        content_index (Optional[ContentIndex]): The index of the content hash of every stored key.
+            The cleaned keys whose content did not change are not handed to the storage.
+        write_behind (Optional[WriteBehindQueue]): The queue the writes of each category are handed
+            to, so that the next category is fetched while the previous one is saved. None
+            saves each category before returning from fetch_and_save/stream_and_save.
     """
     
-    def __init__(self, storage: Storage, fetcher: APIDataFetcherAsync):
+    def __init__(self, storage: Storage, fetcher: APIDataFetcherAsync, chunk_size: int = 10_000, max_pending_chunks: int = 2, incremental: bool = False, checkpoints: Optional[CheckpointStore] = None, metrics: Optional[Metrics] = None, workers: int = 1, content_index: Optional[ContentIndex] = None, write_behind: Optional[WriteBehindQueue] = None):
         """
         Initializes the DataPipeline with the required storage and data fetcher.
 
         Args:
             storage (Storage): A storage instance to handle data persistence.
             fetcher (APIDataFetcherAsync): An API data fetcher instance to retrieve data asynchronously.
+            chunk_size (int): The number of records cleaned and written at once in streaming mode.
+            max_pending_chunks (int): The maximum number of fetched chunks waiting to be written in streaming mode.
+            incremental (bool): Whether to only request the records changed since the storage high-water mark.
+            checkpoints (Optional[CheckpointStore]): The store recording the watermark and the progress
+                of each category. Without it, the watermark is read from the storage and an interrupted
+                run starts over.
+            metrics (Optional[Metrics]): The registry the stage metrics are recorded in, usually
+                shared with the fetcher so that a single export holds both. A private one without
+                sinks is created by default.
+            workers (int): The number of processes cleaning and saving the shards of a category.
+            content_index (Optional[ContentIndex]): The index used to skip the keys whose content did not change.
+                Without it, the storage decides from `updated_at` alone.
+            write_behind (Optional[WriteBehindQueue]): The queue running the writes in the background.
+                They are all awaited at the end of run().
+
+        Raises:
+            ValueError: If workers is lower than 1.
         """
+        if workers < 1:
+            raise ValueError("workers must be greater than or equal to 1.")
+
         self.data_storage = storage
         self.data_fetcher = fetcher  
+        self.chunk_size = chunk_size
+        self.max_pending_chunks = max_pending_chunks
+        self.incremental = incremental
+        self.checkpoints = checkpoints
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.workers = workers
+        self.content_index = content_index
+        self.write_behind = write_behind
+        self._executor: Optional[ProcessPoolExecutor] = None
     
-    def clean_data(self, data: List[Dict[str, Any]], key_field: str) -> pd.DataFrame:
+    def clean_data(self, data: List[Dict[str, Any]], key_field: str, category: Optional[DataCategory] = None) -> pd.DataFrame:
         """
         Cleans and validates data using a DataFrame. This method:
         - Removes rows with missing required fields.
         - Removes duplicates based on the 'id' field.
 
+        When the category is given, the DataFrame is built with the compact dtypes of
+        its schema (see pipeline.schemas) instead of generic object columns. Listen
+        histories are then exploded to one row per track, unless the storage keeps
+        list columns.
+
         Args:
             data (list): The list of data to clean.
-            required_fields (list): The list of fields that must be present in each record.
+            key_field (str): The field used to remove duplicates.
+            category (Optional[DataCategory]): The category of the data, to type the columns.
 
         Returns:
             pd.DataFrame: The cleaned DataFrame.
         """        
 
-        df = pd.DataFrame(data)
-        df_cleaned = df.dropna(how='any')
-        df_cleaned = df_cleaned.drop_duplicates(subset=[key_field])
+        return clean_records(data, key_field, category, explode_lists=not self.data_storage.supports_list_columns)
+
+    def _record_stage(self, category: DataCategory, stage: str, seconds: float, rows: Optional[int] = None) -> None:
+        """
+        Records the duration of a stage call and, if given, the number of rows it produced.
+        """
+        self.metrics.observe("moovitamix_stage_duration_seconds", seconds, category=category.value, stage=stage)
+        if rows is not None:
+            self.metrics.increment("moovitamix_rows_total", rows, category=category.value, stage=stage)
 
-        return df_cleaned
+    def _record_save_result(self, category: DataCategory, result: Any) -> None:
+        # Storages written before SaveResult existed return None
+        if isinstance(result, SaveResult):
+            self.metrics.increment("moovitamix_rows_total", result.inserted, category=category.value, stage="inserted")
+            self.metrics.increment("moovitamix_rows_total", result.updated, category=category.value, stage="updated")
+
+    async def _timed(self, category: DataCategory, stage: str, function: Callable, *args: Any) -> Any:
+        """
+        Runs a blocking function in a worker thread and records its duration under `stage`.
+        """
+        start = time.perf_counter()
+        try:
+            return await asyncio.to_thread(function, *args)
+        finally:
+            self._record_stage(category, stage, time.perf_counter() - start)
 
     async def fetch_and_save(self, category: DataCategory, key_field: str) -> None:
         """
         Fetches data for a given category and saves it using the provided key field.
 
+        The blocking pandas cleaning and storage work is offloaded to a worker thread
+        so that it does not stall the event loop while other categories are downloading.
+        With several workers, it is sharded across processes instead (see _clean_and_save_shards).
+        With a write-behind queue, it is queued and this returns once the data is fetched.
+
         Args:
             category (str): The category of data to fetch (e.g., 'tracks', 'users', 'listen_history').
             key_field (str): The key field used for saving the data (e.g., 'id', 'user_id').
@@ -59,18 +146,318 @@ class DataPipeline:
         """
         try:
             logger.info(f'Fetching data for {category.value}')
-            data = await self.data_fetcher.fetch_all_data(category.value)
-            logger.info(f'No data for {category.value}')
-            if data:
-                logger.info(f'Cleaning data for {category.value}')
-                cleaned_data_df = self.clean_data(data, key_field)
-                logger.info(f'Saving data for {category.value}')
-                self.data_storage.save_data(category, cleaned_data_df, key_field)
+            params = await self._get_fetch_params(category)
+            if self.checkpoints is not None:
+                # Nothing is persisted before the end of the fetch, the sync always starts at the first page
+                await asyncio.to_thread(self.checkpoints.start, category, params)
+
+            start = time.perf_counter()
+            data = await self.data_fetcher.fetch_all_data(category.value, params=params)
+            self._record_stage(category, "fetch", time.perf_counter() - start, rows=len(data))
+            await self._write(category, lambda: self._save_fetched(category, key_field, data))
         except Exception as e:
             logger.error(f'Failed to fetch and save data for {category.value}: {e}')
             raise e
 
-    async def run(self) -> None:
+    async def _save_fetched(self, category: DataCategory, key_field: str, data: List[Dict[str, Any]]) -> None:
+        """
+        Cleans and saves the fetched records of a category, then marks its sync as complete.
+
+        Args:
+            category (DataCategory): The category of the data.
+            key_field (str): The key field used for saving the data.
+            data (List[Dict[str, Any]]): The fetched records.
+        """
+        known = await self._get_known_content(category) if data else None
+        if data and self.workers > 1:
+            logger.info(f'Cleaning and saving data for {category.value} in {self.workers} shards')
+            rows, result = await self._clean_and_save_shards(category, key_field, data, known)
+            self.metrics.increment("moovitamix_rows_total", rows, category=category.value, stage="clean")
+            self._record_save_result(category, result)
+        elif data:
+            logger.info(f'Cleaning data for {category.value}')
+            cleaned_data_df = await self._timed(category, "clean", self.clean_data, data, key_field, category)
+            self.metrics.increment("moovitamix_rows_total", len(cleaned_data_df), category=category.value, stage="clean")
+            content = None
+            if known is not None:
+                cleaned_data_df, content = await self._select_changed_content(category, cleaned_data_df, key_field, known)
+            if cleaned_data_df.empty:
+                logger.info(f'No changed content to save for {category.value}')
+            else:
+                logger.info(f'Saving data for {category.value}')
+                result = await self._timed(category, "save", self.data_storage.save_data, category, cleaned_data_df, key_field)
+                self._record_save_result(category, result)
+            if content is not None:
+                await asyncio.to_thread(self.content_index.commit, category, content)
+        else:
+            logger.info(f'No data for {category.value}')
+
+        if self.checkpoints is not None:
+            await asyncio.to_thread(self.checkpoints.complete, category)
+
+    async def _write(self, category: DataCategory, write: Callable[[], Awaitable[None]]) -> None:
+        """
+        Runs the write of a category now, or hands it to the write-behind queue.
+        """
+        if self.write_behind is None:
+            await write()
+        else:
+            await self.write_behind.submit(category.value, write)
+
+    async def _clean_and_save_shards(
+        self,
+        category: DataCategory,
+        key_field: str,
+        data: List[Dict[str, Any]],
+        known: Optional[ContentHashes] = None
+    ) -> Tuple[int, SaveResult]:
+        """
+        Cleans and saves the records of a category in shards, processed in parallel by the worker processes.
+
+        The records are split by the hash of their key, so every version of a key lands in
+        the same shard and the shards can be deduplicated independently. When the writer
+        of the storage supports it, each worker also writes its shard; otherwise the
+        cleaned shards are written by this process as they come, as chunks of the writer.
+        The content hashes of the written keys are committed to the content index once
+        the writer is closed.
+
+        Args:
+            category (DataCategory): The category of the data.
+            key_field (str): The key field used for saving the data.
+            data (List[Dict[str, Any]]): The fetched records.
+            known (Optional[ContentHashes]): The content hashes of the stored keys, looked up by the workers.
+
+        Returns:
+            Tuple[int, SaveResult]: The number of cleaned rows, and the records inserted and updated.
+        """
+        writer = await asyncio.to_thread(self.data_storage.open_writer, category, key_field)
+        shard_writer = writer if writer.parallel_writes else None
+        explode_lists = not self.data_storage.supports_list_columns
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        shards = [
+            loop.run_in_executor(executor, clean_and_write_shard, records, key_field, category, explode_lists, shard_writer, known)
+            for records in split_records(data, key_field, self.workers) if records
+        ]
+
+        rows = 0
+        contents = []
+        for shard in asyncio.as_completed(shards):
+            shard_result = await shard
+            rows += shard_result.rows
+            self._record_stage(category, "clean", shard_result.clean_seconds)
+            if shard_result.content is not None:
+                contents.append(shard_result.content)
+                self.metrics.increment("moovitamix_rows_total", shard_result.unchanged, category=category.value, stage="unchanged")
+            if shard_writer is not None:
+                self._record_stage(category, "save", shard_result.save_seconds)
+                writer.result += shard_result.result
+            elif not shard_result.data_df.empty:
+                await self._timed(category, "save", writer.write, shard_result.data_df)
+        await self._timed(category, "save", writer.close)
+        if known is not None:
+            await asyncio.to_thread(self.content_index.commit, category, ContentHashes.concat(contents))
+        return rows, writer.result
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Forking a process running the event loop and its threads is unsafe, the workers are spawned
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def _get_known_content(self, category: DataCategory) -> Optional[ContentHashes]:
+        """
+        Returns the content hashes of the stored keys of a category, or None without a content index.
+
+        The index is reset when the storage holds no data for the category, so that a
+        deleted dataset is written again in full.
+        """
+        if self.content_index is None:
+            return None
+        if await asyncio.to_thread(self.data_storage.read_watermark, category) is None:
+            await asyncio.to_thread(self.content_index.reset, category)
+        return await asyncio.to_thread(self.content_index.get, category)
+
+    async def _select_changed_content(
+        self,
+        category: DataCategory,
+        data_df: pd.DataFrame,
+        key_field: str,
+        known: ContentHashes
+    ) -> Tuple[pd.DataFrame, ContentHashes]:
+        """
+        Drops the keys whose content did not change and records how many rows were skipped.
+        """
+        changed_df, content = await self._timed(category, "dedup", select_changed_content, data_df, key_field, known)
+        self.metrics.increment("moovitamix_rows_total", len(data_df) - len(changed_df), category=category.value, stage="unchanged")
+        return changed_df, content
+
+    async def _get_fetch_params(self, category: DataCategory) -> Optional[Dict[str, str]]:
+        """
+        Builds the query parameters restricting the fetch to the records changed since the last load.
+
+        The watermark comes from the checkpoint store when it knows the category (the start
+        of its last complete sync), otherwise from the storage. When the storage holds no
+        data for the category, e.g. after switching backends or deleting a dataset, the
+        checkpoint describes data that is not there: it is reset and the category is loaded
+        in full, as the content index is (see _get_known_content).
+
+        Args:
+            category (DataCategory): The category of data to fetch.
+
+        Returns:
+            Optional[Dict[str, str]]: The `updated_since`/`created_since` parameters, or None for a full load.
+        """
+        if not self.incremental:
+            return None
+
+        watermark = await asyncio.to_thread(self.data_storage.read_watermark, category)
+        if watermark is None:
+            if self.checkpoints is not None:
+                await asyncio.to_thread(self.checkpoints.reset, category)
+            return None
+        if self.checkpoints is not None:
+            checkpoint_watermark = await asyncio.to_thread(self.checkpoints.get_watermark, category)
+            if checkpoint_watermark is not None:
+                watermark = checkpoint_watermark
+
+        since = watermark.isoformat()
+        logger.info(f'Fetching {category.value} changed since {since}')
+        return {'updated_since': since, 'created_since': since}
+
+    async def stream_and_save(self, category: DataCategory, key_field: str) -> None:
+        """
+        Fetches data for a given category page by page and saves it in bounded chunks.
+
+        The fetch stage groups pages into chunks of about chunk_size records and hands
+        them to the write stage through a bounded queue: when max_pending_chunks chunks
+        are waiting, fetching pauses until the write stage catches up, so memory stays
+        flat regardless of the size of the endpoint.
+
+        With a checkpoint store and a writer persisting each chunk, the last page of every
+        written chunk is recorded, and an interrupted sync resumes after it.
+
+        With a write-behind queue, closing the writer (e.g. applying the pending updates)
+        is queued, and the next category starts streaming meanwhile.
+
+        Args:
+            category (DataCategory): The category of data to fetch.
+            key_field (str): The key field used for saving the data (e.g., 'id', 'user_id').
+
+        Raises:
+            Exception: Propagates any exceptions encountered during fetching or saving.
+        """
+        chunks: asyncio.Queue = asyncio.Queue(maxsize=self.max_pending_chunks)
+        end_of_data = object()
+
+        async def fetch_chunks(params: Optional[Dict[str, str]], start_page: int) -> None:
+            try:
+                buffer = []
+                # Empty pages are skipped by the fetcher, so this may lag behind the real page
+                # number: a resumed sync then fetches a few pages again, which is harmless
+                page = start_page - 1
+                pages = self.data_fetcher.iter_pages(category.value, params=params, start_page=start_page)
+                while True:
+                    # Only the time spent waiting for a page counts as fetch time, not the
+                    # time spent waiting for room in the queue
+                    start = time.perf_counter()
+                    try:
+                        page_data = await pages.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        self._record_stage(category, "fetch", time.perf_counter() - start)
+                    page += 1
+                    self.metrics.increment("moovitamix_rows_total", len(page_data), category=category.value, stage="fetch")
+                    buffer.extend(page_data)
+                    if len(buffer) >= self.chunk_size:
+                        await chunks.put((buffer, page))
+                        buffer = []
+                if buffer:
+                    await chunks.put((buffer, page))
+            except Exception:
+                # Wake up the write stage, the error is raised again when awaiting the task
+                await chunks.put(end_of_data)
+                raise
+            await chunks.put(end_of_data)
+
+        try:
+            logger.info(f'Streaming data for {category.value}')
+            params = await self._get_fetch_params(category)
+            # Opening a writer reads the stored watermark or dataset, which blocks
+            writer = await asyncio.to_thread(self.data_storage.open_writer, category, key_field)
+            start_page = await self._start_sync(category, params, writer)
+            known = await self._get_known_content(category)
+            producer = asyncio.create_task(fetch_chunks(params, start_page))
+            records = 0
+            contents = []
+
+            try:
+                while (item := await chunks.get()) is not end_of_data:
+                    chunk, last_page = item
+                    records += len(chunk)
+                    cleaned_chunk_df = await self._timed(category, "clean", self.clean_data, chunk, key_field, category)
+                    self.metrics.increment("moovitamix_rows_total", len(cleaned_chunk_df), category=category.value, stage="clean")
+                    if known is not None:
+                        cleaned_chunk_df, content = await self._select_changed_content(category, cleaned_chunk_df, key_field, known)
+                        contents.append(content)
+                    await self._timed(category, "save", writer.write, cleaned_chunk_df)
+                    if self.checkpoints is not None and writer.durable_chunks:
+                        await asyncio.to_thread(self.checkpoints.commit_page, category, last_page)
+            except BaseException:
+                producer.cancel()
+                raise
+
+            # Surface fetch errors before committing the pending writes
+            await producer
+
+            async def flush() -> None:
+                await self._timed(category, "save", writer.close)
+                self._record_save_result(category, getattr(writer, "result", None))
+                if known is not None:
+                    await asyncio.to_thread(self.content_index.commit, category, ContentHashes.concat(contents))
+                if self.checkpoints is not None:
+                    await asyncio.to_thread(self.checkpoints.complete, category)
+
+                if records:
+                    logger.info(f'Streamed {records} records for {category.value}')
+                else:
+                    logger.info(f'No data for {category.value}')
+
+            await self._write(category, flush)
+        except Exception as e:
+            logger.error(f'Failed to stream and save data for {category.value}: {e}')
+            raise e
+
+    async def _start_sync(self, category: DataCategory, params: Optional[Dict[str, str]], writer: StorageWriter) -> int:
+        """
+        Records the start of a streamed sync in the checkpoint store, or finds the page to resume from.
+
+        When a sync is resumed, the writer is given back the baseline it had when the sync
+        first started: the records persisted before the interruption raised the storage
+        watermark, and the remaining ones must not be compared against it.
+
+        Args:
+            category (DataCategory): The category of data to fetch.
+            params (Optional[Dict[str, str]]): The query parameters of the fetch.
+            writer (StorageWriter): The writer of the category.
+
+        Returns:
+            int: The first page to fetch.
+        """
+        if self.checkpoints is None:
+            return 1
+
+        start_page, baseline = await asyncio.to_thread(self.checkpoints.start, category, params, writer.max_charged_at)
+        if start_page > 1:
+            if not writer.durable_chunks or not self.data_fetcher.can_resume:
+                # The interrupted sync was written by another storage backend, or fetched with cursors
+                return 1
+            writer.max_charged_at = baseline
+            logger.info(f'Resuming {category.value} from page {start_page}')
+        return start_page
+
+    async def run(self, parallel: bool = False, streaming: bool = False, categories: Optional[List[DataCategory]] = None) -> None:
         """
         Executes the data pipeline by fetching data from multiple sources
         asynchronously and saving it to the specified storage.
@@ -78,17 +465,79 @@ class DataPipeline:
         The pipeline fetches data for 'tracks', 'users', and 'listen_history',
         then stores each dataset using the corresponding key field ('id' or 'user_id').
 
+        The fetcher is opened for the whole run so that every category shares
+        the same pooled HTTP session.
+
         Logs the start, completion, and any errors encountered during execution.
+
+        The metrics are exported to their sinks at the end of the run, whether it succeeded or not,
+        once the pending writes of the write-behind queue are done, and the worker processes are stopped.
+
+        Args:
+            parallel (bool): If True, all the categories are ingested concurrently and a
+                failing category does not cancel the others. Otherwise they are ingested
+                one after the other.
+            streaming (bool): If True, each category is fetched, cleaned and saved in bounded
+                chunks (see stream_and_save) instead of being loaded in memory at once.
+            categories (Optional[List[DataCategory]]): The categories to ingest, all of them if None.
+
+        Raises:
+            Exception: The error of a failed run (a RuntimeError listing the failed categories
+                in parallel mode), raised once the pending writes are done and the metrics exported.
         """
+        start = time.perf_counter()
         try:
             logger.info('Start pipeline')
 
-            await self.fetch_and_save(DataCategory.TRACKS, 'id')
-            await self.fetch_and_save(DataCategory.USERS, 'id')
-            await self.fetch_and_save(DataCategory.LISTEN_HISTORY, 'user_id')
+            async with self.data_fetcher:
+                ingest = self.stream_and_save if streaming else self.fetch_and_save
+                categories = categories or list(DataCategory)
+                if parallel:
+                    await self._run_parallel(ingest, categories)
+                else:
+                    for category in categories:
+                        await ingest(category, category.key_field)
+            if self.write_behind is not None:
+                await self.write_behind.drain()
 
             logger.info('Pipeline executed successfully')
         except Exception as e:
             logger.error(f'An error occurred while running the pipeline: {e}')
+            raise
+        finally:
+            if self.write_behind is not None:
+                # The categories fetched before a failure are still saved
+                try:
+                    await self.write_behind.drain()
+                except Exception as e:
+                    logger.error(f'An error occurred while flushing the pending writes: {e}')
+            self.metrics.observe("moovitamix_run_duration_seconds", time.perf_counter() - start)
+            await asyncio.to_thread(self.metrics.export)
+            if self._executor is not None:
+                await asyncio.to_thread(self._executor.shutdown)
+                self._executor = None
+
+    async def _run_parallel(self, ingest: Callable[[DataCategory, str], Awaitable[None]], categories: List[DataCategory]) -> None:
+        """
+        Ingests all the categories concurrently.
+
+        Each category runs in its own task; failures are collected instead of
+        cancelling the remaining tasks, and reported once every category is done.
+
+        Args:
+            ingest (Callable): The coroutine function ingesting one category.
+            categories (List[DataCategory]): The categories to ingest.
+
+        Raises:
+            RuntimeError: If at least one category failed.
+        """
+        results = await asyncio.gather(
+            *(ingest(category, category.key_field) for category in categories),
+            return_exceptions=True
+        )
+
+        failed = [category.value for category, result in zip(categories, results) if isinstance(result, Exception)]
+        if failed:
+            raise RuntimeError(f"Ingestion failed for: {', '.join(failed)}")
 
 
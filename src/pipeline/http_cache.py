@@ -0,0 +1,138 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from logger.logger_config import logger
+
+
+class CachedResponse(NamedTuple):
+    """A response body stored with the ETag it was served with."""
+    etag: str
+    body: bytes
+
+
+class HTTPCache:
+    """
+    On-disk cache of API responses, keyed by URL and revalidated with their ETag.
+
+    Each response is stored in its own file, named after the hash of its URL, holding
+    the ETag on the first line followed by the body. The modification time of the file
+    records its last use: it is refreshed on every hit, so the least recently used
+    responses are evicted first once the cache exceeds max_bytes, including across runs.
+
+    Attributes:
+        cache_dir (Path): The directory holding the cached responses.
+        max_bytes (int): The maximum total size of the cached files.
+    """
+
+    SUFFIX = ".cache"
+
+    def __init__(self, cache_dir: str = "data/http_cache", max_bytes: int = 256 * 1024 * 1024):
+        """
+        Initializes the HTTPCache and indexes the responses cached by previous runs.
+
+        Args:
+            cache_dir (str): The directory holding the cached responses.
+            max_bytes (int): The maximum total size of the cached files.
+
+        Raises:
+            OSError: If the directory creation fails.
+        """
+        try:
+            Path(cache_dir).mkdir(parents=True, exist_ok=True)
+            self.cache_dir = Path(cache_dir)
+        except OSError as e:
+            logger.error(f"Failed to create or access HTTP cache directory: {cache_dir}. Error: {e}")
+            raise
+
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+
+        entries = sorted(
+            (entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(self.SUFFIX)),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in entries:
+            size = entry.stat().st_size
+            self._sizes[entry.name] = size
+            self._total_bytes += size
+        self._evict()
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        """
+        Returns the cached response of a URL and marks it as recently used.
+
+        Args:
+            url (str): The requested URL.
+
+        Returns:
+            Optional[CachedResponse]: The cached response, or None if the URL is not cached.
+        """
+        name = self._get_file_name(url)
+        with self._lock:
+            if name not in self._sizes:
+                return None
+            self._sizes.move_to_end(name)
+
+        file_path = self.cache_dir / name
+        try:
+            content = file_path.read_bytes()
+            os.utime(file_path)
+        except OSError as e:
+            logger.warning(f"Ignoring unreadable HTTP cache entry for {url}: {e}")
+            self._forget(name)
+            return None
+
+        etag, _, body = content.partition(b"\n")
+        return CachedResponse(etag.decode("ascii"), body)
+
+    def put(self, url: str, etag: str, body: bytes) -> None:
+        """
+        Stores the response of a URL, then evicts the least recently used responses if the cache is full.
+
+        Args:
+            url (str): The requested URL.
+            etag (str): The ETag the response was served with.
+            body (bytes): The response body.
+        """
+        name = self._get_file_name(url)
+        content = etag.encode("ascii") + b"\n" + body
+        if len(content) > self.max_bytes:
+            return
+
+        file_path = self.cache_dir / name
+        tmp_path = file_path.with_name(f"{name}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_bytes(content)
+            os.replace(tmp_path, file_path)
+        except OSError as e:
+            # The cache is an optimization, a failed write must not fail the fetch
+            logger.warning(f"Failed to cache the response of {url}: {e}")
+            return
+
+        with self._lock:
+            self._total_bytes += len(content) - self._sizes.pop(name, 0)
+            self._sizes[name] = len(content)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes and self._sizes:
+            name, size = self._sizes.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                (self.cache_dir / name).unlink()
+            except FileNotFoundError:
+                pass
+
+    def _forget(self, name: str) -> None:
+        with self._lock:
+            self._total_bytes -= self._sizes.pop(name, 0)
+
+    @classmethod
+    def _get_file_name(cls, url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest() + cls.SUFFIX
@@ -0,0 +1,35 @@
+"""
+JSON codec of the pipeline: orjson when it is installed, the standard library otherwise.
+
+orjson decodes the API pages several times faster than `json` and is an optional
+dependency; both backends return the same Python objects.
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Decode a JSON document.
+
+    Args:
+        data (Union[bytes, str]): The JSON document.
+
+    Returns:
+        Any: The decoded value.
+
+    Raises:
+        ValueError: If the document is not valid JSON.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
@@ -0,0 +1,260 @@
+import json
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from storage.atomic_write import atomic_write
+from logger.logger_config import logger
+
+Labels = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """
+    Distribution of observed values in cumulative buckets, as in Prometheus.
+
+    Attributes:
+        buckets (Tuple[float, ...]): The upper bounds of the buckets.
+        counts (List[int]): The number of observations lower than or equal to each bound.
+        count (int): The number of observations.
+        sum (float): The sum of the observed values.
+        max (float): The largest observed value.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimates a quantile as the upper bound of the bucket holding it.
+        """
+        if not self.count:
+            return None
+        rank = math.ceil(q * self.count)
+        for bound, count in zip(self.buckets, self.counts):
+            if count >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:
+    """
+    Thread-safe registry of the counters and histograms of a pipeline run.
+
+    Metrics are identified by a name and a set of labels (e.g. the category and
+    the stage). The pipeline, the fetcher and the storages record into the same
+    registry, which is written to the sinks by export().
+
+    Attributes:
+        sinks (List[MetricsSink]): The sinks the metrics are exported to.
+    """
+
+    def __init__(self, sinks: Optional[List["MetricsSink"]] = None):
+        self.sinks = list(sinks or [])
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        """
+        Adds `value` to a counter.
+
+        Args:
+            name (str): The name of the counter.
+            value (float): The amount to add.
+            **labels (str): The labels of the counter.
+        """
+        key = self._labels(labels)
+        with self._lock:
+            counters = self._counters.setdefault(name, {})
+            counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """
+        Records a value in a histogram.
+
+        Args:
+            name (str): The name of the histogram.
+            value (float): The observed value.
+            **labels (str): The labels of the histogram.
+        """
+        key = self._labels(labels)
+        with self._lock:
+            histograms = self._histograms.setdefault(name, {})
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def time(self, name: str, **labels: str) -> Iterator[None]:
+        """
+        Records the duration of the block, in seconds, in a histogram.
+
+        Args:
+            name (str): The name of the histogram.
+            **labels (str): The labels of the histogram.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def get_counter(self, name: str, **labels: str) -> float:
+        """
+        Returns the value of a counter, 0 if it was never incremented.
+        """
+        with self._lock:
+            return self._counters.get(name, {}).get(self._labels(labels), 0)
+
+    def get_histogram(self, name: str, **labels: str) -> Optional[Histogram]:
+        """
+        Returns a histogram, or None if nothing was observed.
+        """
+        with self._lock:
+            return self._histograms.get(name, {}).get(self._labels(labels))
+
+    def snapshot(self) -> Tuple[Dict[str, Dict[Labels, float]], Dict[str, Dict[Labels, Histogram]]]:
+        """
+        Returns a consistent copy of the counters and histograms.
+        """
+        with self._lock:
+            counters = {name: dict(values) for name, values in self._counters.items()}
+            histograms = {}
+            for name, values in self._histograms.items():
+                histograms[name] = {}
+                for key, histogram in values.items():
+                    copy = Histogram(histogram.buckets)
+                    copy.counts, copy.count, copy.sum, copy.max = list(histogram.counts), histogram.count, histogram.sum, histogram.max
+                    histograms[name][key] = copy
+        return counters, histograms
+
+    def export(self) -> None:
+        """
+        Writes the metrics to every sink. A failing sink is logged and does not stop the others.
+        """
+        for sink in self.sinks:
+            try:
+                sink.export(self)
+            except Exception as e:
+                logger.error(f"Failed to export metrics to {type(sink).__name__}: {e}")
+
+    @staticmethod
+    def _labels(labels: Dict[str, str]) -> Labels:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class MetricsSink(ABC):
+    """Interface for the destinations of the metrics."""
+
+    @abstractmethod
+    def export(self, metrics: Metrics) -> None:
+        """Write the current metrics."""
+        pass
+
+
+class PrometheusTextFileSink(MetricsSink):
+    """
+    Writes the metrics in the Prometheus text exposition format, e.g. for the
+    textfile collector of the node_exporter.
+
+    Attributes:
+        file_path (Path): The `.prom` file written on export.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = Path(file_path)
+
+    def export(self, metrics: Metrics) -> None:
+        counters, histograms = metrics.snapshot()
+        lines = []
+
+        for name, values in sorted(counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(values.items()):
+                lines.append(f"{name}{self._format_labels(labels)} {self._format_value(value)}")
+
+        for name, values in sorted(histograms.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in sorted(values.items()):
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f"{name}_bucket{self._format_labels(labels, le=self._format_value(bound))} {count}")
+                lines.append(f"{name}_bucket{self._format_labels(labels, le='+Inf')} {histogram.count}")
+                lines.append(f"{name}_sum{self._format_labels(labels)} {self._format_value(histogram.sum)}")
+                lines.append(f"{name}_count{self._format_labels(labels)} {histogram.count}")
+
+        # Readers (e.g. the node_exporter textfile collector) never see a partial file
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_write(self.file_path) as file:
+            file.write("\n".join(lines) + "\n")
+
+    @staticmethod
+    def _format_labels(labels: Labels, **extra: str) -> str:
+        pairs = [*labels, *extra.items()]
+        if not pairs:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+        return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+    @staticmethod
+    def _format_value(value: float) -> str:
+        return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class JSONSummarySink(MetricsSink):
+    """
+    Writes a JSON summary of the run: the value of each counter and, for each
+    histogram, its count, sum, mean, max and estimated p50/p95.
+
+    Attributes:
+        file_path (Path): The JSON file written on export.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = Path(file_path)
+
+    def export(self, metrics: Metrics) -> None:
+        counters, histograms = metrics.snapshot()
+        summary = {
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for name, values in sorted(counters.items())
+                for labels, value in sorted(values.items())
+            ],
+            "histograms": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "mean": histogram.sum / histogram.count if histogram.count else None,
+                    "max": histogram.max,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                }
+                for name, values in sorted(histograms.items())
+                for labels, histogram in sorted(values.items())
+            ],
+        }
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_write(self.file_path) as file:
+            json.dump(summary, file, indent=2)
@@ -0,0 +1,208 @@
+import asyncio
+import random
+import time
+import aiohttp
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Optional, Tuple
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a `Retry-After` header, given either in seconds or as an HTTP date.
+
+    Args:
+        value (Optional[str]): The value of the header.
+
+    Returns:
+        Optional[float]: The number of seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """
+    Decides which failed requests are retried, and how long to wait before each retry.
+
+    Transient failures are retried: connection errors, timeouts, truncated bodies and
+    the statuses in retry_statuses. Other errors (e.g. a 404) are raised at once.
+    The delay grows exponentially with the attempt number and is drawn at random
+    below that bound ("full jitter"), so that concurrent requests failing together
+    do not retry together. A `Retry-After` header sent by the API is always honoured.
+
+    Attributes:
+        max_retries (int): The number of retries after the first attempt.
+        backoff_base (float): The delay bound of the first retry, in seconds.
+        backoff_max (float): The maximum delay bound, in seconds.
+        jitter (bool): Whether to draw the delay at random below its bound.
+        retry_statuses (Tuple[int, ...]): The HTTP statuses worth retrying.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        jitter: bool = True,
+        retry_statuses: Tuple[int, ...] = (429, 500, 502, 503, 504)
+    ):
+        """
+        Initializes the RetryPolicy.
+
+        Args:
+            max_retries (int): The number of retries after the first attempt.
+            backoff_base (float): The delay bound of the first retry, in seconds.
+            backoff_max (float): The maximum delay bound, in seconds.
+            jitter (bool): Whether to draw the delay at random below its bound.
+            retry_statuses (Tuple[int, ...]): The HTTP statuses worth retrying.
+
+        Raises:
+            ValueError: If max_retries is negative.
+        """
+        if max_retries < 0:
+            raise ValueError("max_retries must be greater than or equal to 0.")
+
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.retry_statuses = retry_statuses
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """
+        Whether a request failing with `error` may succeed if it is sent again.
+        """
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status in self.retry_statuses
+        return isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError))
+
+    def get_delay(self, error: BaseException, attempt: int) -> Optional[float]:
+        """
+        Returns how long to wait before retrying a failed request.
+
+        Args:
+            error (BaseException): The error of the failed attempt.
+            attempt (int): The number of the failed attempt, starting at 0.
+
+        Returns:
+            Optional[float]: The delay in seconds, or None if the request must not be retried.
+        """
+        if attempt >= self.max_retries or not self.is_retryable(error):
+            return None
+
+        bound = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        delay = random.uniform(0, bound) if self.jitter else bound
+
+        headers = getattr(error, "headers", None)
+        retry_after = parse_retry_after(headers.get("Retry-After") if headers else None)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits the number of requests in flight, adapting the limit to the health of the API (AIMD).
+
+    Every successful request raises the limit by 1/limit, so about one more request
+    is allowed per window of successes, up to max_limit (additive increase). A failed
+    request, or one slower than latency_threshold, divides the limit by 1/decrease_factor
+    (multiplicative decrease). Only the requests started after the last decrease can
+    decrease it again, so a burst of failures from the same window counts once.
+
+    Attributes:
+        max_limit (int): The maximum number of requests in flight.
+        min_limit (int): The minimum number of requests in flight.
+        decrease_factor (float): The factor applied to the limit on overload.
+        latency_threshold (Optional[float]): The latency, in seconds, above which a successful
+            request is also a sign of overload. Disabled when None.
+        limit (float): The current limit.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, decrease_factor: float = 0.5, latency_threshold: Optional[float] = None):
+        """
+        Initializes the limiter at its maximum limit.
+
+        Args:
+            max_limit (int): The maximum number of requests in flight.
+            min_limit (int): The minimum number of requests in flight.
+            decrease_factor (float): The factor applied to the limit on overload, between 0 and 1.
+            latency_threshold (Optional[float]): The latency, in seconds, above which a request counts as overload.
+
+        Raises:
+            ValueError: If the limits or the decrease factor are out of range.
+        """
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError("The limits must satisfy 1 <= min_limit <= max_limit.")
+        if not 0 < decrease_factor < 1:
+            raise ValueError("decrease_factor must be between 0 and 1.")
+
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.decrease_factor = decrease_factor
+        self.latency_threshold = latency_threshold
+        self.limit = float(max_limit)
+        self._in_flight = 0
+        self._last_decrease = float("-inf")
+        self._condition: Optional[asyncio.Condition] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[None]:
+        """
+        Waits for a free slot and holds it while the block runs.
+
+        The block failing with an exception, or lasting longer than latency_threshold,
+        is reported as overload.
+        """
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self._in_flight < int(self.limit))
+            self._in_flight += 1
+
+        started_at = time.monotonic()
+        overloaded: Optional[bool] = True
+        try:
+            yield
+            latency = time.monotonic() - started_at
+            overloaded = self.latency_threshold is not None and latency > self.latency_threshold
+        except asyncio.CancelledError:
+            # A cancelled request says nothing about the health of the API
+            overloaded = None
+            raise
+        finally:
+            async with condition:
+                self._in_flight -= 1
+                if overloaded:
+                    self._decrease(started_at)
+                elif overloaded is not None:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                condition.notify_all()
+
+    def _decrease(self, started_at: float) -> None:
+        if started_at < self._last_decrease:
+            return
+        self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+        self._last_decrease = time.monotonic()
+
+    def _get_condition(self) -> asyncio.Condition:
+        # Conditions are bound to the event loop they are first used in, and the
+        # fetcher may be reused across several asyncio.run calls
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+        return self._condition
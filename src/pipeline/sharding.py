@@ -0,0 +1,122 @@
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from pipeline.content_index import ContentHashes, select_changed_content
+from pipeline.data_category import DataCategory
+from pipeline.schemas import clean_records
+from storage.storage import SaveResult, StorageWriter
+
+
+def get_shards(keys: Sequence[Any], num_shards: int) -> np.ndarray:
+    """
+    Assigns each key to a shard, with a hash that is stable across processes and runs.
+
+    Python's hash() of strings is salted per process, so the keys are hashed with
+    pandas' hash_array instead, which also hashes a whole array at once. Integer
+    keys get the same shard whatever their width.
+
+    Args:
+        keys (Sequence[Any]): The keys of the records.
+        num_shards (int): The number of shards.
+
+    Returns:
+        np.ndarray: The shard of each key, between 0 and num_shards - 1.
+
+    Raises:
+        ValueError: If num_shards is lower than 1.
+    """
+    if num_shards < 1:
+        raise ValueError("num_shards must be greater than or equal to 1.")
+    hashes = pd.util.hash_array(np.asarray(keys))
+    return (hashes % np.uint64(num_shards)).astype(np.int64)
+
+
+def split_records(records: List[Dict[str, Any]], key_field: str, num_shards: int) -> List[List[Dict[str, Any]]]:
+    """
+    Splits records into shards by the hash of their key, so that all the versions of a key land in the same shard.
+
+    Args:
+        records (List[Dict[str, Any]]): The records returned by the API.
+        key_field (str): The field identifying records.
+        num_shards (int): The number of shards.
+
+    Returns:
+        List[List[Dict[str, Any]]]: The records of each shard, in their original order.
+    """
+    keys = [record.get(key_field) for record in records]
+    # Records without a key are dropped by the cleaning, hashing them would turn the keys into objects
+    has_key = np.fromiter((key is not None for key in keys), dtype=bool, count=len(keys))
+    shards = np.zeros(len(keys), dtype=np.int64)
+    shards[has_key] = get_shards([key for key in keys if key is not None], num_shards)
+    order = np.argsort(shards, kind="stable")
+    bounds = np.cumsum(np.bincount(shards, minlength=num_shards))[:-1]
+    return [[records[index] for index in indices] for indices in np.split(order, bounds)]
+
+
+class ShardResult(NamedTuple):
+    """
+    Outcome of the cleaning, and possibly the writing, of a shard in a worker process.
+
+    Attributes:
+        data_df (Optional[pd.DataFrame]): The cleaned records, when the parent process writes them.
+        rows (int): The number of cleaned rows.
+        clean_seconds (float): The time spent cleaning.
+        save_seconds (float): The time spent writing, 0 when the parent process writes the records.
+        result (SaveResult): The records inserted and updated by the worker.
+        content (Optional[ContentHashes]): The content hashes of the changed keys, when they are looked up in an index.
+        unchanged (int): The number of rows skipped because their content did not change.
+    """
+    data_df: Optional[pd.DataFrame]
+    rows: int
+    clean_seconds: float
+    save_seconds: float
+    result: SaveResult
+    content: Optional[ContentHashes] = None
+    unchanged: int = 0
+
+
+def clean_and_write_shard(
+    records: List[Dict[str, Any]],
+    key_field: str,
+    category: DataCategory,
+    explode_lists: bool,
+    writer: Optional[StorageWriter] = None,
+    known: Optional[ContentHashes] = None
+) -> ShardResult:
+    """
+    Cleans the records of a shard and, if a writer is given, writes them.
+
+    With the content hashes of the stored keys, the keys whose content did not
+    change are dropped after the cleaning (see pipeline.content_index).
+
+    Runs in a worker process: the writer is a copy of the one opened by the parent,
+    so it must support writes from several processes (see StorageWriter.parallel_writes).
+
+    Args:
+        records (List[Dict[str, Any]]): The records of the shard.
+        key_field (str): The field identifying records.
+        category (DataCategory): The category of the records.
+        explode_lists (bool): Whether to explode listen histories to one row per track.
+        writer (Optional[StorageWriter]): The writer of the category, or None to return the cleaned records.
+        known (Optional[ContentHashes]): The content hashes of the stored keys, or None to keep every key.
+
+    Returns:
+        ShardResult: The cleaned records or the result of their write, with the time spent on each.
+    """
+    start = time.perf_counter()
+    data_df = clean_records(records, key_field, category, explode_lists=explode_lists)
+    rows = len(data_df)
+    content = None
+    if known is not None:
+        data_df, content = select_changed_content(data_df, key_field, known)
+    clean_seconds = time.perf_counter() - start
+    if writer is None:
+        return ShardResult(data_df, rows, clean_seconds, 0.0, SaveResult(), content, rows - len(data_df))
+
+    start = time.perf_counter()
+    if not data_df.empty:
+        writer.write(data_df)
+    return ShardResult(None, rows, clean_seconds, time.perf_counter() - start, writer.result, content, rows - len(data_df))
@@ -0,0 +1,77 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from logger.logger_config import logger
+
+
+class WriteBehindQueue:
+    """
+    Runs the writes of the pipeline in a background task, one after the other.
+
+    A category handed to the queue is cleaned and saved while the pipeline goes on
+    fetching the next one. At most `max_pending` writes wait behind the running one:
+    past that, submit() waits, so the fetched data held in memory stays bounded.
+
+    Failed writes do not stop the queue; they are reported together by drain().
+
+    Attributes:
+        max_pending (int): The number of writes that may wait behind the running one.
+    """
+
+    def __init__(self, max_pending: int = 1):
+        """
+        Initializes the WriteBehindQueue. The background task is started by the first write.
+
+        Args:
+            max_pending (int): The number of writes that may wait behind the running one.
+
+        Raises:
+            ValueError: If max_pending is lower than 1.
+        """
+        if max_pending < 1:
+            raise ValueError("max_pending must be greater than or equal to 1.")
+
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._errors: List[Tuple[str, Exception]] = []
+
+    async def submit(self, name: str, write: Callable[[], Awaitable[None]]) -> None:
+        """
+        Queues a write, waiting for room if max_pending writes are already waiting.
+
+        Args:
+            name (str): The name of the write, used to report its failure (e.g. the category).
+            write (Callable[[], Awaitable[None]]): The coroutine function performing the write.
+        """
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._worker = asyncio.create_task(self._run())
+        await self._queue.put((name, write))
+
+    async def drain(self) -> None:
+        """
+        Waits until every queued write is done and stops the background task.
+
+        Raises:
+            RuntimeError: If at least one write failed, chained to the first error.
+        """
+        if self._worker is None:
+            return
+
+        await self._queue.put(None)
+        await self._worker
+        self._queue, self._worker = None, None
+
+        errors, self._errors = self._errors, []
+        if errors:
+            raise RuntimeError(f"Writes failed for: {', '.join(name for name, _ in errors)}") from errors[0][1]
+
+    async def _run(self) -> None:
+        while (item := await self._queue.get()) is not None:
+            name, write = item
+            try:
+                await write()
+            except Exception as e:
+                logger.error(f'Write-behind failed for {name}: {e}')
+                self._errors.append((name, e))
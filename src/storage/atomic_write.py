@@ -0,0 +1,113 @@
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, Optional, Union
+
+
+@contextmanager
+def atomic_write(file_path: Union[str, Path], mode: str = "w") -> Iterator[IO]:
+    """
+    Opens a temporary file next to `file_path`, and atomically replaces `file_path` with it once written.
+
+    The temporary file is flushed and fsynced before the rename, and its directory
+    after it, so a crash leaves either the previous file or the new one, never a
+    truncated one. If the block raises, the temporary file is removed and
+    `file_path` is left untouched.
+
+    Args:
+        file_path (Union[str, Path]): The file to replace.
+        mode (str): The mode the temporary file is opened with, 'w' (UTF-8 text) or 'wb'.
+
+    Yields:
+        IO: The temporary file, e.g. to pass to DataFrame.to_csv.
+    """
+    file_path = Path(file_path)
+    tmp_path = file_path.with_name(f"{file_path.name}.tmp")
+    binary = "b" in mode
+    try:
+        with open(tmp_path, mode, encoding=None if binary else "utf-8", newline=None if binary else "") as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    _fsync_directory(file_path.parent)
+
+
+@contextmanager
+def journaled_append(
+    journal_path: Union[str, Path],
+    file_paths: Iterable[Union[str, Path]],
+    state: Optional[Dict[str, Any]] = None
+) -> Iterator[None]:
+    """
+    Records the size of files before appending to them, so that a crash midway can be rolled back.
+
+    Appending cannot be done atomically like atomic_write without copying the whole
+    file. Instead, the journal is written before the block and removed after it: a
+    crash in between leaves the journal, and rollback_append then truncates the files
+    back to their recorded size, dropping any partially written row. If the block
+    raises, the files are truncated at once. The block must flush and fsync the files
+    it appends to.
+
+    Args:
+        journal_path (Union[str, Path]): The journal file.
+        file_paths (Iterable[Union[str, Path]]): The files appended to. A file that does not exist yet is removed on rollback.
+        state (Optional[Dict[str, Any]]): JSON-serializable data returned by rollback_append, e.g. a manifest to restore.
+    """
+    journal_path = Path(journal_path)
+    sizes = {os.path.abspath(path): os.path.getsize(path) if os.path.exists(path) else None for path in file_paths}
+    with atomic_write(journal_path) as file:
+        json.dump({"sizes": sizes, "state": state or {}}, file)
+
+    try:
+        yield
+    except BaseException:
+        rollback_append(journal_path)
+        raise
+    journal_path.unlink()
+    _fsync_directory(journal_path.parent)
+
+
+def rollback_append(journal_path: Union[str, Path]) -> Optional[Dict[str, Any]]:
+    """
+    Truncates the files of an interrupted journaled_append back to their recorded size and removes the journal.
+
+    Args:
+        journal_path (Union[str, Path]): The journal file.
+
+    Returns:
+        Optional[Dict[str, Any]]: The state recorded with the journal, or None if there was no journal.
+    """
+    journal_path = Path(journal_path)
+    if not journal_path.exists():
+        return None
+
+    journal = json.loads(journal_path.read_text(encoding="utf-8"))
+    for path, size in journal["sizes"].items():
+        if size is None:
+            Path(path).unlink(missing_ok=True)
+        elif Path(path).exists():
+            with open(path, "r+b") as file:
+                file.truncate(size)
+                os.fsync(file.fileno())
+    journal_path.unlink()
+    _fsync_directory(journal_path.parent)
+    return journal["state"]
+
+
+def _fsync_directory(directory: Path) -> None:
+    # Persists the rename itself, directories cannot be opened on every platform (e.g. Windows)
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -0,0 +1,314 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from logger.logger_config import logger
+from pipeline.sharding import get_shards
+from storage.atomic_write import atomic_write, journaled_append, rollback_append
+from storage.storage import StorageWriter
+from storage.upsert import select_changed_records, upsert_records
+
+
+class CSVBuckets:
+    """
+    Layout of a category split into CSV bucket files by the hash of its key, described by a manifest.
+
+    All the rows of a key are stored in `<directory>/bucket-<n>.csv`, where n is the
+    shard of the key (see pipeline.sharding.get_shards). The manifest
+    (`manifest.json`) records the number of buckets, the columns, and the number of
+    rows and latest `charged_at` of every bucket. An upsert only rewrites the buckets
+    holding changed keys, reading the rows of a key opens a single bucket, and the
+    watermark of the category is read from the manifest alone.
+
+    Attributes:
+        directory (Path): The directory holding the buckets and the manifest.
+        unique_key (str): The field identifying records.
+        num_buckets (int): The number of buckets, fixed when the layout is created.
+        columns (Optional[List[str]]): The columns of the bucket files, once a row is written.
+    """
+
+    MANIFEST_NAME = "manifest.json"
+    JOURNAL_NAME = "append.journal"
+
+    def __init__(self, directory: Path, unique_key: str, num_buckets: int):
+        """
+        Opens the layout described by the manifest of the directory, or a new layout if there is none.
+
+        Args:
+            directory (Path): The directory holding the buckets and the manifest.
+            unique_key (str): The field identifying records.
+            num_buckets (int): The number of buckets of a new layout. An existing layout keeps its own.
+
+        Raises:
+            ValueError: If a new layout is requested with less than one bucket.
+        """
+        self.directory = Path(directory)
+        self.unique_key = unique_key
+        manifest = self._read_manifest()
+        if manifest is None:
+            if num_buckets < 1:
+                raise ValueError("num_buckets must be greater than or equal to 1.")
+            self.num_buckets = num_buckets
+            self.columns: Optional[List[str]] = None
+            self._buckets: Dict[int, Dict[str, Any]] = {}
+        else:
+            self.num_buckets = manifest["num_buckets"]
+            self.columns = manifest["columns"]
+            self._buckets = {int(bucket): entry for bucket, entry in manifest["buckets"].items()}
+            if num_buckets and num_buckets != self.num_buckets:
+                logger.info(f"{self.directory} keeps the {self.num_buckets} buckets it was created with, not {num_buckets}")
+
+    @classmethod
+    def exists(cls, directory: Path) -> bool:
+        """
+        Whether the directory holds a bucketed layout.
+        """
+        return (Path(directory) / cls.MANIFEST_NAME).exists()
+
+    @classmethod
+    def rollback_append(cls, directory: Path) -> None:
+        """
+        Cuts back the buckets of an append interrupted by a crash and restores the manifest it started from.
+        """
+        state = rollback_append(Path(directory) / cls.JOURNAL_NAME)
+        if state is None:
+            return
+
+        manifest_path = Path(directory) / cls.MANIFEST_NAME
+        if state["manifest"] is None:
+            manifest_path.unlink(missing_ok=True)
+        else:
+            with atomic_write(manifest_path) as file:
+                json.dump(state["manifest"], file, indent=2)
+        logger.info(f"Rolled back the interrupted append to {directory}")
+
+    def get_bucket_path(self, bucket: int) -> Path:
+        return self.directory / f"bucket-{bucket:05d}.csv"
+
+    def get_buckets(self, keys: Sequence[Any]) -> np.ndarray:
+        """
+        Returns the bucket of each key.
+        """
+        return get_shards(np.asarray(keys), self.num_buckets)
+
+    def read_watermark(self) -> Optional[pd.Timestamp]:
+        """
+        Returns the most recent `charged_at` of the category, from the manifest.
+        """
+        charged_at = [pd.Timestamp(entry["max_charged_at"]) for entry in self._buckets.values() if entry.get("max_charged_at")]
+        return max(charged_at) if charged_at else None
+
+    def load(self, keys: Optional[Sequence[Any]] = None) -> pd.DataFrame:
+        """
+        Loads the rows of the category, or only those of the given keys.
+
+        Args:
+            keys (Optional[Sequence[Any]]): The keys to read, only their buckets are opened. All the rows if None.
+
+        Returns:
+            pd.DataFrame: The rows, or an empty DataFrame if there is none.
+        """
+        buckets = sorted(self._buckets)
+        if keys is not None:
+            buckets = sorted(set(self.get_buckets(keys).tolist()) & set(buckets))
+
+        frames = [pd.read_csv(self.get_bucket_path(bucket)) for bucket in buckets]
+        if not frames:
+            return pd.DataFrame()
+
+        data_df = pd.concat(frames, ignore_index=True)
+        if keys is not None:
+            data_df = data_df[data_df[self.unique_key].isin(keys)].reset_index(drop=True)
+        return data_df
+
+    def append(self, data_df: pd.DataFrame) -> None:
+        """
+        Appends rows of keys that are not stored yet to their buckets, without reading them.
+
+        The buckets and the manifest are journaled (see journaled_append), so that an
+        append interrupted by a crash is rolled back when the storage is opened again.
+
+        Args:
+            data_df (pd.DataFrame): The rows to append, with a `charged_at` column.
+        """
+        if self.columns is None:
+            self.columns = list(data_df.columns)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        splits = list(self._split(data_df))
+        file_paths = [self.get_bucket_path(bucket) for bucket, _ in splits]
+        with journaled_append(self.directory / self.JOURNAL_NAME, file_paths, state={"manifest": self._read_manifest()}):
+            for (bucket, bucket_df), file_path in zip(splits, file_paths):
+                exists = file_path.exists()
+                with open(file_path, 'a', encoding='utf-8', newline='') as file:
+                    bucket_df.reindex(columns=self.columns).to_csv(file, index=False, header=not exists)
+                    file.flush()
+                    os.fsync(file.fileno())
+                entry = self._buckets.get(bucket, {"rows": 0, "max_charged_at": None})
+                self._buckets[bucket] = {
+                    "rows": entry["rows"] + len(bucket_df),
+                    "max_charged_at": self._max_charged_at(bucket_df, entry["max_charged_at"]),
+                }
+            self._write_manifest()
+
+    def replace(self, data_df: pd.DataFrame) -> None:
+        """
+        Replaces all the rows of the given keys, rewriting only the buckets holding them.
+
+        Each bucket is rewritten atomically (see atomic_write).
+
+        Args:
+            data_df (pd.DataFrame): The new rows of the keys, with a `charged_at` column.
+        """
+        if self.columns is None:
+            self.columns = list(data_df.columns)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for bucket, bucket_df in self._split(data_df):
+            file_path = self.get_bucket_path(bucket)
+            existing_df = pd.read_csv(file_path) if file_path.exists() else pd.DataFrame(columns=self.columns)
+            bucket_df = upsert_records(existing_df, bucket_df.reindex(columns=self.columns), self.unique_key)
+            with atomic_write(file_path) as file:
+                bucket_df.to_csv(file, index=False, header=True)
+            self._buckets[bucket] = {"rows": len(bucket_df), "max_charged_at": self._max_charged_at(bucket_df, None)}
+        self._write_manifest()
+
+    def _split(self, data_df: pd.DataFrame) -> Iterator[Tuple[int, pd.DataFrame]]:
+        if data_df.empty:
+            return iter(())
+        return iter(data_df.groupby(self.get_buckets(data_df[self.unique_key].to_numpy()), sort=True))
+
+    @staticmethod
+    def _max_charged_at(data_df: pd.DataFrame, previous: Optional[str]) -> Optional[str]:
+        charged_at = pd.to_datetime(data_df['charged_at']).max() if 'charged_at' in data_df.columns else pd.NaT
+        candidates = [pd.Timestamp(value) for value in (previous, charged_at) if value is not None and not pd.isna(value)]
+        return max(candidates).isoformat() if candidates else None
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        manifest_path = self.directory / self.MANIFEST_NAME
+        if not manifest_path.exists():
+            return None
+        return json.loads(manifest_path.read_text(encoding="utf-8"))
+
+    def _write_manifest(self) -> None:
+        manifest = {
+            "unique_key": self.unique_key,
+            "num_buckets": self.num_buckets,
+            "columns": self.columns,
+            "buckets": {str(bucket): entry for bucket, entry in sorted(self._buckets.items())},
+        }
+        with atomic_write(self.directory / self.MANIFEST_NAME) as file:
+            json.dump(manifest, file, indent=2)
+
+
+class CSVBucketWriter(StorageWriter):
+    """
+    Writes a bucketed category chunk by chunk.
+
+    - New records are appended to a staging file (`<directory>.csv.staging`) as soon
+      as their chunk is written.
+    - Updated records are kept aside, since they are bounded by the change set.
+    - Records whose key was already written by a previous chunk replace its version
+      (latest wins, as in upsert_records), they are kept aside like the updates.
+
+    Nothing reaches the buckets before close(), which appends the staged records to
+    their buckets and rewrites only the buckets holding updates. The watermark of the
+    manifest therefore does not move when a run fails midway, and the next run
+    fetches its new and updated records again.
+
+    New and updated records are detected against the `charged_at` watermark of the
+    manifest, read when the writer is opened.
+
+    Attributes:
+        buckets (CSVBuckets): The layout of the category.
+        staging_path (Path): The file the new records are appended to until close().
+        unique_key (str): The field used to uniquely identify records.
+        append_chunk_size (int): The number of staged rows appended to the buckets at once.
+    """
+
+    def __init__(self, buckets: CSVBuckets, append_chunk_size: int = 100_000):
+        super().__init__()
+        self.buckets = buckets
+        self.staging_path = buckets.directory.with_name(f"{buckets.directory.name}.csv.staging")
+        self.unique_key = buckets.unique_key
+        self.append_chunk_size = append_chunk_size
+        self.charged_at = datetime.now().strftime("%Y-%m-%dT%H:%M")
+        self.max_charged_at = buckets.read_watermark()
+        self._staged_columns: Optional[List[str]] = None
+        self._seen_keys = set()
+        # Keys staged by a chunk and written again by a later one, their staged rows are dropped on close
+        self._superseded_keys = set()
+        self._pending_updates: List[pd.DataFrame] = []
+
+    def write(self, chunk_df: pd.DataFrame) -> None:
+        """
+        Stages the new records of a chunk and keeps its updated records for close().
+
+        Args:
+            chunk_df (pd.DataFrame): A chunk of cleaned data.
+
+        Raises:
+            ValueError: If existing data must be compared but the chunk has no 'created_at' or 'updated_at' fields.
+        """
+        chunk_df = select_changed_records(chunk_df, self.max_charged_at)
+        if chunk_df.empty:
+            return
+
+        if self.max_charged_at is None:
+            is_new = pd.Series(True, index=chunk_df.index)
+        else:
+            is_new = pd.to_datetime(chunk_df['created_at']) > self.max_charged_at
+
+        # A key already written by a previous chunk is replaced by its latest version, without being counted again
+        is_seen = chunk_df[self.unique_key].isin(self._seen_keys)
+        self._seen_keys.update(chunk_df[self.unique_key].tolist())
+        if is_seen.any():
+            rewritten_keys = set(chunk_df.loc[is_seen, self.unique_key].tolist())
+            self._superseded_keys.update(rewritten_keys)
+            self._pending_updates = [
+                updates_df[~updates_df[self.unique_key].isin(rewritten_keys)] for updates_df in self._pending_updates
+            ]
+        is_new &= ~is_seen
+
+        if is_new.any():
+            self._stage(self._prepare(chunk_df[is_new]))
+            self.result.inserted += int(is_new.sum())
+            logger.info(f"Staged {int(is_new.sum())} new records for {self.buckets.directory}")
+        if not is_new.all():
+            self.result.updated += int((~is_new & ~is_seen).sum())
+            self._pending_updates.append(self._prepare(chunk_df[~is_new]))
+
+    def close(self) -> None:
+        """
+        Appends the staged records to their buckets and applies the pending updates,
+        rewriting only the buckets that hold them.
+        """
+        try:
+            if self._staged_columns is not None:
+                for staged_df in pd.read_csv(self.staging_path, chunksize=self.append_chunk_size):
+                    self.buckets.append(staged_df[~staged_df[self.unique_key].isin(self._superseded_keys)])
+                logger.info(f"Inserted {self.result.inserted} new records into {self.buckets.directory}")
+
+            if self._pending_updates:
+                updates_df = pd.concat(self._pending_updates, ignore_index=True)
+                self._pending_updates = []
+                self.buckets.replace(updates_df)
+                logger.info(f"Updated {len(updates_df)} records in {self.buckets.directory}")
+        finally:
+            self.staging_path.unlink(missing_ok=True)
+
+    def _prepare(self, data_df: pd.DataFrame) -> pd.DataFrame:
+        data_df = data_df.drop(columns=['created_at', 'updated_at'], errors='ignore')
+        return data_df.assign(charged_at=self.charged_at)
+
+    def _stage(self, data_df: pd.DataFrame) -> None:
+        if self._staged_columns is None:
+            # Overwrites the staging file of an interrupted run, whose records were never committed
+            self._staged_columns = list(data_df.columns)
+            self.staging_path.parent.mkdir(parents=True, exist_ok=True)
+            data_df.to_csv(self.staging_path, mode='w', index=False, header=True)
+        else:
+            data_df.reindex(columns=self._staged_columns).to_csv(self.staging_path, mode='a', index=False, header=False)
@@ -1,40 +1,88 @@
 from pathlib import Path
+import json
 import os
+import shutil
 import pandas as pd
 from datetime import datetime
 from pipeline.data_category import DataCategory
-from storage.storage import Storage
+from pipeline.schemas import explode_listen_history
+from storage.atomic_write import atomic_write, journaled_append, rollback_append
+from storage.csv_buckets import CSVBucketWriter, CSVBuckets
+from storage.storage import SaveResult, Storage, StorageWriter
+from storage.upsert import count_new_records, select_changed_records, upsert_records
 from logger.logger_config import logger
-from typing import Union
+from typing import Any, List, Optional, Sequence, Union
 
 class CSVStorage(Storage):
     """
     Class to handle saving and loading data from a CSV file.
 
+    In append-only mode, each save writes its new and updated records to a small
+    delta segment in `<category>.deltas/` instead of rewriting `<category>.csv`.
+    Reads merge the base snapshot with the deltas (the latest segment wins for a
+    key) and compact() folds the deltas back into the base snapshot.
+
+    Listen histories are saved with one row per track (`user_id`, `track_id`,
+    `position`), so the files can be joined on `track_id` without parsing lists.
+
+    With `num_buckets`, the categories of BUCKETED_CATEGORIES are split into bucket
+    files by the hash of their key, in `<category>/bucket-<n>.csv` with a manifest
+    (see CSVBuckets): saves only rewrite the buckets holding updated keys, and
+    load_data(keys=...) only opens the buckets of the requested keys.
+
     Attributes:
         storage_dir (Path): The directory where CSV files are saved.
+        append_only (bool): Whether saves write delta segments instead of rewriting the file.
+        max_deltas (Optional[int]): In append-only mode, the number of delta segments
+            that triggers a compaction after a save. None disables automatic compaction.
+        num_buckets (int): The number of buckets of the bucketed categories, 0 to keep them in a single file.
     """
+
+    # Listen histories are the largest category and are updated a few users at a time
+    BUCKETED_CATEGORIES = (DataCategory.LISTEN_HISTORY,)
     
-    def __init__(self, storage_dir: str = "data"):
+    def __init__(
+        self,
+        storage_dir: str = "data",
+        append_only: bool = False,
+        max_deltas: Optional[int] = None,
+        num_buckets: int = 0
+    ):
         """
         Initializes the CSVStorage with the specified directory.
         If the directory does not exist, it creates it.
 
+        A bucketed category keeps the layout it was created with: its manifest wins
+        over `num_buckets`, and an existing single file is split into buckets.
+
         Args:
             storage_dir (str): The directory path where CSV files will be stored.
+            append_only (bool): Whether saves write delta segments instead of rewriting the file.
+            max_deltas (Optional[int]): The number of delta segments that triggers a compaction.
+            num_buckets (int): The number of buckets of the bucketed categories, 0 to keep them in a single file.
 
         Raises:
+            ValueError: If both append_only and num_buckets are set.
             OSError: If the directory creation fails.
         """
+        if append_only and num_buckets:
+            raise ValueError("append_only and num_buckets cannot be combined.")
+
         try:
             self.storage_dir = Path(storage_dir)
+            self.append_only = append_only
+            self.max_deltas = max_deltas
+            self.num_buckets = num_buckets
             self.storage_dir.mkdir(parents=True, exist_ok=True)  # Create directory if it doesn't exist
             logger.info(f"CSVStorage initialized with directory: {self.storage_dir}")
         except OSError as e:
             logger.error(f"Failed to create or access storage directory: {self.storage_dir}. Error: {e}")
             raise
+        self._rollback_appends()
+        self._migrate_listen_history()
+        self._migrate_to_buckets()
     
-    def save_data(self, category: Union[str, DataCategory], data_df: pd.DataFrame, unique_key: str) -> None:
+    def save_data(self, category: Union[str, DataCategory], data_df: pd.DataFrame, unique_key: str) -> SaveResult:
         """
         Saves the given DataFrame to a CSV file, updating or inserting records as needed.
 
@@ -47,6 +95,9 @@ class CSVStorage(Storage):
             data_df (pd.DataFrame): The DataFrame containing data to be saved.
             unique_key (str): The field used to uniquely identify records for updates.
 
+        Returns:
+            SaveResult: The number of inserted and updated records.
+
         Raises:
             ValueError: If the DataFrame is empty or missing required fields.
             Exception: If saving the data fails for any reason.
@@ -54,50 +105,58 @@ class CSVStorage(Storage):
         if data_df.empty:
             raise ValueError("The data DataFrame is empty, nothing to save.")
 
+        buckets = self._get_buckets(category, unique_key)
+        if buckets is not None:
+            return self._save_buckets(buckets, data_df)
+
+        if self.append_only:
+            return self._save_delta(category, data_df, unique_key)
+
         try:
-            category_str = category.value if hasattr(category, 'value') else str(category)
+            category_str = self._get_category_str(category)
 
             current_datetime = datetime.now().strftime("%Y-%m-%dT%H:%M")
-            file_path = os.path.join(self.storage_dir, f"{category_str}.csv")
+            file_path = self._get_file_path(category)
 
             existing_data = self.load_existing_data(file_path)
 
             if not existing_data.empty and 'charged_at' in existing_data.columns:
-                existing_data['charged_at'] = pd.to_datetime(existing_data['charged_at'])
-                max_charged_at = existing_data['charged_at'].max()
+                max_charged_at = pd.to_datetime(existing_data['charged_at']).max()
 
                 if 'created_at' in data_df.columns and 'updated_at' in data_df.columns:
                     data_df['created_at'] = pd.to_datetime(data_df['created_at'])
                     data_df['updated_at'] = pd.to_datetime(data_df['updated_at'])
 
-                    new_data_df = data_df[data_df['created_at'] > max_charged_at]
-                    updated_data_df = data_df[data_df['updated_at'] > max_charged_at]
+                    changed_mask = (data_df['created_at'] > max_charged_at) | (data_df['updated_at'] > max_charged_at)
+                    changed_data_df = data_df[changed_mask].assign(charged_at=current_datetime)
 
-                    if new_data_df.empty and updated_data_df.empty:
+                    if changed_data_df.empty:
                         logger.info(f"No new or updated records to save for {category_str}.")
-                        return
-
-                    # Update existing
-                    if not updated_data_df.empty:
-                        for _, updated_row in updated_data_df.iterrows():
-                            existing_data.loc[existing_data[unique_key] == updated_row[unique_key]] = updated_row
-                        logger.info(f"Updated {len(updated_data_df)} records in {category_str}.csv")
-
-                    # Insert new
-                    if not new_data_df.empty:
-                        new_data_df['charged_at'] = current_datetime
-                        existing_data = pd.concat([existing_data, new_data_df], ignore_index=True)
-                        logger.info(f"Inserted {len(new_data_df)} new records into {category_str}.csv")
+                        return SaveResult()
+
+                    updated_count = int(changed_data_df[unique_key].isin(existing_data[unique_key]).sum())
+                    inserted_count = len(changed_data_df) - updated_count
+
+                    existing_data = upsert_records(existing_data, changed_data_df, unique_key)
+
+                    if updated_count:
+                        logger.info(f"Updated {updated_count} records in {category_str}.csv")
+                    if inserted_count:
+                        logger.info(f"Inserted {inserted_count} new records into {category_str}.csv")
                 else:
                     raise ValueError("Data is missing 'created_at' or 'updated_at' fields.")
             else:
                 data_df['charged_at'] = current_datetime
                 existing_data = data_df
+                updated_count, inserted_count = 0, len(data_df)
                 logger.info(f"Inserted {len(existing_data)} new records into {category_str}.csv")
             
             existing_data = existing_data.drop(columns=['created_at', 'updated_at'], errors='ignore')
-            existing_data.to_csv(file_path, mode='w', index=False, header=True)
+            # Written to a temporary file and renamed, a crash mid-write leaves the previous file intact
+            with atomic_write(file_path) as file:
+                existing_data.to_csv(file, index=False, header=True)
             logger.info(f"Data successfully saved to {file_path}")
+            return SaveResult(inserted=inserted_count, updated=updated_count)
 
         except ValueError as e:
             logger.error(f"Data validation error for {category_str}: {e}")
@@ -122,3 +181,475 @@ class CSVStorage(Storage):
                 logger.info(f"No existing data found at {file_path}. Returning an empty DataFrame.")
                 return pd.DataFrame()
 
+    def open_writer(self, category: Union[str, DataCategory], unique_key: str) -> StorageWriter:
+        """
+        Opens a writer that saves the data of a category chunk by chunk.
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data (used for file naming).
+            unique_key (str): The field used to uniquely identify records for updates.
+
+        Returns:
+            StorageWriter: The writer for the category CSV file, for its buckets, or for a new delta segment in append-only mode.
+        """
+        buckets = self._get_buckets(category, unique_key)
+        if buckets is not None:
+            return CSVBucketWriter(buckets)
+        if self.append_only:
+            return CSVDeltaWriter(self, category, unique_key)
+        return CSVStreamWriter(self._get_file_path(category), unique_key)
+
+    def load_data(
+        self,
+        category: Union[str, DataCategory],
+        unique_key: Optional[str] = None,
+        keys: Optional[Sequence[Any]] = None
+    ) -> pd.DataFrame:
+        """
+        Loads the current records of a category, merging the base snapshot with its delta segments.
+
+        For each key, the rows of the most recent segment win (segments are named after
+        their `charged_at`, so this is the latest `charged_at`).
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data.
+            unique_key (Optional[str]): The field identifying records, defaults to the key field of the category.
+            keys (Optional[Sequence[Any]]): If given, only the records of these keys are returned.
+                For a bucketed category, only the buckets of these keys are read.
+
+        Returns:
+            pd.DataFrame: The merged records, or an empty DataFrame if there is no data.
+        """
+        buckets = self._get_buckets(category, unique_key)
+        if buckets is not None:
+            return buckets.load(keys)
+
+        data_df = self._load_merged(category, unique_key, self._list_deltas(category))
+        if keys is not None and not data_df.empty:
+            unique_key = unique_key or DataCategory(self._get_category_str(category)).key_field
+            data_df = data_df[data_df[unique_key].isin(keys)].reset_index(drop=True)
+        return data_df
+
+    def compact(self, category: Union[str, DataCategory], unique_key: Optional[str] = None) -> None:
+        """
+        Merges the delta segments of a category into its base snapshot and deletes them.
+
+        The base snapshot is written atomically (see atomic_write), so a crash during
+        compaction leaves the previous snapshot and the deltas intact.
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data.
+            unique_key (Optional[str]): The field identifying records, defaults to the key field of the category.
+        """
+        deltas = self._list_deltas(category)
+        if not deltas:
+            logger.info(f"No delta segment to compact for {self._get_category_str(category)}.")
+            return
+
+        merged_df = self._load_merged(category, unique_key, deltas)
+        file_path = self._get_file_path(category)
+        with atomic_write(file_path) as file:
+            merged_df.to_csv(file, index=False, header=True)
+
+        for delta_path in deltas:
+            delta_path.unlink()
+        logger.info(f"Compacted {len(deltas)} delta segments into {file_path}")
+
+    def read_watermark(self, category: Union[str, DataCategory]) -> Optional[pd.Timestamp]:
+        """
+        Reads the most recent `charged_at` of a category, across the base snapshot and its delta segments.
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data.
+
+        Returns:
+            Optional[pd.Timestamp]: The most recent `charged_at`, or None if there is no data.
+        """
+        buckets = self._get_buckets(category)
+        if buckets is not None:
+            return buckets.read_watermark()
+
+        watermarks = [
+            self.read_max_charged_at(file_path)
+            for file_path in [self._get_file_path(category), *self._list_deltas(category)]
+        ]
+        watermarks = [watermark for watermark in watermarks if watermark is not None]
+        return max(watermarks) if watermarks else None
+
+    @staticmethod
+    def read_max_charged_at(file_path: Union[str, Path]) -> Optional[pd.Timestamp]:
+        """
+        Reads the most recent `charged_at` of a CSV file without loading the other columns.
+
+        Args:
+            file_path (Union[str, Path]): The path to the CSV file.
+
+        Returns:
+            Optional[pd.Timestamp]: The most recent `charged_at`, or None if the file or the column does not exist.
+        """
+        if not os.path.exists(file_path):
+            return None
+
+        columns = pd.read_csv(file_path, nrows=0).columns
+        if 'charged_at' not in columns:
+            return None
+
+        charged_at = pd.to_datetime(pd.read_csv(file_path, usecols=['charged_at'])['charged_at'])
+        return None if charged_at.empty else charged_at.max()
+
+    def _save_delta(self, category: Union[str, DataCategory], data_df: pd.DataFrame, unique_key: str) -> SaveResult:
+        category_str = self._get_category_str(category)
+        try:
+            writer = CSVDeltaWriter(self, category, unique_key)
+            writer.write(data_df)
+            writer.close()
+            return writer.result
+        except ValueError as e:
+            logger.error(f"Data validation error for {category_str}: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Failed to save delta segment for {category_str}: {e}")
+            raise
+
+    def _save_buckets(self, buckets: CSVBuckets, data_df: pd.DataFrame) -> SaveResult:
+        try:
+            writer = CSVBucketWriter(buckets)
+            writer.write(data_df)
+            writer.close()
+            return writer.result
+        except ValueError as e:
+            logger.error(f"Data validation error for {buckets.directory.name}: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Failed to save data to {buckets.directory}: {e}")
+            raise
+
+    def _load_merged(self, category: Union[str, DataCategory], unique_key: Optional[str], deltas: List[Path]) -> pd.DataFrame:
+        unique_key = unique_key or DataCategory(self._get_category_str(category)).key_field
+
+        segments = []
+        for segment, file_path in enumerate([self._get_file_path(category), *deltas]):
+            segment_df = self.load_existing_data(file_path)
+            if not segment_df.empty:
+                segments.append(segment_df.assign(_segment=segment))
+        if not segments:
+            return pd.DataFrame()
+
+        merged_df = pd.concat(segments, ignore_index=True)
+        # Keep every row of the latest segment of each key, which also holds for keys spanning several rows
+        latest_segment = merged_df.groupby(unique_key)['_segment'].transform('max')
+        return merged_df[merged_df['_segment'] == latest_segment].drop(columns=['_segment']).reset_index(drop=True)
+
+    def _rollback_appends(self) -> None:
+        """
+        Cuts back the files of the appends interrupted by a crash (see journaled_append), dropping their partial rows.
+        """
+        for journal_path in [*self.storage_dir.glob("*.csv.journal"), *self.storage_dir.glob("*.deltas/*.journal")]:
+            rollback_append(journal_path)
+            logger.info(f"Rolled back the interrupted append recorded in {journal_path}")
+        for category in self.BUCKETED_CATEGORIES:
+            CSVBuckets.rollback_append(self.storage_dir / self._get_category_str(category))
+
+    def _migrate_listen_history(self) -> None:
+        """
+        Rewrites the listen history files saved with one stringified list of tracks per user to one row per track.
+        """
+        category = DataCategory.LISTEN_HISTORY
+        for file_path in [self._get_file_path(category), *self._list_deltas(category)]:
+            if not file_path.exists() or 'items' not in pd.read_csv(file_path, nrows=0).columns:
+                continue
+
+            history_df = pd.read_csv(file_path)
+            # Lists of integers are written by pandas in a JSON compatible way, e.g. "[1, 2]"
+            history_df['items'] = history_df['items'].map(json.loads)
+            with atomic_write(file_path) as file:
+                explode_listen_history(history_df).to_csv(file, index=False, header=True)
+            logger.info(f"Migrated {file_path} to one row per track")
+
+    def _migrate_to_buckets(self) -> None:
+        """
+        Splits the single file of the bucketed categories into buckets, when buckets are enabled.
+        """
+        for category in self.BUCKETED_CATEGORIES:
+            file_path = self._get_file_path(category)
+            buckets = self._get_buckets(category)
+            if buckets is None or not file_path.exists():
+                continue
+
+            buckets.replace(pd.read_csv(file_path))
+            file_path.unlink()
+            logger.info(f"Split {file_path} into {buckets.num_buckets} buckets in {buckets.directory}")
+
+    def _get_buckets(self, category: Union[str, DataCategory], unique_key: Optional[str] = None) -> Optional[CSVBuckets]:
+        category_str = self._get_category_str(category)
+        if category_str not in {bucketed.value for bucketed in self.BUCKETED_CATEGORIES}:
+            return None
+
+        buckets_dir = self.storage_dir / category_str
+        if not self.num_buckets and not CSVBuckets.exists(buckets_dir):
+            return None
+        return CSVBuckets(buckets_dir, unique_key or DataCategory(category_str).key_field, self.num_buckets)
+
+    def _list_deltas(self, category: Union[str, DataCategory]) -> List[Path]:
+        # Segment names start with their creation timestamp, so sorting them sorts them by age
+        return sorted(self._get_deltas_dir(category).glob("delta-*.csv"))
+
+    def _get_category_str(self, category: Union[str, DataCategory]) -> str:
+        return category.value if hasattr(category, 'value') else str(category)
+
+    def _get_file_path(self, category: Union[str, DataCategory]) -> Path:
+        return self.storage_dir / f"{self._get_category_str(category)}.csv"
+
+    def _get_deltas_dir(self, category: Union[str, DataCategory]) -> Path:
+        return self.storage_dir / f"{self._get_category_str(category)}.deltas"
+
+
+class CSVStreamWriter(StorageWriter):
+    """
+    Writes a category to its CSV file chunk by chunk, with bounded memory.
+
+    - New records are appended to a staging file (`<category>.csv.staging`) as soon
+      as their chunk is written.
+    - Updated records are kept aside, since they are bounded by the change set.
+    - Records whose key was already written by a previous chunk replace its version
+      (latest wins, as in upsert_records), they are kept aside like the updates.
+
+    Nothing reaches the CSV file before close(), which commits the staged records
+    and the updates together. The watermark of the file therefore only moves once
+    every record of the run is saved: a run failing midway leaves the file as it
+    was, and the next run fetches its new and updated records again.
+
+    New and updated records are detected against the `charged_at` watermark read
+    when the writer is opened, so every chunk of a run sees the same watermark.
+
+    Attributes:
+        file_path (Path): The CSV file of the category.
+        staging_path (Path): The file the new records are appended to until close().
+        journal_path (Path): The journal of the append to the CSV file (see journaled_append).
+        unique_key (str): The field used to uniquely identify records.
+        rewrite_chunk_size (int): The number of rows read at once when applying updates.
+    """
+
+    def __init__(self, file_path: Path, unique_key: str, rewrite_chunk_size: int = 100_000):
+        super().__init__()
+        self.file_path = Path(file_path)
+        self.staging_path = self.file_path.with_name(f"{self.file_path.name}.staging")
+        self.journal_path = self.file_path.with_name(f"{self.file_path.name}.journal")
+        self.unique_key = unique_key
+        self.rewrite_chunk_size = rewrite_chunk_size
+        self.charged_at = datetime.now().strftime("%Y-%m-%dT%H:%M")
+        self.max_charged_at = CSVStorage.read_max_charged_at(self.file_path)
+        # Without a watermark the file is rewritten from scratch, as in CSVStorage.save_data
+        self._overwrite = self.max_charged_at is None
+        self._columns: Optional[List[str]] = None
+        if not self._overwrite:
+            self._columns = list(pd.read_csv(self.file_path, nrows=0).columns)
+        self._staged = False
+        self._seen_keys = set()
+        # Keys staged by a chunk and written again by a later one, their staged rows are dropped on close
+        self._superseded_keys = set()
+        self._pending_updates: List[pd.DataFrame] = []
+
+    def write(self, chunk_df: pd.DataFrame) -> None:
+        """
+        Stages the new records of a chunk and keeps its updated records for close().
+
+        Args:
+            chunk_df (pd.DataFrame): A chunk of cleaned data.
+
+        Raises:
+            ValueError: If existing data must be compared but the chunk has no 'created_at' or 'updated_at' fields.
+        """
+        if chunk_df.empty:
+            return
+
+        if self.max_charged_at is None:
+            is_new = pd.Series(True, index=chunk_df.index)
+            is_changed = is_new
+        else:
+            if 'created_at' not in chunk_df.columns or 'updated_at' not in chunk_df.columns:
+                raise ValueError("Data is missing 'created_at' or 'updated_at' fields.")
+            is_new = pd.to_datetime(chunk_df['created_at']) > self.max_charged_at
+            is_changed = is_new | (pd.to_datetime(chunk_df['updated_at']) > self.max_charged_at)
+
+        # A key already written by a previous chunk is replaced by its latest version, without being counted again
+        is_seen = chunk_df[self.unique_key].isin(self._seen_keys)
+        is_rewritten = is_seen & is_changed
+        is_new = ~is_seen & is_new
+        is_updated = ~is_seen & is_changed & ~is_new
+        self._seen_keys.update(chunk_df.loc[is_changed, self.unique_key].tolist())
+
+        if is_rewritten.any():
+            rewritten_keys = set(chunk_df.loc[is_rewritten, self.unique_key].tolist())
+            self._superseded_keys.update(rewritten_keys)
+            self._pending_updates = [
+                updates_df[~updates_df[self.unique_key].isin(rewritten_keys)] for updates_df in self._pending_updates
+            ]
+        if is_new.any():
+            self._stage(chunk_df[is_new])
+            self.result.inserted += int(is_new.sum())
+            logger.info(f"Staged {int(is_new.sum())} new records for {self.file_path.name}")
+        if is_updated.any() or is_rewritten.any():
+            self.result.updated += int(is_updated.sum())
+            self._pending_updates.append(self._prepare(chunk_df[is_updated | is_rewritten]))
+
+    def close(self) -> None:
+        """
+        Commits the staged new records and applies the pending updates.
+
+        Without updates, the staged records are appended to the file (or replace it when
+        it is written from scratch), a crash midway being rolled back when the storage is
+        opened again (see journaled_append). Otherwise the file is rewritten chunk by chunk
+        with the staged records and the updates, atomically (see atomic_write).
+        """
+        try:
+            if self._pending_updates:
+                updates_df = pd.concat(self._pending_updates, ignore_index=True).reindex(columns=self._columns)
+                self._pending_updates = []
+                self._rewrite(updates_df)
+                logger.info(f"Updated {len(updates_df)} records in {self.file_path.name}")
+            elif self._staged and self._overwrite:
+                with atomic_write(self.file_path) as file:
+                    self._copy_staged(file, header=True)
+            elif self._staged:
+                with journaled_append(self.journal_path, [self.file_path]):
+                    with open(self.file_path, 'a', encoding='utf-8', newline='') as file:
+                        self._copy_staged(file, header=False)
+                        file.flush()
+                        os.fsync(file.fileno())
+            if self._staged:
+                logger.info(f"Inserted {self.result.inserted} new records into {self.file_path.name}")
+        finally:
+            self.staging_path.unlink(missing_ok=True)
+
+    def _rewrite(self, updates_df: pd.DataFrame) -> None:
+        with atomic_write(self.file_path) as file:
+            write_header = True
+            # A file written from scratch only holds the records of the run
+            existing_chunks = [] if self._overwrite else pd.read_csv(self.file_path, chunksize=self.rewrite_chunk_size)
+            for existing_chunk in existing_chunks:
+                kept = existing_chunk[~existing_chunk[self.unique_key].isin(updates_df[self.unique_key])]
+                kept.to_csv(file, index=False, header=write_header)
+                write_header = False
+            if self._staged:
+                self._copy_staged(file, header=write_header)
+                write_header = False
+            updates_df.to_csv(file, index=False, header=write_header)
+
+    def _copy_staged(self, file, header: bool) -> None:
+        if self._superseded_keys:
+            # Read as text, so that the values kept are still written exactly as they were staged
+            superseded = pd.Series(list(self._superseded_keys)).astype(str)
+            staged_chunks = pd.read_csv(
+                self.staging_path, dtype=str, keep_default_na=False, chunksize=self.rewrite_chunk_size
+            )
+            for staged_chunk in staged_chunks:
+                staged_chunk[~staged_chunk[self.unique_key].isin(superseded)].to_csv(file, index=False, header=header)
+                header = False
+            return
+
+        # The staged rows are copied as text, so their values are written exactly as they were staged
+        with open(self.staging_path, 'r', encoding='utf-8', newline='') as staged:
+            if not header:
+                staged.readline()
+            shutil.copyfileobj(staged, file)
+
+    def _prepare(self, data_df: pd.DataFrame) -> pd.DataFrame:
+        data_df = data_df.drop(columns=['created_at', 'updated_at'], errors='ignore')
+        return data_df.assign(charged_at=self.charged_at)
+
+    def _stage(self, data_df: pd.DataFrame) -> None:
+        data_df = self._prepare(data_df)
+        if self._columns is None:
+            self._columns = list(data_df.columns)
+        if not self._staged:
+            # Overwrites the staging file of an interrupted run, whose records were never committed
+            data_df.reindex(columns=self._columns).to_csv(self.staging_path, mode='w', index=False, header=True)
+            self._staged = True
+        else:
+            data_df.reindex(columns=self._columns).to_csv(self.staging_path, mode='a', index=False, header=False)
+
+
+class CSVDeltaWriter(StorageWriter):
+    """
+    Writes the new and updated records of a category to a new delta segment.
+
+    Changes are detected against the `charged_at` watermark of the base snapshot
+    and the existing deltas, read when the writer is opened. The segment is only
+    created if at least one record changed.
+
+    Reads keep the latest segment of each key, so a chunk holding keys already
+    written by a previous chunk starts a new segment: the latest version of a key
+    wins, as in upsert_records.
+
+    Each chunk is appended with a journal (see journaled_append), so a crash while
+    writing it leaves no partial row once the storage is opened again.
+
+    Attributes:
+        storage (CSVStorage): The storage the segment belongs to.
+        category: The category of the data.
+        unique_key (str): The field used to uniquely identify records.
+    """
+
+    durable_chunks = True
+
+    def __init__(self, storage: CSVStorage, category: Union[str, DataCategory], unique_key: str):
+        super().__init__()
+        self.storage = storage
+        self.category = category
+        self.unique_key = unique_key
+        self.charged_at = datetime.now().strftime("%Y-%m-%dT%H:%M")
+        self.max_charged_at = storage.read_watermark(category)
+        self.delta_path = self._new_delta_path()
+        self._columns: Optional[List[str]] = None
+        self._seen_keys = set()
+
+    def write(self, chunk_df: pd.DataFrame) -> None:
+        """
+        Appends the new and updated records of a chunk to the delta segment.
+
+        Args:
+            chunk_df (pd.DataFrame): A chunk of cleaned data.
+
+        Raises:
+            ValueError: If existing data must be compared but the chunk has no 'created_at' or 'updated_at' fields.
+        """
+        chunk_df = select_changed_records(chunk_df, self.max_charged_at)
+        if chunk_df.empty:
+            return
+
+        # A key already written by a previous chunk is not counted again
+        is_seen = chunk_df[self.unique_key].isin(self._seen_keys)
+        self._seen_keys.update(chunk_df[self.unique_key].tolist())
+        inserted = count_new_records(chunk_df[~is_seen], self.max_charged_at)
+        self.result += SaveResult(inserted=inserted, updated=int((~is_seen).sum()) - inserted)
+
+        chunk_df = chunk_df.drop(columns=['created_at', 'updated_at'], errors='ignore').assign(charged_at=self.charged_at)
+        new_segment = self._columns is None or bool(is_seen.any())
+        if self._columns is None:
+            self._columns = list(chunk_df.columns)
+            self.delta_path.parent.mkdir(parents=True, exist_ok=True)
+        elif new_segment:
+            self.delta_path = self._new_delta_path()
+
+        journal_path = self.delta_path.with_name(f"{self.delta_path.name}.journal")
+        with journaled_append(journal_path, [self.delta_path]):
+            with open(self.delta_path, 'w' if new_segment else 'a', encoding='utf-8', newline='') as file:
+                chunk_df.reindex(columns=self._columns).to_csv(file, index=False, header=new_segment)
+                file.flush()
+                os.fsync(file.fileno())
+        logger.info(f"Saved {len(chunk_df)} new or updated records to {self.delta_path}")
+
+    def close(self) -> None:
+        """
+        Compacts the category when the number of delta segments reaches the storage threshold.
+        """
+        if self._columns is None:
+            logger.info(f"No new or updated records to save for {self.storage._get_category_str(self.category)}.")
+            return
+
+        if self.storage.max_deltas and len(self.storage._list_deltas(self.category)) >= self.storage.max_deltas:
+            self.storage.compact(self.category, self.unique_key)
+
+    def _new_delta_path(self) -> Path:
+        return self.storage._get_deltas_dir(self.category) / f"delta-{datetime.now():%Y%m%dT%H%M%S%f}.csv"
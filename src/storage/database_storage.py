@@ -0,0 +1,508 @@
+from abc import abstractmethod
+from pathlib import Path
+import json
+import threading
+import sqlite3
+import pandas as pd
+from contextlib import closing
+from datetime import datetime
+from pipeline.data_category import DataCategory
+from pipeline.schemas import explode_listen_history
+from storage.storage import SaveResult, Storage, StorageWriter
+from logger.logger_config import logger
+from typing import Dict, List, Optional, Tuple, Union
+
+# Tables of the schema proposed in docs/ANSWERS.md (step 4), without charged_at which is added to every table
+TABLE_SCHEMAS: Dict[str, Dict[str, str]] = {
+    DataCategory.TRACKS.value: {
+        "id": "BIGINT",
+        "name": "TEXT",
+        "artist": "TEXT",
+        "songwriters": "TEXT",
+        "duration": "TEXT",
+        "genres": "TEXT",
+        "album": "TEXT",
+        "created_at": "TIMESTAMP",
+        "updated_at": "TIMESTAMP",
+    },
+    DataCategory.USERS.value: {
+        "id": "BIGINT",
+        "first_name": "TEXT",
+        "last_name": "TEXT",
+        "email": "TEXT",
+        "gender": "TEXT",
+        "favorite_genres": "TEXT",
+        "created_at": "TIMESTAMP",
+        "updated_at": "TIMESTAMP",
+    },
+    # One row per listened track, in the order of the history of the user
+    DataCategory.LISTEN_HISTORY.value: {
+        "user_id": "BIGINT",
+        "track_id": "BIGINT",
+        "position": "INTEGER",
+        "created_at": "TIMESTAMP",
+        "updated_at": "TIMESTAMP",
+    },
+}
+
+# Primary keys of the tables holding several rows per unique key, the others use the unique key
+PRIMARY_KEYS: Dict[str, Tuple[str, ...]] = {
+    DataCategory.LISTEN_HISTORY.value: ("user_id", "position"),
+}
+
+INDEXED_COLUMNS = ("updated_at", "charged_at", "track_id")
+
+
+class DatabaseStorage(Storage):
+    """
+    Base class for storages backed by an embedded SQL database.
+
+    Each category is a table whose primary key is the unique key, with secondary
+    indexes on `updated_at` and `charged_at`. A batch is upserted in one transaction
+    with `INSERT ... ON CONFLICT DO UPDATE`, and a stored row is only rewritten when
+    the incoming `updated_at` is more recent, so the cost of a save is proportional
+    to the batch and not to the size of the table.
+
+    Listen histories are stored with one row per track (see PRIMARY_KEYS): all the
+    rows of a user are deleted and inserted again when its history is more recent,
+    so that a shorter history leaves no row behind.
+
+    In streaming mode, each chunk is upserted in its own transaction (see
+    DatabaseStreamWriter), so memory stays bounded by the chunk size.
+
+    Subclasses implement the abstract hooks: the connection, the bulk insert of the
+    rows, the `batch` relation and the queries returning DataFrames.
+
+    Attributes:
+        storage_dir (Path): The directory holding the database file.
+        database_path (Path): The database file.
+    """
+
+    def __init__(self, storage_dir: str = "data", database_name: str = "moovitamix.db"):
+        """
+        Initializes the storage and creates the tables of the known categories.
+
+        Args:
+            storage_dir (str): The directory where the database file is stored.
+            database_name (str): The name of the database file.
+
+        Raises:
+            OSError: If the directory creation fails.
+        """
+        try:
+            self.storage_dir = Path(storage_dir)
+            self.storage_dir.mkdir(parents=True, exist_ok=True)
+            self.database_path = self.storage_dir / database_name
+        except OSError as e:
+            logger.error(f"Failed to create or access storage directory: {storage_dir}. Error: {e}")
+            raise
+
+        with closing(self._connect()) as connection:
+            self._migrate_listen_history(connection)
+            for category in DataCategory:
+                self._create_table(connection, category.value, TABLE_SCHEMAS[category.value], category.key_field)
+            connection.commit()
+        logger.info(f"{type(self).__name__} initialized with database: {self.database_path}")
+
+    def save_data(self, category: Union[str, DataCategory], data_df: pd.DataFrame, unique_key: str) -> SaveResult:
+        """
+        Upserts the given DataFrame into the category table.
+
+        - Records with an unknown key are inserted.
+        - Records with a known key are updated if their `updated_at` is more recent.
+        - Adds a `charged_at` timestamp to indicate when the record was processed.
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data (used as table name).
+            data_df (pd.DataFrame): The DataFrame containing data to be saved.
+            unique_key (str): The primary key of the table.
+
+        Returns:
+            SaveResult: The number of inserted and updated records.
+
+        Raises:
+            ValueError: If the DataFrame is empty or the unique key is missing.
+            Exception: If saving the data fails for any reason.
+        """
+        if data_df.empty:
+            raise ValueError("The data DataFrame is empty, nothing to save.")
+
+        category_str = self._get_category_str(category)
+        try:
+            if unique_key not in data_df.columns:
+                raise ValueError(f"Data is missing the '{unique_key}' field.")
+            if category_str == DataCategory.LISTEN_HISTORY.value and "items" in data_df.columns:
+                data_df = explode_listen_history(data_df)
+
+            schema = TABLE_SCHEMAS.get(category_str) or {column: "TEXT" for column in data_df.columns}
+            rows_df = self._prepare_rows(data_df, schema)
+
+            with closing(self._connect()) as connection:
+                self._create_table(connection, category_str, schema, unique_key)
+                self._begin(connection)
+                if self._get_primary_key(category_str, unique_key) != (unique_key,):
+                    result = self._replace(connection, category_str, rows_df, unique_key)
+                else:
+                    result = self._upsert_batch(connection, category_str, rows_df, unique_key)
+                connection.commit()
+
+            logger.info(f"Upserted {len(rows_df)} records into {category_str}, {result.inserted} inserted and {result.updated} updated")
+            return result
+
+        except ValueError as e:
+            logger.error(f"Data validation error for {category_str}: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Failed to save data to {self.database_path}: {e}")
+            raise
+
+    def open_writer(self, category: Union[str, DataCategory], unique_key: str) -> "DatabaseStreamWriter":
+        """
+        Opens a writer that upserts each chunk of a category in its own transaction.
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data (used as table name).
+            unique_key (str): The primary key of the table.
+
+        Returns:
+            DatabaseStreamWriter: The writer for the category table.
+        """
+        return DatabaseStreamWriter(self, category, unique_key)
+
+    def load_data(self, category: Union[str, DataCategory], columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Loads the rows of a category table.
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data.
+            columns (Optional[List[str]]): The columns to read, all of them if None.
+
+        Returns:
+            pd.DataFrame: The rows of the table.
+        """
+        selected = ", ".join(self._quote(column) for column in columns) if columns else "*"
+        query = f"SELECT {selected} FROM {self._quote(self._get_category_str(category))}"
+        with closing(self._connect()) as connection:
+            return self._read_query(connection, query)
+
+    def read_watermark(self, category: Union[str, DataCategory]) -> Optional[pd.Timestamp]:
+        """
+        Reads the most recent `charged_at` of a category from its index.
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data.
+
+        Returns:
+            Optional[pd.Timestamp]: The most recent `charged_at`, or None if the table is empty.
+        """
+        query = f"SELECT MAX(charged_at) AS charged_at FROM {self._quote(self._get_category_str(category))}"
+        with closing(self._connect()) as connection:
+            max_charged_at = self._read_query(connection, query)['charged_at'].iloc[0]
+        return None if pd.isna(max_charged_at) else pd.Timestamp(max_charged_at)
+
+    @abstractmethod
+    def _connect(self):
+        """Open a connection to the database file."""
+        pass
+
+    @abstractmethod
+    def _begin(self, connection) -> None:
+        """Open the write transaction of a save, committed by the caller."""
+        pass
+
+    @abstractmethod
+    def _upsert(self, connection, table: str, rows_df: pd.DataFrame, unique_key: str) -> int:
+        """Upsert the rows of the registered `batch` into the table and return the number of rows inserted or updated."""
+        pass
+
+    @abstractmethod
+    def _register_batch(self, connection, table: str, rows_df: pd.DataFrame) -> None:
+        """Make the rows readable by the following statements as a relation named `batch`."""
+        pass
+
+    @abstractmethod
+    def _unregister_batch(self, connection) -> None:
+        """Drop the relation created by _register_batch."""
+        pass
+
+    @abstractmethod
+    def _read_query(self, connection, query: str) -> pd.DataFrame:
+        """Run a query and return its rows as a DataFrame."""
+        pass
+
+    def _upsert_batch(self, connection, table: str, rows_df: pd.DataFrame, unique_key: str) -> SaveResult:
+        """
+        Upserts the rows of a table keyed by the unique key.
+
+        The batch keys already stored are counted through the primary key index before
+        the upsert, so that the number of inserted and updated records is known without
+        scanning the table.
+
+        Returns:
+            SaveResult: The number of records inserted and updated.
+        """
+        key = self._quote(unique_key)
+        self._register_batch(connection, table, rows_df)
+        try:
+            existing = int(connection.execute(
+                f"SELECT COUNT(*) FROM {self._quote(table)} WHERE {key} IN (SELECT {key} FROM batch)"
+            ).fetchone()[0])
+            changed = self._upsert(connection, table, rows_df, unique_key)
+        finally:
+            self._unregister_batch(connection)
+        inserted = rows_df[unique_key].nunique() - existing
+        return SaveResult(inserted=inserted, updated=changed - inserted)
+
+    def _get_columns(self, connection, table: str) -> List[str]:
+        cursor = connection.execute(f"SELECT * FROM {self._quote(table)} LIMIT 0")
+        return [description[0] for description in cursor.description]
+
+    def _create_table(self, connection, table: str, schema: Dict[str, str], unique_key: str) -> None:
+        columns = [f"{self._quote(column)} {sql_type}" for column, sql_type in schema.items()]
+        columns.append("charged_at TIMESTAMP")
+        primary_key = ", ".join(self._quote(column) for column in self._get_primary_key(table, unique_key))
+        connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {self._quote(table)} ({', '.join(columns)}, PRIMARY KEY ({primary_key}))"
+        )
+        for column in INDEXED_COLUMNS:
+            if column in schema or column == "charged_at":
+                connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS {self._quote(f'idx_{table}_{column}')} ON {self._quote(table)} ({self._quote(column)})"
+                )
+
+    def _prepare_rows(self, data_df: pd.DataFrame, schema: Dict[str, str]) -> pd.DataFrame:
+        """
+        Restricts the data to the table columns and converts the values to SQL friendly types.
+        """
+        rows_df = data_df[[column for column in schema if column in data_df.columns]].copy()
+        for column in rows_df.columns:
+            if schema[column] == "TIMESTAMP":
+                rows_df[column] = self._to_sql_timestamp(pd.to_datetime(rows_df[column]))
+            elif rows_df[column].map(lambda value: isinstance(value, (list, tuple))).any():
+                rows_df[column] = rows_df[column].map(lambda value: json.dumps(list(value)) if isinstance(value, (list, tuple)) else value)
+        rows_df["charged_at"] = self._to_sql_timestamp(pd.Series(pd.Timestamp(datetime.now()), index=rows_df.index))
+        return rows_df
+
+    def _to_sql_timestamp(self, timestamps: pd.Series) -> pd.Series:
+        return timestamps
+
+    def _replace(self, connection, table: str, rows_df: pd.DataFrame, unique_key: str) -> SaveResult:
+        """
+        Replaces all the rows of the keys whose incoming rows are new or more recent than the stored ones.
+
+        The changed keys are selected with a single join against the latest `updated_at`
+        of each stored batch key, looked up through the primary key, then their rows are
+        deleted and the incoming ones inserted.
+
+        Returns:
+            SaveResult: The number of rows inserted for unknown keys and for known keys.
+        """
+        quoted_table = self._quote(table)
+        key = self._quote(unique_key)
+        columns = ", ".join(self._quote(column) for column in rows_df.columns)
+
+        self._register_batch(connection, table, rows_df)
+        try:
+            connection.execute(
+                f"CREATE TEMP TABLE changed_keys AS SELECT DISTINCT batch.{key} AS {key}, stored.{key} IS NULL AS is_new "
+                f"FROM batch LEFT JOIN (SELECT {key}, MAX(updated_at) AS updated_at FROM {quoted_table} "
+                f"WHERE {key} IN (SELECT {key} FROM batch) GROUP BY {key}) AS stored "
+                f"ON batch.{key} = stored.{key} WHERE stored.{key} IS NULL OR batch.updated_at > stored.updated_at"
+            )
+            changed_keys = f"(SELECT {key} FROM changed_keys)"
+            connection.execute(f"DELETE FROM {quoted_table} WHERE {key} IN {changed_keys}")
+            connection.execute(f"INSERT INTO {quoted_table} ({columns}) SELECT {columns} FROM batch WHERE {key} IN {changed_keys}")
+            inserted, written = connection.execute(
+                f"SELECT COALESCE(SUM(CASE WHEN changed_keys.is_new THEN 1 ELSE 0 END), 0), COUNT(*) "
+                f"FROM batch JOIN changed_keys ON batch.{key} = changed_keys.{key}"
+            ).fetchone()
+            connection.execute("DROP TABLE changed_keys")
+        finally:
+            self._unregister_batch(connection)
+        return SaveResult(inserted=int(inserted), updated=int(written) - int(inserted))
+
+    def _migrate_listen_history(self, connection) -> None:
+        """
+        Converts a listen_history table written with one JSON list of tracks per user to one row per track.
+        """
+        table = DataCategory.LISTEN_HISTORY.value
+        try:
+            columns = self._get_columns(connection, table)
+        except Exception:
+            return  # the table does not exist yet
+        if "items" not in columns:
+            return
+
+        self._begin(connection)
+        history_df = self._read_query(connection, f"SELECT * FROM {self._quote(table)}")
+        history_df["items"] = history_df["items"].map(json.loads)
+        rows_df = explode_listen_history(history_df)
+        connection.execute(f"DROP TABLE {self._quote(table)}")
+        self._create_table(connection, table, TABLE_SCHEMAS[table], DataCategory.LISTEN_HISTORY.key_field)
+        if not rows_df.empty:
+            self._replace(connection, table, rows_df, DataCategory.LISTEN_HISTORY.key_field)
+        logger.info(f"Migrated {len(history_df)} listen histories of {self.database_path} to {len(rows_df)} rows, one per track")
+
+    def _build_upsert_statement(self, table: str, columns: List[str], unique_key: str, source: str) -> str:
+        quoted_table = self._quote(table)
+        quoted_columns = ", ".join(self._quote(column) for column in columns)
+        updates = ", ".join(
+            f"{self._quote(column)} = excluded.{self._quote(column)}" for column in columns if column != unique_key
+        )
+        statement = f"INSERT INTO {quoted_table} ({quoted_columns}) {source} ON CONFLICT ({self._quote(unique_key)}) DO UPDATE SET {updates}"
+        if "updated_at" in columns:
+            statement += f" WHERE excluded.updated_at > {quoted_table}.updated_at"
+        return statement
+
+    @staticmethod
+    def _get_primary_key(table: str, unique_key: str) -> Tuple[str, ...]:
+        return PRIMARY_KEYS.get(table, (unique_key,))
+
+    @staticmethod
+    def _quote(identifier: str) -> str:
+        return '"' + identifier.replace('"', '""') + '"'
+
+    @staticmethod
+    def _get_category_str(category: Union[str, DataCategory]) -> str:
+        return category.value if hasattr(category, 'value') else str(category)
+
+
+class DatabaseStreamWriter(StorageWriter):
+    """
+    Upserts a category chunk by chunk, each chunk in its own transaction (see DatabaseStorage.save_data).
+
+    Only the current chunk is held in memory. A stored row is only replaced by a more
+    recent one, so upserting a chunk again is harmless and an interrupted sync can
+    resume after its last written chunk. A key written again by a later chunk with
+    a more recent `updated_at` therefore gets that latest version.
+
+    Attributes:
+        storage (DatabaseStorage): The storage the data is written to.
+        category: The category of the data.
+        unique_key (str): The primary key of the table.
+    """
+
+    durable_chunks = True
+
+    def __init__(self, storage: DatabaseStorage, category: Union[str, DataCategory], unique_key: str):
+        super().__init__()
+        self.storage = storage
+        self.category = category
+        self.unique_key = unique_key
+
+    def write(self, chunk_df: pd.DataFrame) -> None:
+        """
+        Upserts a chunk of cleaned data and commits it.
+
+        Args:
+            chunk_df (pd.DataFrame): A chunk of cleaned data.
+        """
+        if not chunk_df.empty:
+            self.result += self.storage.save_data(self.category, chunk_df, self.unique_key)
+
+    def close(self) -> None:
+        """
+        Nothing is pending, every chunk is committed by write().
+        """
+        pass
+
+
+class SQLiteStorage(DatabaseStorage):
+    """
+    Storage backed by a local SQLite database (standard library, no extra dependency).
+
+    Rows are bound with `executemany` into a temporary `batch` table, and upserted
+    from it inside a single transaction. Each call opens its own connection, so
+    categories can be saved from different threads: a save takes the write lock
+    when it starts (`BEGIN IMMEDIATE`), so concurrent saves wait for each other
+    instead of failing, and WAL mode lets readers work while a category is being written.
+    """
+
+    def __init__(self, storage_dir: str = "data", database_name: str = "moovitamix.sqlite"):
+        super().__init__(storage_dir=storage_dir, database_name=database_name)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Transactions are opened explicitly by _begin, not implicitly before the first write
+        connection = sqlite3.connect(self.database_path, timeout=30, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _begin(self, connection: sqlite3.Connection) -> None:
+        # A deferred transaction reading before it writes cannot wait for the lock under WAL
+        # (SQLITE_BUSY_SNAPSHOT): the lock is taken upfront, within the busy timeout
+        connection.execute("BEGIN IMMEDIATE")
+
+    def _to_sql_timestamp(self, timestamps: pd.Series) -> pd.Series:
+        # SQLite has no timestamp type: a fixed-width ISO format keeps string comparisons chronological
+        return timestamps.dt.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+    def _upsert(self, connection: sqlite3.Connection, table: str, rows_df: pd.DataFrame, unique_key: str) -> int:
+        columns = list(rows_df.columns)
+        selected = ", ".join(self._quote(column) for column in columns)
+        # Without a WHERE clause, SQLite would parse ON CONFLICT as a join constraint of the SELECT
+        statement = self._build_upsert_statement(table, columns, unique_key, f"SELECT {selected} FROM batch WHERE true")
+
+        changes_before = connection.total_changes
+        connection.execute(statement)
+        return connection.total_changes - changes_before
+
+    def _register_batch(self, connection: sqlite3.Connection, table: str, rows_df: pd.DataFrame) -> None:
+        columns = ", ".join(self._quote(column) for column in rows_df.columns)
+        placeholders = ", ".join("?" for _ in rows_df.columns)
+        connection.execute(f"CREATE TEMP TABLE batch AS SELECT {columns} FROM {self._quote(table)} WHERE 0")
+        connection.executemany(f"INSERT INTO batch VALUES ({placeholders})", self._to_rows(rows_df))
+
+    def _unregister_batch(self, connection: sqlite3.Connection) -> None:
+        connection.execute("DROP TABLE IF EXISTS temp.batch")
+
+    @staticmethod
+    def _to_rows(rows_df: pd.DataFrame) -> List[list]:
+        # tolist() converts numpy scalars to Python values that sqlite3 can bind
+        return rows_df.astype(object).where(rows_df.notna(), None).to_numpy().tolist()
+
+    def _read_query(self, connection: sqlite3.Connection, query: str) -> pd.DataFrame:
+        return pd.read_sql_query(query, connection)
+
+
+class DuckDBStorage(DatabaseStorage):
+    """
+    Storage backed by a local DuckDB database (requires the optional `duckdb` package).
+
+    The batch DataFrame is registered as a view and upserted with a single
+    `INSERT ... SELECT`, which DuckDB executes in a vectorized way.
+    """
+
+    # Connections opened concurrently from several threads may miss the pandas scan
+    # function ("pandas_scan does not exist") when categories are saved in parallel
+    _connect_lock = threading.Lock()
+
+    def __init__(self, storage_dir: str = "data", database_name: str = "moovitamix.duckdb"):
+        try:
+            import duckdb  # noqa: F401
+        except ImportError as e:
+            raise ImportError("DuckDBStorage requires duckdb, install it with `pip install duckdb`.") from e
+        super().__init__(storage_dir=storage_dir, database_name=database_name)
+
+    def _connect(self):
+        import duckdb
+        with self._connect_lock:
+            return duckdb.connect(str(self.database_path))
+
+    def _upsert(self, connection, table: str, rows_df: pd.DataFrame, unique_key: str) -> int:
+        columns = list(rows_df.columns)
+        selected = ", ".join(self._quote(column) for column in columns)
+        statement = self._build_upsert_statement(table, columns, unique_key, f"SELECT {selected} FROM batch")
+        return connection.execute(statement).fetchone()[0]
+
+    def _begin(self, connection) -> None:
+        connection.begin()
+
+    def _register_batch(self, connection, table: str, rows_df: pd.DataFrame) -> None:
+        connection.register("batch", rows_df)
+
+    def _unregister_batch(self, connection) -> None:
+        connection.unregister("batch")
+
+    def _read_query(self, connection, query: str) -> pd.DataFrame:
+        return connection.execute(query).df()
@@ -0,0 +1,289 @@
+from pathlib import Path
+import uuid
+import pandas as pd
+from datetime import datetime
+from pipeline.data_category import DataCategory
+from storage.atomic_write import atomic_write
+from storage.storage import SaveResult, Storage, StorageWriter
+from storage.upsert import count_new_records, select_changed_records
+from logger.logger_config import logger
+from typing import Any, List, Optional, Union
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = None
+
+
+class ParquetStorage(Storage):
+    """
+    Class to handle saving and loading data as partitioned Parquet files.
+
+    Each run appends its new and updated records to a compressed, columnar file
+    under `<storage_dir>/<category>/load_date=<YYYY-MM-DD>/`, so nothing is ever
+    rewritten. Column types (integers, timestamps, lists) are preserved, and reads
+    only decode the requested columns and skip the data excluded by the filters.
+
+    Attributes:
+        storage_dir (Path): The directory where Parquet datasets are saved.
+        compression (str): The Parquet compression codec.
+    """
+
+    # The tracks of a listen history are stored as a Parquet list column
+    supports_list_columns = True
+
+    def __init__(self, storage_dir: str = "data", compression: str = "zstd"):
+        """
+        Initializes the ParquetStorage with the specified directory.
+        If the directory does not exist, it creates it.
+
+        Args:
+            storage_dir (str): The directory path where Parquet datasets will be stored.
+            compression (str): The Parquet compression codec (e.g. 'zstd', 'snappy').
+
+        Raises:
+            ImportError: If pyarrow is not installed.
+            OSError: If the directory creation fails.
+        """
+        if pa is None:
+            raise ImportError("ParquetStorage requires pyarrow, install it with `pip install pyarrow`.")
+
+        try:
+            self.storage_dir = Path(storage_dir)
+            self.storage_dir.mkdir(parents=True, exist_ok=True)
+            self.compression = compression
+            logger.info(f"ParquetStorage initialized with directory: {self.storage_dir}")
+        except OSError as e:
+            logger.error(f"Failed to create or access storage directory: {self.storage_dir}. Error: {e}")
+            raise
+
+    def save_data(self, category: Union[str, DataCategory], data_df: pd.DataFrame, unique_key: str) -> SaveResult:
+        """
+        Appends the new and updated records of the given DataFrame to the category dataset.
+
+        - On the first load every record is written.
+        - Afterwards, only the records created or updated after the most recent
+          `charged_at` are written; reads keep the latest version of each key.
+        - Adds a `charged_at` timestamp to indicate when the record was processed.
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data (used for the dataset directory).
+            data_df (pd.DataFrame): The DataFrame containing data to be saved.
+            unique_key (str): The field used to uniquely identify records.
+
+        Returns:
+            SaveResult: The number of inserted and updated records.
+
+        Raises:
+            ValueError: If the DataFrame is empty or missing required fields.
+            Exception: If saving the data fails for any reason.
+        """
+        if data_df.empty:
+            raise ValueError("The data DataFrame is empty, nothing to save.")
+
+        category_str = self._get_category_str(category)
+        try:
+            writer = self.open_writer(category, unique_key)
+            writer.write(data_df)
+            writer.close()
+            return writer.result
+        except ValueError as e:
+            logger.error(f"Data validation error for {category_str}: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Failed to save data to {self._get_dataset_dir(category)}: {e}")
+            raise
+
+    def open_writer(self, category: Union[str, DataCategory], unique_key: str) -> "ParquetStreamWriter":
+        """
+        Opens a writer that appends each chunk of a category as its own Parquet file.
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data.
+            unique_key (str): The field used to uniquely identify records.
+
+        Returns:
+            ParquetStreamWriter: The writer for the category dataset.
+        """
+        return ParquetStreamWriter(self, category, unique_key)
+
+    def load_data(
+        self,
+        category: Union[str, DataCategory],
+        columns: Optional[List[str]] = None,
+        filters: Any = None,
+        unique_key: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        Loads a category dataset, reading only the requested columns and rows.
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data.
+            columns (Optional[List[str]]): The columns to read, all of them if None.
+            filters: A pyarrow expression or a list of `(column, op, value)` tuples
+                pushed down to the Parquet reader (e.g. `[("load_date", ">=", "2024-10-01")]`).
+            unique_key (Optional[str]): If given, only the latest version of each key is
+                returned. Filters are applied first, so they should target immutable columns.
+
+        Returns:
+            pd.DataFrame: The loaded data, or an empty DataFrame if the dataset doesn't exist.
+        """
+        dataset = self._open_dataset(category)
+        if dataset is None:
+            logger.info(f"No existing data found for {self._get_category_str(category)}. Returning an empty DataFrame.")
+            return pd.DataFrame(columns=columns)
+
+        if filters is not None and not isinstance(filters, pc.Expression):
+            filters = pq.filters_to_expression(filters)
+
+        read_columns = columns
+        if unique_key is not None and columns is not None:
+            read_columns = list(dict.fromkeys([*columns, unique_key, 'charged_at']))
+
+        data_df = dataset.to_table(columns=read_columns, filter=filters).to_pandas()
+
+        if unique_key is not None and not data_df.empty:
+            data_df = (
+                data_df.sort_values('charged_at', kind='stable')
+                .drop_duplicates(subset=[unique_key], keep='last')
+                .reset_index(drop=True)
+            )
+            if columns is not None:
+                data_df = data_df[columns]
+
+        return data_df
+
+    def read_watermark(self, category: Union[str, DataCategory]) -> Optional[pd.Timestamp]:
+        """
+        Reads the most recent `charged_at` of a category, decoding only that column.
+
+        Args:
+            category (Union[str, DataCategory]): The category of the data.
+
+        Returns:
+            Optional[pd.Timestamp]: The most recent `charged_at`, or None if the dataset does not exist.
+        """
+        dataset = self._open_dataset(category)
+        if dataset is None or 'charged_at' not in dataset.schema.names:
+            return None
+
+        max_charged_at = pc.max(dataset.to_table(columns=['charged_at'])['charged_at']).as_py()
+        return None if max_charged_at is None else pd.Timestamp(max_charged_at)
+
+    def _open_dataset(self, category: Union[str, DataCategory]) -> Optional["ds.Dataset"]:
+        dataset_dir = self._get_dataset_dir(category)
+        # Only the committed parts, not the temporary file of a write interrupted by a crash (see atomic_write)
+        file_paths = sorted(str(file_path) for file_path in dataset_dir.rglob("*.parquet"))
+        if not file_paths:
+            return None
+
+        dataset = ds.dataset(file_paths, format="parquet", partitioning="hive", partition_base_dir=str(dataset_dir))
+        # Files written by different runs may carry different columns or widths (e.g. int32 and
+        # int64 ids, string and large_string), read them with a common schema
+        schema = pa.unify_schemas(
+            [fragment.physical_schema for fragment in dataset.get_fragments()],
+            promote_options="permissive"
+        )
+        for field in dataset.partitioning.schema:
+            schema = schema.append(field)
+        return ds.dataset(file_paths, schema=schema, format="parquet", partitioning="hive", partition_base_dir=str(dataset_dir))
+
+    def _get_category_str(self, category: Union[str, DataCategory]) -> str:
+        return category.value if hasattr(category, 'value') else str(category)
+
+    def _get_dataset_dir(self, category: Union[str, DataCategory]) -> Path:
+        return self.storage_dir / self._get_category_str(category)
+
+
+class ParquetStreamWriter(StorageWriter):
+    """
+    Appends each chunk of a category to its own Parquet file in today's partition.
+
+    New and updated records are detected against the `charged_at` watermark read
+    when the writer is opened. Reads keep the version of each key with the latest
+    `charged_at`, so a chunk holding keys already written by a previous chunk is
+    charged later: the latest version of a key wins, as in upsert_records.
+
+    Every chunk goes to its own file, so copies of the writer can write the shards
+    of a category from several processes.
+
+    Attributes:
+        storage (ParquetStorage): The storage the data is written to.
+        unique_key (str): The field used to uniquely identify records.
+    """
+
+    durable_chunks = True
+    parallel_writes = True
+
+    def __init__(self, storage: ParquetStorage, category: Union[str, DataCategory], unique_key: str):
+        super().__init__()
+        self.storage = storage
+        self.unique_key = unique_key
+        self.category_str = storage._get_category_str(category)
+        # Full precision, so that the latest version of a key wins even between runs of the same minute
+        self.charged_at = pd.Timestamp(datetime.now())
+        self.max_charged_at = storage.read_watermark(category)
+        self.partition_dir = storage._get_dataset_dir(category) / f"load_date={self.charged_at.date().isoformat()}"
+        self._seen_keys = set()
+
+    def write(self, chunk_df: pd.DataFrame) -> None:
+        """
+        Writes the new and updated records of a chunk to a new Parquet file.
+
+        Args:
+            chunk_df (pd.DataFrame): A chunk of cleaned data.
+
+        Raises:
+            ValueError: If existing data must be compared but the chunk has no 'created_at' or 'updated_at' fields.
+        """
+        chunk_df = chunk_df.copy()
+        for column in ('created_at', 'updated_at'):
+            if column in chunk_df.columns:
+                chunk_df[column] = pd.to_datetime(chunk_df[column])
+
+        chunk_df = select_changed_records(chunk_df, self.max_charged_at)
+        if chunk_df.empty:
+            logger.info(f"No new or updated records to save for {self.category_str}.")
+            return
+
+        # A key already written by a previous chunk is not counted again
+        is_seen = chunk_df[self.unique_key].isin(self._seen_keys)
+        self._seen_keys.update(chunk_df[self.unique_key].tolist())
+        inserted = count_new_records(chunk_df[~is_seen], self.max_charged_at)
+        self.result += SaveResult(inserted=inserted, updated=int((~is_seen).sum()) - inserted)
+        if is_seen.any():
+            self.charged_at = max(pd.Timestamp(datetime.now()), self.charged_at + pd.Timedelta(microseconds=1))
+        chunk_df['charged_at'] = self.charged_at
+        self.partition_dir.mkdir(parents=True, exist_ok=True)
+        file_path = self.partition_dir / f"part-{self.charged_at:%H%M%S%f}-{uuid.uuid4().hex[:8]}.parquet"
+        table = self._decode_dictionaries(pa.Table.from_pandas(chunk_df, preserve_index=False))
+        if any(isinstance(dtype, pd.ArrowDtype) and pa.types.is_list(dtype.pyarrow_dtype) for dtype in chunk_df.dtypes):
+            # pandas cannot parse the dtype of Arrow list columns back from the metadata ("list<item: int32>[pyarrow]"),
+            # without it they are read as arrays, like the lists written from Python objects
+            table = table.replace_schema_metadata(None)
+        # Written to a temporary file and renamed, a crash mid-write leaves no truncated part in the dataset
+        with atomic_write(file_path, mode="wb") as file:
+            pq.write_table(table, file, compression=self.storage.compression)
+        logger.info(f"Saved {len(chunk_df)} new or updated records for {self.category_str} to {file_path}")
+
+    def close(self) -> None:
+        """
+        Nothing is buffered, every chunk is already persisted by write().
+        """
+        self._seen_keys = set()
+
+    @staticmethod
+    def _decode_dictionaries(table: pa.Table) -> pa.Table:
+        """
+        Casts the dictionary columns (pandas categories) back to their values.
+
+        The categories of each chunk differ, and the schemas of the files could not be
+        unified on read. Parquet dictionary-encodes repeated values on disk anyway.
+        """
+        for index, field in enumerate(table.schema):
+            if pa.types.is_dictionary(field.type):
+                table = table.set_column(index, field.name, table.column(index).cast(field.type.value_type))
+        return table
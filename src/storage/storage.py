@@ -1,9 +1,128 @@
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import List, Optional
+
+import pandas as pd
+
+
+@dataclass
+class SaveResult:
+    """
+    Number of records inserted and updated by a save.
+
+    Attributes:
+        inserted (int): The number of records with a key unknown to the storage.
+        updated (int): The number of stored records replaced by a more recent version.
+    """
+
+    inserted: int = 0
+    updated: int = 0
+
+    def __add__(self, other: "SaveResult") -> "SaveResult":
+        return SaveResult(self.inserted + other.inserted, self.updated + other.updated)
+
 
 class Storage(ABC):
-    """Interface for data storage."""
-    
+    """
+    Interface for data storage.
+
+    Attributes:
+        supports_list_columns (bool): Whether list columns (the tracks of a listen history)
+            are stored natively. Otherwise the pipeline saves listen histories as a long
+            table with one row per track, and a key may span several rows.
+    """
+
+    supports_list_columns: bool = False
+
+    @abstractmethod
+    def save_data(self, category, data_df: pd.DataFrame, unique_key: str) -> SaveResult:
+        """Save data to the storage and return the number of inserted and updated records."""
+        pass
+
+    def open_writer(self, category, unique_key: str) -> "StorageWriter":
+        """
+        Open a writer that saves data chunk by chunk.
+
+        The default writer buffers every chunk and saves them at once on close;
+        storages able to persist chunks incrementally override this method.
+        """
+        return BufferedStorageWriter(self, category, unique_key)
+
+    def read_watermark(self, category) -> Optional[pd.Timestamp]:
+        """
+        Return the most recent `charged_at` of a category, used as the high-water
+        mark of incremental syncs, or None if it is unknown.
+        """
+        return None
+
+
+class StorageWriter(ABC):
+    """
+    Interface for writing a category to a storage chunk by chunk.
+
+    Attributes:
+        durable_chunks (bool): Whether write() persists each chunk, so that an
+            interrupted run can resume after the last written chunk.
+        max_charged_at (Optional[pd.Timestamp]): For writers that only keep new and
+            updated records, the `charged_at` watermark records are compared against.
+        parallel_writes (bool): Whether copies of the writer may write chunks with disjoint
+            keys from several processes at once, each copy counting its own result.
+        result (SaveResult): The records inserted and updated so far, complete after close().
+    """
+
+    durable_chunks: bool = False
+    parallel_writes: bool = False
+    max_charged_at: Optional[pd.Timestamp] = None
+
+    def __init__(self):
+        self.result = SaveResult()
+
+    @abstractmethod
+    def write(self, chunk_df: pd.DataFrame) -> None:
+        """
+        Write a chunk of cleaned data.
+
+        A key already written by a previous chunk is replaced by the version of the
+        latest chunk, as in upsert_records.
+        """
+        pass
+
     @abstractmethod
-    def save_data(self, data_type, data):
-        """Save data to the storage."""
-        pass
\ No newline at end of file
+    def close(self) -> None:
+        """Flush the pending data and release the writer."""
+        pass
+
+
+class BufferedStorageWriter(StorageWriter):
+    """
+    Fallback writer that buffers all the chunks and saves them with a single save_data call.
+
+    Attributes:
+        storage (Storage): The storage the data is saved to.
+        category: The category of the data.
+        unique_key (str): The field used to uniquely identify records.
+    """
+
+    def __init__(self, storage: Storage, category, unique_key: str):
+        super().__init__()
+        self.storage = storage
+        self.category = category
+        self.unique_key = unique_key
+        self._chunks: List[pd.DataFrame] = []
+
+    def write(self, chunk_df: pd.DataFrame) -> None:
+        if not chunk_df.empty:
+            self._chunks.append(chunk_df)
+
+    def close(self) -> None:
+        if not self._chunks:
+            return
+
+        data_df = pd.concat(
+            [chunk_df.assign(_chunk=index) for index, chunk_df in enumerate(self._chunks)], ignore_index=True
+        )
+        self._chunks = []
+        # Keep every row of the latest chunk of each key, which also holds for keys spanning several rows
+        latest_chunk = data_df.groupby(self.unique_key)['_chunk'].transform('max')
+        data_df = data_df[data_df['_chunk'] == latest_chunk].drop(columns=['_chunk']).reset_index(drop=True)
+        self.result += self.storage.save_data(self.category, data_df, self.unique_key)
@@ -1,8 +1,12 @@
+import json
 import pytest
 import aiohttp
 from aioresponses import aioresponses
 
 from pipeline.api_data_fetcher_async import APIDataFetcherAsync
+from pipeline.http_cache import HTTPCache
+from pipeline.retry import RetryPolicy
+from yarl import URL
 
 USER_MOCK = {"items": [
     {
@@ -43,6 +47,7 @@ async def test_fetch_all_data_success():
         
         url = f"{API_URL}/{ENDPOINT}?page={PAGE_1}&size={PAGE_SIZE}"
         mocked.get(url, payload=USER_MOCK)
+        mocked.get(f"{API_URL}/{ENDPOINT}?page=2&size={PAGE_SIZE}", payload={"items": []})
 
         async with aiohttp.ClientSession() as session:
             result = await fetcher.fetch_all_data(ENDPOINT)
@@ -53,17 +58,18 @@ async def test_fetch_all_data_success():
 
 @pytest.mark.asyncio
 async def test_fetch_all_data_failure():
-    fetcher = APIDataFetcherAsync(api_url=API_URL, page_size=PAGE_SIZE)
+    fetcher = APIDataFetcherAsync(api_url=API_URL, page_size=PAGE_SIZE, retry_policy=RetryPolicy(max_retries=2, backoff_base=0))
 
     with aioresponses() as mocked:
         url = f"{API_URL}/{ENDPOINT}?page={PAGE_1}&size={PAGE_SIZE}"
         
-        mocked.get(url, status=500)
+        mocked.get(url, status=500, repeat=True)
 
-        async with aiohttp.ClientSession() as session:
-            result = await fetcher.fetch_all_data(ENDPOINT)
-            
-    assert result == []
+        with pytest.raises(aiohttp.ClientResponseError):
+            await fetcher.fetch_all_data(ENDPOINT)
+
+    assert fetcher.metrics.get_counter("moovitamix_http_requests_total", endpoint=ENDPOINT) == 3
+    assert fetcher.metrics.get_counter("moovitamix_http_retries_total", endpoint=ENDPOINT) == 2
 
 @pytest.mark.asyncio
 async def test_fetch_all_data_pagination():
@@ -94,10 +100,11 @@ async def test_fetch_all_data_exception_handling():
         url = f"{API_URL}/{ENDPOINT}?page={PAGE_1}&size={PAGE_SIZE}"
         mocked.get(url, exception=aiohttp.ClientError)
 
-        async with aiohttp.ClientSession() as session:
-            result = await fetcher.fetch_all_data(ENDPOINT)
+        # Not a transient failure, raised without retrying
+        with pytest.raises(aiohttp.ClientError):
+            await fetcher.fetch_all_data(ENDPOINT)
 
-    assert result == []
+    assert fetcher.metrics.get_counter("moovitamix_http_retries_total", endpoint=ENDPOINT) == 0
 
 @pytest.mark.asyncio
 async def test_fetch_all_data_empty_response():
@@ -112,4 +119,232 @@ async def test_fetch_all_data_empty_response():
         async with aiohttp.ClientSession() as session:
             result = await fetcher.fetch_all_data(ENDPOINT)
 
-    assert result == []
\ No newline at end of file
+    assert result == []
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_concurrent_pages_in_order():
+    fetcher = APIDataFetcherAsync(api_url=API_URL, page_size=PAGE_SIZE, max_concurrency=3)
+
+    with aioresponses() as mocked:
+        for page in range(1, 4):
+            url = f"{API_URL}/{ENDPOINT}?page={page}&size={PAGE_SIZE}"
+            mocked.get(url, payload={
+                "items": [{"id": page * 10 + 1}, {"id": page * 10 + 2}],
+                "total": 6,
+                "page": page,
+                "size": PAGE_SIZE,
+                "pages": 3
+            })
+
+        result = await fetcher.fetch_all_data(ENDPOINT)
+
+    assert [item["id"] for item in result] == [11, 12, 21, 22, 31, 32]
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_concurrent_without_page_count():
+    fetcher = APIDataFetcherAsync(api_url=API_URL, page_size=PAGE_SIZE, max_concurrency=3)
+
+    with aioresponses() as mocked:
+        mocked.get(f"{API_URL}/{ENDPOINT}?page=1&size={PAGE_SIZE}", payload=USER_MOCK)
+        mocked.get(f"{API_URL}/{ENDPOINT}?page=2&size={PAGE_SIZE}", payload=USER_MOCK_2)
+        mocked.get(f"{API_URL}/{ENDPOINT}?page=3&size={PAGE_SIZE}", payload={"items": []})
+
+        result = await fetcher.fetch_all_data(ENDPOINT)
+
+    assert len(result) == 4
+
+def test_invalid_max_concurrency():
+    with pytest.raises(ValueError):
+        APIDataFetcherAsync(api_url=API_URL, max_concurrency=0)
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_shares_pooled_session():
+    fetcher = APIDataFetcherAsync(api_url=API_URL, page_size=PAGE_SIZE)
+
+    with aioresponses() as mocked:
+        mocked.get(f"{API_URL}/{ENDPOINT}?page=1&size={PAGE_SIZE}", payload=USER_MOCK, repeat=True)
+        mocked.get(f"{API_URL}/{ENDPOINT}?page=2&size={PAGE_SIZE}", payload={"items": []}, repeat=True)
+
+        async with fetcher:
+            session = fetcher._session
+            await fetcher.fetch_all_data(ENDPOINT)
+            await fetcher.fetch_all_data(ENDPOINT)
+            assert fetcher._session is session
+            assert not session.closed
+
+    assert session.closed
+    assert fetcher._session is None
+
+@pytest.mark.asyncio
+async def test_iter_pages_yields_pages_in_order():
+    fetcher = APIDataFetcherAsync(api_url=API_URL, page_size=PAGE_SIZE, max_concurrency=2)
+
+    with aioresponses() as mocked:
+        for page in range(1, 5):
+            mocked.get(f"{API_URL}/{ENDPOINT}?page={page}&size={PAGE_SIZE}", payload={
+                "items": [{"id": page}],
+                "total": 4,
+                "page": page,
+                "size": PAGE_SIZE,
+                "pages": 4
+            })
+
+        pages = [page_data async for page_data in fetcher.iter_pages(ENDPOINT)]
+
+    assert pages == [[{"id": 1}], [{"id": 2}], [{"id": 3}], [{"id": 4}]]
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_sends_extra_params():
+    fetcher = APIDataFetcherAsync(api_url=API_URL, page_size=PAGE_SIZE)
+    params = {"updated_since": "2024-10-01T00:00:00"}
+
+    with aioresponses() as mocked:
+        mocked.get(f"{API_URL}/{ENDPOINT}?page=1&size={PAGE_SIZE}&updated_since=2024-10-01T00:00:00", payload=USER_MOCK)
+        mocked.get(f"{API_URL}/{ENDPOINT}?page=2&size={PAGE_SIZE}&updated_since=2024-10-01T00:00:00", payload={"items": []})
+
+        result = await fetcher.fetch_all_data(ENDPOINT, params=params)
+
+    assert len(result) == 2
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("max_concurrency", [1, 2])
+async def test_iter_pages_resumes_from_start_page(max_concurrency):
+    fetcher = APIDataFetcherAsync(api_url=API_URL, page_size=PAGE_SIZE, max_concurrency=max_concurrency)
+
+    with aioresponses() as mocked:
+        for page in range(3, 6):
+            mocked.get(f"{API_URL}/{ENDPOINT}?page={page}&size={PAGE_SIZE}", payload={
+                "items": [{"id": page}] if page < 5 else [],
+                "total": 4,
+                "page": page,
+                "size": PAGE_SIZE,
+                "pages": 4
+            })
+
+        pages = [page_data async for page_data in fetcher.iter_pages(ENDPOINT, start_page=3)]
+
+    assert pages == [[{"id": 3}], [{"id": 4}]]
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_cursor_pagination():
+    fetcher = APIDataFetcherAsync(api_url=API_URL, page_size=2, pagination="cursor")
+
+    with aioresponses() as mocked:
+        mocked.get(f"{API_URL}/{ENDPOINT}/cursor?limit=2&updated_since=2024-10-01T00:00:00", payload={
+            "items": [{"id": 1}, {"id": 2}],
+            "next_cursor": "abc"
+        })
+        mocked.get(f"{API_URL}/{ENDPOINT}/cursor?limit=2&updated_since=2024-10-01T00:00:00&cursor=abc", payload={
+            "items": [{"id": 3}],
+            "next_cursor": None
+        })
+
+        result = await fetcher.fetch_all_data(ENDPOINT, params={"updated_since": "2024-10-01T00:00:00"})
+
+    assert result == [{"id": 1}, {"id": 2}, {"id": 3}]
+    assert not fetcher.can_resume
+
+def test_invalid_pagination_mode():
+    with pytest.raises(ValueError, match="pagination must be one of page, cursor."):
+        APIDataFetcherAsync(api_url=API_URL, pagination="offset")
+
+@pytest.mark.asyncio
+async def test_iter_pages_export_batches():
+    fetcher = APIDataFetcherAsync(api_url=API_URL, page_size=2, pagination="export")
+    body = "".join(f'{{"id": {id}}}\n' for id in range(1, 6))
+
+    with aioresponses() as mocked:
+        mocked.get(f"{API_URL}/export/{ENDPOINT}?updated_since=2024-10-01T00:00:00", body=body)
+
+        pages = [page_data async for page_data in fetcher.iter_pages(ENDPOINT, params={"updated_since": "2024-10-01T00:00:00"})]
+
+    assert pages == [[{"id": 1}, {"id": 2}], [{"id": 3}, {"id": 4}], [{"id": 5}]]
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_custom_json_loads():
+    decoded_bodies = []
+
+    def json_loads(body):
+        decoded_bodies.append(body)
+        return json.loads(body)
+
+    fetcher = APIDataFetcherAsync(api_url=API_URL, page_size=PAGE_SIZE, json_loads=json_loads)
+
+    with aioresponses() as mocked:
+        mocked.get(f"{API_URL}/{ENDPOINT}?page=1&size={PAGE_SIZE}", payload=USER_MOCK)
+        mocked.get(f"{API_URL}/{ENDPOINT}?page=2&size={PAGE_SIZE}", payload={"items": []})
+
+        result = await fetcher.fetch_all_data(ENDPOINT)
+
+    assert len(result) == 2
+    assert len(decoded_bodies) == 2 and isinstance(decoded_bodies[0], bytes)
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_records_metrics():
+    fetcher = APIDataFetcherAsync(api_url=API_URL, page_size=PAGE_SIZE, retry_policy=RetryPolicy(backoff_base=0))
+    empty_page = json.dumps({"items": []})
+
+    with aioresponses() as mocked:
+        mocked.get(f"{API_URL}/{ENDPOINT}?page=1&size={PAGE_SIZE}", body=json.dumps(USER_MOCK))
+        mocked.get(f"{API_URL}/{ENDPOINT}?page=2&size={PAGE_SIZE}", status=500)
+        mocked.get(f"{API_URL}/{ENDPOINT}?page=2&size={PAGE_SIZE}", body=empty_page)
+
+        result = await fetcher.fetch_all_data(ENDPOINT)
+
+    metrics = fetcher.metrics
+    assert len(result) == 2
+    assert metrics.get_counter("moovitamix_http_requests_total", endpoint=ENDPOINT) == 3
+    assert metrics.get_counter("moovitamix_http_request_errors_total", endpoint=ENDPOINT) == 1
+    assert metrics.get_counter("moovitamix_http_retries_total", endpoint=ENDPOINT) == 1
+    assert metrics.get_counter("moovitamix_http_response_bytes_total", endpoint=ENDPOINT) == len(json.dumps(USER_MOCK)) + len(empty_page)
+    assert metrics.get_counter("moovitamix_pages_fetched_total", endpoint=ENDPOINT) == 1
+    assert metrics.get_histogram("moovitamix_http_request_duration_seconds", endpoint=ENDPOINT).count == 3
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_retries_concurrent_pages():
+    fetcher = APIDataFetcherAsync(
+        api_url=API_URL, page_size=PAGE_SIZE, max_concurrency=4, retry_policy=RetryPolicy(backoff_base=0)
+    )
+
+    with aioresponses() as mocked:
+        mocked.get(f"{API_URL}/{ENDPOINT}?page=1&size={PAGE_SIZE}", payload={**USER_MOCK, "pages": 3})
+        mocked.get(f"{API_URL}/{ENDPOINT}?page=2&size={PAGE_SIZE}", status=503, headers={"Retry-After": "0"})
+        mocked.get(f"{API_URL}/{ENDPOINT}?page=2&size={PAGE_SIZE}", payload={"items": [{"id": 3}]})
+        mocked.get(f"{API_URL}/{ENDPOINT}?page=3&size={PAGE_SIZE}", exception=aiohttp.ServerDisconnectedError())
+        mocked.get(f"{API_URL}/{ENDPOINT}?page=3&size={PAGE_SIZE}", payload={"items": [{"id": 4}]})
+
+        result = await fetcher.fetch_all_data(ENDPOINT)
+
+    assert [item["id"] for item in result] == [1, 2, 3, 4]
+    assert fetcher._limiter.limit < 4
+
+@pytest.mark.asyncio
+async def test_iter_pages_export_raises_on_truncated_stream():
+    fetcher = APIDataFetcherAsync(api_url=API_URL, page_size=2, pagination="export")
+
+    with aioresponses() as mocked:
+        mocked.get(f"{API_URL}/export/{ENDPOINT}", body='{"id": 1}\n{"id": 2}\n{"id"')
+
+        with pytest.raises(ValueError):
+            [page_data async for page_data in fetcher.iter_pages(ENDPOINT)]
+
+@pytest.mark.asyncio
+async def test_fetch_all_data_revalidates_cached_pages(tmp_path):
+    fetcher = APIDataFetcherAsync(api_url=API_URL, page_size=PAGE_SIZE, http_cache=HTTPCache(str(tmp_path)))
+    url_page_1 = f"{API_URL}/{ENDPOINT}?page=1&size={PAGE_SIZE}"
+    url_page_2 = f"{API_URL}/{ENDPOINT}?page=2&size={PAGE_SIZE}"
+
+    with aioresponses() as mocked:
+        mocked.get(url_page_1, payload=USER_MOCK, headers={"ETag": '"page-1"'})
+        mocked.get(url_page_2, payload={"items": []})
+        first_result = await fetcher.fetch_all_data(ENDPOINT)
+
+        mocked.get(url_page_1, status=304, headers={"ETag": '"page-1"'})
+        mocked.get(url_page_2, payload={"items": []})
+        second_result = await fetcher.fetch_all_data(ENDPOINT)
+
+        conditional_request = mocked.requests[("GET", URL(url_page_1))][1]
+
+    assert second_result == first_result
+    assert conditional_request.kwargs["headers"]["If-None-Match"] == '"page-1"'
+    assert fetcher.metrics.get_counter("moovitamix_http_cache_hits_total", endpoint=ENDPOINT) == 1
@@ -0,0 +1,72 @@
+import pytest
+from storage.atomic_write import atomic_write, journaled_append, rollback_append
+
+
+def test_atomic_write_replaces_the_file(tmp_path):
+    """
+    Test that the file is replaced once the block completes, without leaving the temporary file.
+    """
+    file_path = tmp_path / "data.csv"
+    file_path.write_text("old\n")
+
+    with atomic_write(file_path) as file:
+        file.write("new\n")
+        assert file_path.read_text() == "old\n"
+
+    assert file_path.read_text() == "new\n"
+    assert [path.name for path in tmp_path.iterdir()] == ["data.csv"]
+
+
+def test_atomic_write_keeps_the_file_on_error(tmp_path):
+    """
+    Test that a failed write leaves the previous file intact and removes the temporary file.
+    """
+    file_path = tmp_path / "data.csv"
+    file_path.write_text("old\n")
+
+    with pytest.raises(RuntimeError):
+        with atomic_write(file_path) as file:
+            file.write("partial")
+            raise RuntimeError("Write error")
+
+    assert file_path.read_text() == "old\n"
+    assert [path.name for path in tmp_path.iterdir()] == ["data.csv"]
+
+
+def test_journaled_append_rolls_back_on_error(tmp_path):
+    """
+    Test that a failed append cuts the file back to its previous size, removes a file it created, and removes the journal.
+    """
+    file_path = tmp_path / "data.csv"
+    file_path.write_text("id\n1\n")
+    new_path = tmp_path / "new.csv"
+
+    with pytest.raises(RuntimeError):
+        with journaled_append(tmp_path / "data.journal", [file_path, new_path]):
+            with open(file_path, "a") as file:
+                file.write("2\n3")
+            new_path.write_text("id\n")
+            raise RuntimeError("Write error")
+
+    assert file_path.read_text() == "id\n1\n"
+    assert [path.name for path in tmp_path.iterdir()] == ["data.csv"]
+
+
+def test_rollback_append_after_a_crash(tmp_path):
+    """
+    Test that the journal left by an append interrupted by a crash cuts the file back and returns the recorded state.
+    """
+    file_path = tmp_path / "data.csv"
+    file_path.write_text("id\n1\n")
+    journal_path = tmp_path / "data.journal"
+
+    # Entering the block without leaving it, as a process killed while appending
+    interrupted = journaled_append(journal_path, [file_path], state={"rows": 1})
+    interrupted.__enter__()
+    with open(file_path, "a") as file:
+        file.write("2\n3")
+
+    assert rollback_append(journal_path) == {"rows": 1}
+    assert file_path.read_text() == "id\n1\n"
+    assert not journal_path.exists()
+    assert rollback_append(journal_path) is None
@@ -0,0 +1,97 @@
+import json
+import pytest
+import pandas as pd
+from pipeline.checkpoint_store import CheckpointStore
+from pipeline.data_category import DataCategory
+
+
+@pytest.fixture
+def checkpoint_store(tmp_path):
+    """
+    Fixture to initialize a CheckpointStore in a temporary directory.
+    """
+    return CheckpointStore(storage_dir=str(tmp_path))
+
+
+def test_new_category_has_no_watermark(checkpoint_store):
+    """
+    Test that a category never synced has no watermark and starts at the first page.
+    """
+    assert checkpoint_store.get_watermark(DataCategory.TRACKS) is None
+    assert checkpoint_store.start(DataCategory.TRACKS, None) == (1, None)
+
+
+def test_resume_after_last_committed_page(tmp_path, checkpoint_store):
+    """
+    Test that an interrupted sync resumes after its last committed page, from a new store instance.
+    """
+    baseline = pd.Timestamp("2024-10-01T12:30")
+    checkpoint_store.start(DataCategory.TRACKS, None, baseline)
+    checkpoint_store.commit_page(DataCategory.TRACKS, 4)
+
+    reopened_store = CheckpointStore(storage_dir=str(tmp_path))
+
+    assert reopened_store.start(DataCategory.TRACKS, None, pd.Timestamp("2024-10-02")) == (5, baseline)
+
+
+def test_changed_params_restart_the_sync(checkpoint_store):
+    """
+    Test that an interrupted sync is not resumed with different query parameters.
+    """
+    checkpoint_store.start(DataCategory.TRACKS, None)
+    checkpoint_store.commit_page(DataCategory.TRACKS, 4)
+
+    start_page, _ = checkpoint_store.start(DataCategory.TRACKS, {'updated_since': '2024-10-01T12:30:00'})
+
+    assert start_page == 1
+
+
+def test_complete_sets_watermark_to_start_time(tmp_path, checkpoint_store):
+    """
+    Test that completing a sync records its start time as the watermark and clears its progress.
+    """
+    before = pd.Timestamp.now()
+    checkpoint_store.start(DataCategory.USERS, None)
+    checkpoint_store.commit_page(DataCategory.USERS, 2)
+    checkpoint_store.complete(DataCategory.USERS)
+
+    watermark = checkpoint_store.get_watermark(DataCategory.USERS)
+    assert before <= watermark <= pd.Timestamp.now()
+    assert checkpoint_store.start(DataCategory.USERS, None)[0] == 1
+
+    with open(tmp_path / "checkpoints.json") as file:
+        assert "watermark" in json.load(file)[DataCategory.USERS.value]
+    assert not (tmp_path / "checkpoints.json.tmp").exists()
+
+
+def test_commit_without_sync_in_progress(checkpoint_store):
+    """
+    Test that committing a page of a category without sync in progress raises a ValueError.
+    """
+    with pytest.raises(ValueError, match="No sync in progress for tracks."):
+        checkpoint_store.commit_page(DataCategory.TRACKS, 1)
+
+
+def test_unreadable_checkpoint_file_is_ignored(tmp_path):
+    """
+    Test that a corrupted checkpoint file falls back to a full sync instead of failing.
+    """
+    (tmp_path / "checkpoints.json").write_text("{not json")
+
+    assert CheckpointStore(storage_dir=str(tmp_path)).get_watermark(DataCategory.TRACKS) is None
+
+
+def test_reset_forgets_the_category(tmp_path, checkpoint_store):
+    """
+    Test that reset drops the watermark and the sync in progress of a category only, on disk too.
+    """
+    checkpoint_store.start(DataCategory.TRACKS, None)
+    checkpoint_store.complete(DataCategory.TRACKS)
+    checkpoint_store.start(DataCategory.USERS, None)
+    checkpoint_store.commit_page(DataCategory.USERS, 3)
+
+    checkpoint_store.reset(DataCategory.TRACKS)
+
+    reloaded = CheckpointStore(str(tmp_path))
+    assert reloaded.get_watermark(DataCategory.TRACKS) is None
+    assert reloaded.start(DataCategory.USERS, None) == (4, None)
@@ -0,0 +1,65 @@
+import pandas as pd
+from pipeline.content_index import ContentHashes, ContentIndex, hash_content, select_changed_content
+from pipeline.data_category import DataCategory
+
+
+def make_tracks(names, updated_at="2024-10-01"):
+    """
+    Builds tracks with ids 1..n and the given names.
+    """
+    return pd.DataFrame({
+        "id": range(1, len(names) + 1),
+        "name": names,
+        "created_at": pd.to_datetime(["2024-09-01"] * len(names)),
+        "updated_at": pd.to_datetime([updated_at] * len(names))
+    })
+
+
+def test_hash_ignores_timestamps_and_combines_rows():
+    """
+    Test that content hashes ignore `updated_at`, and that a key spanning several rows gets one hash over all of them.
+    """
+    _, before = hash_content(make_tracks(["a", "b"]), "id")
+    _, after = hash_content(make_tracks(["a", "b"], updated_at="2024-10-05"), "id")
+    assert before.keys.tolist() == after.keys.tolist()
+    assert before.hashes.tolist() == after.hashes.tolist()
+
+    history = pd.DataFrame({"user_id": [1, 1, 2], "track_id": [10, 11, 20], "position": [0, 1, 0]})
+    row_keys, content = hash_content(history, "user_id")
+    assert len(row_keys) == 3 and len(content.keys) == 2
+    _, reordered = hash_content(history.assign(track_id=[11, 10, 20]), "user_id")
+    assert reordered.hashes.tolist() != content.hashes.tolist()
+
+
+def test_select_changed_content_skips_unchanged_keys(tmp_path):
+    """
+    Test that only new and changed keys are selected once the index is committed, also from a new instance.
+    """
+    index = ContentIndex(storage_dir=str(tmp_path))
+    changed_df, content = select_changed_content(make_tracks(["a", "b"]), "id", index.get(DataCategory.TRACKS))
+    assert len(changed_df) == 2
+    index.commit(DataCategory.TRACKS, content)
+
+    reopened = ContentIndex(storage_dir=str(tmp_path))
+    incoming = make_tracks(["a", "B", "c"], updated_at="2024-10-05")
+    changed_df, content = select_changed_content(incoming, "id", reopened.get(DataCategory.TRACKS))
+    assert changed_df["id"].tolist() == [2, 3]
+    assert len(content.keys) == 2
+
+    reopened.commit(DataCategory.TRACKS, content)
+    assert len(reopened.get(DataCategory.TRACKS).keys) == 3
+    assert select_changed_content(incoming, "id", reopened.get(DataCategory.TRACKS))[0].empty
+
+    reopened.reset(DataCategory.TRACKS)
+    assert len(ContentIndex(storage_dir=str(tmp_path)).get(DataCategory.TRACKS).keys) == 0
+
+
+def test_concat_keeps_the_first_hash_of_a_key():
+    """
+    Test that merging the hashes of several chunks keeps the first version of a key.
+    """
+    first = hash_content(make_tracks(["a"]), "id")[1]
+    second = hash_content(make_tracks(["b", "c"]), "id")[1]
+    merged = ContentHashes.concat([first, second])
+    assert len(merged.keys) == 2
+    assert first.hashes[0] in merged.hashes.tolist()
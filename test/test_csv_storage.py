@@ -85,3 +85,325 @@ def test_load_existing_data_no_file(setup_csv_storage):
     data = storage.load_existing_data("non_existent_file.csv")
 
     assert data.empty
+
+
+def test_stream_writer_appends_and_updates(setup_csv_storage):
+    """
+    Test that the CSV stream writer appends new records per chunk, keeps the latest chunk of a repeated key, and applies updates on close.
+    """
+    storage, storage_dir = setup_csv_storage
+
+    writer = storage.open_writer(DataCategory.TRACKS, "id")
+    writer.write(pd.DataFrame({
+        "id": [1, 2],
+        "name": ["Track1", "Track2"],
+        "created_at": pd.to_datetime(["2024-09-28", "2024-09-29"]),
+        "updated_at": pd.to_datetime(["2024-09-28", "2024-09-29"])
+    }))
+    writer.write(pd.DataFrame({
+        "id": [2, 3],
+        "name": ["Duplicate", "Track3"],
+        "created_at": pd.to_datetime(["2024-09-29", "2024-09-30"]),
+        "updated_at": pd.to_datetime(["2024-09-29", "2024-09-30"])
+    }))
+    writer.close()
+
+    saved = pd.read_csv(storage_dir / "tracks.csv").sort_values("id")
+    assert saved["id"].tolist() == [1, 2, 3]
+    assert saved["name"].tolist() == ["Track1", "Duplicate", "Track3"]
+    assert (writer.result.inserted, writer.result.updated) == (3, 0)
+
+    writer = storage.open_writer(DataCategory.TRACKS, "id")
+    writer.max_charged_at = pd.Timestamp("2024-10-01")
+    writer.write(pd.DataFrame({
+        "id": [2, 4],
+        "name": ["Track2 v2", "Track4"],
+        "created_at": pd.to_datetime(["2024-09-29", "2024-10-02"]),
+        "updated_at": pd.to_datetime(["2024-10-02", "2024-10-02"])
+    }))
+    writer.close()
+
+    saved = pd.read_csv(storage_dir / "tracks.csv").sort_values("id")
+    assert saved["id"].tolist() == [1, 2, 3, 4]
+    assert saved.loc[saved["id"] == 2, "name"].item() == "Track2 v2"
+    assert "created_at" not in saved.columns
+
+
+def test_save_data_updates_and_inserts(setup_csv_storage):
+    """
+    Test that save_data replaces updated records and appends new ones to an existing file.
+    """
+    storage, storage_dir = setup_csv_storage
+    file_path = storage_dir / f"{DataCategory.TRACKS.value}.csv"
+
+    pd.DataFrame({
+        "id": [1, 2],
+        "name": ["Track1", "Track2"],
+        "charged_at": ["2024-10-01T00:00", "2024-10-01T00:00"]
+    }).to_csv(file_path, index=False)
+
+    result = storage.save_data(DataCategory.TRACKS, pd.DataFrame({
+        "id": [1, 2, 3],
+        "name": ["Track1", "Track2 v2", "Track3"],
+        "created_at": pd.to_datetime(["2024-09-01", "2024-09-01", "2024-10-02"]),
+        "updated_at": pd.to_datetime(["2024-09-01", "2024-10-02", "2024-10-02"])
+    }), "id")
+
+    saved = pd.read_csv(file_path).sort_values("id")
+    assert saved["id"].tolist() == [1, 2, 3]
+    assert saved["name"].tolist() == ["Track1", "Track2 v2", "Track3"]
+    assert saved["charged_at"].notna().all()
+    assert saved.loc[saved["id"] == 1, "charged_at"].item() == "2024-10-01T00:00"
+    assert (result.inserted, result.updated) == (1, 1)
+
+
+def test_append_only_writes_deltas_and_compacts(tmp_path):
+    """
+    Test that append-only saves write delta segments, that reads merge them, and that compact folds them in.
+    """
+    storage = CSVStorage(storage_dir=str(tmp_path), append_only=True)
+
+    storage.save_data(DataCategory.TRACKS, pd.DataFrame({
+        "id": [1, 2],
+        "name": ["Track1", "Track2"],
+        "created_at": pd.to_datetime(["2024-09-28", "2024-09-29"]),
+        "updated_at": pd.to_datetime(["2024-09-28", "2024-09-29"])
+    }), "id")
+
+    future = (pd.Timestamp.now() + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    storage.save_data(DataCategory.TRACKS, pd.DataFrame({
+        "id": [1, 2, 3],
+        "name": ["Track1", "Track2 v2", "Track3"],
+        "created_at": pd.to_datetime(["2024-09-28", "2024-09-29", future]),
+        "updated_at": pd.to_datetime(["2024-09-28", future, future])
+    }), "id")
+
+    deltas = list((tmp_path / "tracks.deltas").glob("delta-*.csv"))
+    assert len(deltas) == 2
+    assert not (tmp_path / "tracks.csv").exists()
+    assert len(pd.read_csv(sorted(deltas)[-1])) == 2
+
+    merged = storage.load_data(DataCategory.TRACKS).sort_values("id")
+    assert merged["name"].tolist() == ["Track1", "Track2 v2", "Track3"]
+
+    storage.compact(DataCategory.TRACKS)
+
+    assert not list((tmp_path / "tracks.deltas").glob("delta-*.csv"))
+    compacted = pd.read_csv(tmp_path / "tracks.csv").sort_values("id")
+    assert compacted["name"].tolist() == ["Track1", "Track2 v2", "Track3"]
+    assert storage.load_data(DataCategory.TRACKS).sort_values("id")["name"].tolist() == ["Track1", "Track2 v2", "Track3"]
+
+
+def test_append_only_automatic_compaction(tmp_path):
+    """
+    Test that reaching max_deltas segments triggers a compaction.
+    """
+    storage = CSVStorage(storage_dir=str(tmp_path), append_only=True, max_deltas=1)
+
+    storage.save_data(DataCategory.USERS, pd.DataFrame({
+        "id": [1],
+        "first_name": ["Michelle"],
+        "created_at": pd.to_datetime(["2024-09-28"]),
+        "updated_at": pd.to_datetime(["2024-09-28"])
+    }), "id")
+
+    assert (tmp_path / "users.csv").exists()
+    assert not list((tmp_path / "users.deltas").glob("delta-*.csv"))
+
+
+def test_stream_writer_replaces_all_rows_of_a_listen_history(setup_csv_storage):
+    """
+    Test that an updated listen history replaces all the rows of its user, including when it got shorter.
+    """
+    storage, storage_dir = setup_csv_storage
+    file_path = storage_dir / f"{DataCategory.LISTEN_HISTORY.value}.csv"
+    pd.DataFrame({
+        "user_id": [1, 1, 2],
+        "track_id": [10, 11, 20],
+        "position": [0, 1, 0],
+        "charged_at": ["2024-10-01T00:00"] * 3
+    }).to_csv(file_path, index=False)
+
+    writer = storage.open_writer(DataCategory.LISTEN_HISTORY, "user_id")
+    writer.write(pd.DataFrame({
+        "user_id": [1],
+        "track_id": [12],
+        "position": [0],
+        "created_at": pd.to_datetime(["2024-09-01"]),
+        "updated_at": pd.to_datetime(["2024-10-02"])
+    }))
+    writer.close()
+
+    saved = pd.read_csv(file_path).sort_values(["user_id", "position"])
+    assert saved[["user_id", "track_id", "position"]].values.tolist() == [[1, 12, 0], [2, 20, 0]]
+
+
+def test_init_migrates_stringified_listen_history(tmp_path):
+    """
+    Test that a listen history file holding stringified lists of tracks is rewritten with one row per track.
+    """
+    storage_dir = tmp_path / "test_data"
+    storage_dir.mkdir()
+    file_path = storage_dir / f"{DataCategory.LISTEN_HISTORY.value}.csv"
+    pd.DataFrame({
+        "user_id": [1, 2],
+        "items": [str([10, 11]), str([20])],
+        "charged_at": ["2024-10-01T00:00"] * 2
+    }).to_csv(file_path, index=False)
+
+    storage = CSVStorage(storage_dir=str(storage_dir))
+
+    saved = storage.load_data(DataCategory.LISTEN_HISTORY)
+    assert list(saved.columns) == ["user_id", "track_id", "position", "charged_at"]
+    assert saved[["user_id", "track_id", "position"]].values.tolist() == [[1, 10, 0], [1, 11, 1], [2, 20, 0]]
+
+
+def make_history(user_ids, created_at, updated_at):
+    """
+    Builds a listen history with two tracks per user, in the long layout.
+    """
+    return pd.DataFrame({
+        "user_id": [user_id for user_id in user_ids for _ in range(2)],
+        "track_id": [user_id * 10 + position for user_id in user_ids for position in range(2)],
+        "position": [0, 1] * len(user_ids),
+        "created_at": pd.to_datetime([created_at] * 2 * len(user_ids)),
+        "updated_at": pd.to_datetime([updated_at] * 2 * len(user_ids))
+    })
+
+
+def test_bucketed_listen_history_only_rewrites_changed_buckets(tmp_path):
+    """
+    Test that a bucketed listen history rewrites only the bucket of an updated user and reads a user from one bucket.
+    """
+    storage = CSVStorage(storage_dir=str(tmp_path), num_buckets=4)
+    result = storage.save_data(DataCategory.LISTEN_HISTORY, make_history(range(1, 21), "2024-09-01", "2024-09-01"), "user_id")
+    assert result.inserted == 40
+
+    buckets_dir = tmp_path / DataCategory.LISTEN_HISTORY.value
+    assert not (tmp_path / f"{DataCategory.LISTEN_HISTORY.value}.csv").exists()
+    assert (buckets_dir / "manifest.json").exists()
+    bucket_files = sorted(buckets_dir.glob("bucket-*.csv"))
+    assert len(bucket_files) == 4
+    mtimes = {path.name: path.stat().st_mtime_ns for path in bucket_files}
+
+    updates = make_history([7], "2024-09-01", "2099-01-01").iloc[:1].assign(track_id=99)
+    result = storage.save_data(DataCategory.LISTEN_HISTORY, updates, "user_id")
+    assert result.updated == 1
+
+    rewritten = [path.name for path in bucket_files if path.stat().st_mtime_ns != mtimes[path.name]]
+    assert len(rewritten) == 1
+
+    with patch("storage.csv_buckets.pd.read_csv", wraps=pd.read_csv) as read_csv:
+        user = storage.load_data(DataCategory.LISTEN_HISTORY, keys=[7])
+    assert read_csv.call_count == 1
+    assert read_csv.call_args.args[0].name == rewritten[0]
+    assert user[["user_id", "track_id", "position"]].values.tolist() == [[7, 99, 0]]
+
+    saved = storage.load_data(DataCategory.LISTEN_HISTORY)
+    assert len(saved) == 39
+    assert storage.read_watermark(DataCategory.LISTEN_HISTORY) == pd.to_datetime(saved["charged_at"]).max()
+
+
+def test_init_splits_listen_history_into_buckets(tmp_path):
+    """
+    Test that enabling buckets splits an existing listen history file, and that the manifest keeps the layout.
+    """
+    CSVStorage(storage_dir=str(tmp_path)).save_data(
+        DataCategory.LISTEN_HISTORY, make_history([1, 2, 3], "2024-09-01", "2024-09-01"), "user_id"
+    )
+
+    storage = CSVStorage(storage_dir=str(tmp_path), num_buckets=2)
+    assert not (tmp_path / f"{DataCategory.LISTEN_HISTORY.value}.csv").exists()
+    saved = storage.load_data(DataCategory.LISTEN_HISTORY).sort_values(["user_id", "position"])
+    assert saved["user_id"].tolist() == [1, 1, 2, 2, 3, 3]
+
+    # The layout on disk wins over the settings of later instances
+    assert len(CSVStorage(storage_dir=str(tmp_path)).load_data(DataCategory.LISTEN_HISTORY)) == 6
+
+    with pytest.raises(ValueError):
+        CSVStorage(storage_dir=str(tmp_path), append_only=True, num_buckets=2)
+
+
+def test_bucket_writer_commits_nothing_before_close(tmp_path):
+    """
+    Test that a bucketed listen history is left untouched by a writer that is never closed, e.g. by a failed run.
+    """
+    storage = CSVStorage(storage_dir=str(tmp_path), num_buckets=2)
+    storage.save_data(DataCategory.LISTEN_HISTORY, make_history([1, 2], "2024-09-01", "2024-09-01"), "user_id")
+    manifest = (tmp_path / DataCategory.LISTEN_HISTORY.value / "manifest.json").read_text()
+
+    chunks = [make_history([3], "2099-01-01", "2099-01-01"), make_history([1], "2024-09-01", "2099-01-01")]
+    failed_writer = storage.open_writer(DataCategory.LISTEN_HISTORY, "user_id")
+    for chunk in chunks:
+        failed_writer.write(chunk)
+
+    assert (tmp_path / DataCategory.LISTEN_HISTORY.value / "manifest.json").read_text() == manifest
+    assert sorted(storage.load_data(DataCategory.LISTEN_HISTORY)["user_id"].unique().tolist()) == [1, 2]
+
+    writer = storage.open_writer(DataCategory.LISTEN_HISTORY, "user_id")
+    for chunk in chunks:
+        writer.write(chunk)
+    writer.close()
+
+    assert (writer.result.inserted, writer.result.updated) == (2, 2)
+    assert sorted(storage.load_data(DataCategory.LISTEN_HISTORY)["user_id"].unique().tolist()) == [1, 2, 3]
+    assert not (tmp_path / f"{DataCategory.LISTEN_HISTORY.value}.csv.staging").exists()
+
+
+def test_interrupted_append_is_rolled_back_on_open(setup_csv_storage):
+    """
+    Test that rows partially appended by a stream writer killed while closing are dropped when the storage is opened again.
+    """
+    storage, storage_dir = setup_csv_storage
+    storage.save_data(DataCategory.TRACKS, pd.DataFrame({
+        "id": [1, 2],
+        "name": ["Track1", "Track2"],
+        "created_at": pd.to_datetime(["2024-09-28"] * 2),
+        "updated_at": pd.to_datetime(["2024-09-28"] * 2)
+    }), "id")
+    saved = (storage_dir / "tracks.csv").read_text()
+
+    writer = storage.open_writer(DataCategory.TRACKS, "id")
+    writer.write(pd.DataFrame({
+        "id": [3],
+        "name": ["Track3"],
+        "created_at": pd.to_datetime(["2099-01-01"]),
+        "updated_at": pd.to_datetime(["2099-01-01"])
+    }))
+
+    def copy_partially(file, header):
+        file.write("3,Tra")
+        raise KeyboardInterrupt
+
+    # The rollback of a failing block is disabled, as when the process is killed
+    with patch.object(writer, "_copy_staged", side_effect=copy_partially), patch("storage.atomic_write.rollback_append"):
+        with pytest.raises(KeyboardInterrupt):
+            writer.close()
+    assert (storage_dir / "tracks.csv").read_text() != saved
+
+    reopened = CSVStorage(storage_dir=str(storage_dir))
+    assert (storage_dir / "tracks.csv").read_text() == saved
+    assert not (storage_dir / "tracks.csv.journal").exists()
+    assert reopened.load_data(DataCategory.TRACKS)["id"].tolist() == [1, 2]
+
+
+def test_interrupted_bucket_append_is_rolled_back_on_open(tmp_path):
+    """
+    Test that buckets appended to by a run killed before the manifest is written are cut back when the storage is opened again.
+    """
+    storage = CSVStorage(storage_dir=str(tmp_path), num_buckets=2)
+    storage.save_data(DataCategory.LISTEN_HISTORY, make_history([1, 2], "2024-09-01", "2024-09-01"), "user_id")
+    buckets_dir = tmp_path / DataCategory.LISTEN_HISTORY.value
+    saved = {path.name: path.read_text() for path in buckets_dir.iterdir()}
+
+    writer = storage.open_writer(DataCategory.LISTEN_HISTORY, "user_id")
+    writer.write(make_history([3, 4, 5], "2099-01-01", "2099-01-01"))
+    with patch("storage.csv_buckets.CSVBuckets._write_manifest", side_effect=KeyboardInterrupt), \
+            patch("storage.atomic_write.rollback_append"):
+        with pytest.raises(KeyboardInterrupt):
+            writer.close()
+    assert {path.name: path.read_text() for path in buckets_dir.iterdir()} != saved
+
+    reopened = CSVStorage(storage_dir=str(tmp_path))
+    assert {path.name: path.read_text() for path in buckets_dir.iterdir()} == saved
+    assert sorted(reopened.load_data(DataCategory.LISTEN_HISTORY)["user_id"].unique().tolist()) == [1, 2]
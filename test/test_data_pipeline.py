@@ -1,9 +1,15 @@
+import asyncio
+import threading
+import time
 from unittest.mock import AsyncMock, MagicMock, patch
 import pytest
 import pytest_asyncio
 import pandas as pd
+from pipeline.checkpoint_store import CheckpointStore
 from pipeline.data_pipeline import DataPipeline
 from pipeline.data_category import DataCategory
+from pipeline.metrics import Metrics
+from storage.storage import SaveResult
 
 from pandas.testing import assert_frame_equal
 
@@ -60,8 +66,8 @@ async def test_fetch_and_save_success(mock_clean_data, setup_pipeline):
 
     await pipeline.fetch_and_save(DataCategory.TRACKS, 'id')
 
-    mock_fetcher.fetch_all_data.assert_called_once_with(DataCategory.TRACKS.value)
-    mock_clean_data.assert_called_once_with(MOCK_TRACKS, 'id')
+    mock_fetcher.fetch_all_data.assert_called_once_with(DataCategory.TRACKS.value, params=None)
+    mock_clean_data.assert_called_once_with(MOCK_TRACKS, 'id', DataCategory.TRACKS)
     mock_storage.save_data.assert_called_once_with(DataCategory.TRACKS, mock_clean_data.return_value, 'id')
 
 
@@ -88,7 +94,7 @@ async def test_fetch_and_save_empty_data(setup_pipeline):
 
     await pipeline.fetch_and_save(DataCategory.TRACKS, 'id')
 
-    mock_fetcher.fetch_all_data.assert_called_once_with(DataCategory.TRACKS.value)
+    mock_fetcher.fetch_all_data.assert_called_once_with(DataCategory.TRACKS.value, params=None)
     
     mock_storage.save_data.assert_not_called()
 
@@ -116,8 +122,8 @@ async def test_run_partial_failure(mock_clean_data, setup_pipeline):
 
     assert mock_fetcher.fetch_all_data.call_count == 3
 
-    mock_clean_data.assert_any_call(MOCK_TRACKS, 'id')
-    mock_clean_data.assert_any_call(LISTEN_HISTORY_MOCK, 'user_id')
+    mock_clean_data.assert_any_call(MOCK_TRACKS, 'id', DataCategory.TRACKS)
+    mock_clean_data.assert_any_call(LISTEN_HISTORY_MOCK, 'user_id', DataCategory.LISTEN_HISTORY)
 
     assert mock_storage.save_data.call_count == 2
 
@@ -145,7 +151,7 @@ async def test_clean_data_with_missing_fields(mock_clean_data, setup_pipeline):
 
     await pipeline.fetch_and_save(DataCategory.TRACKS, 'id')
 
-    mock_clean_data.assert_called_once_with(invalid_data, 'id')
+    mock_clean_data.assert_called_once_with(invalid_data, 'id', DataCategory.TRACKS)
     mock_storage.save_data.assert_called_once_with(DataCategory.TRACKS, cleaned_data_df, 'id')
 
 @pytest.mark.asyncio
@@ -172,5 +178,438 @@ async def test_clean_data_with_duplicates(mock_clean_data, setup_pipeline):
 
     await pipeline.fetch_and_save(DataCategory.TRACKS, 'id')
 
-    mock_clean_data.assert_called_once_with(invalid_data, 'id')
-    mock_storage.save_data.assert_called_once_with(DataCategory.TRACKS, cleaned_data_df, 'id')
\ No newline at end of file
+    mock_clean_data.assert_called_once_with(invalid_data, 'id', DataCategory.TRACKS)
+    mock_storage.save_data.assert_called_once_with(DataCategory.TRACKS, cleaned_data_df, 'id')
+
+@pytest.mark.asyncio
+@patch.object(DataPipeline, 'clean_data')
+async def test_run_parallel_isolates_failures(mock_clean_data, setup_pipeline):
+    """
+    Test that a failing category does not prevent the other categories from being saved in parallel mode.
+    """
+    pipeline, mock_storage, mock_fetcher = setup_pipeline
+
+    async def fetch_all_data(endpoint, params=None):
+        if endpoint == DataCategory.USERS.value:
+            raise Exception('Fetch error')
+        return MOCK_TRACKS if endpoint == DataCategory.TRACKS.value else LISTEN_HISTORY_MOCK
+
+    mock_fetcher.fetch_all_data.side_effect = fetch_all_data
+    mock_clean_data.side_effect = lambda data, key_field, category: pd.DataFrame(data)
+
+    with pytest.raises(RuntimeError, match=f"Ingestion failed for: {DataCategory.USERS.value}"):
+        await pipeline.run(parallel=True)
+
+    assert mock_fetcher.fetch_all_data.call_count == 3
+    saved_categories = {call.args[0] for call in mock_storage.save_data.call_args_list}
+    assert saved_categories == {DataCategory.TRACKS, DataCategory.LISTEN_HISTORY}
+
+
+@pytest.mark.asyncio
+async def test_stream_and_save_writes_chunks(setup_pipeline):
+    """
+    Test that stream_and_save cleans and writes the fetched pages in bounded chunks.
+    """
+    pipeline, mock_storage, mock_fetcher = setup_pipeline
+    pipeline.chunk_size = 2
+
+    async def iter_pages(endpoint, params=None, start_page=1):
+        yield [{"id": 1, "name": "Track1"}, {"id": 2, "name": "Track2"}]
+        yield [{"id": 3, "name": "Track3"}]
+
+    mock_fetcher.iter_pages = iter_pages
+    writer = mock_storage.open_writer.return_value
+
+    await pipeline.stream_and_save(DataCategory.TRACKS, 'id')
+
+    mock_storage.open_writer.assert_called_once_with(DataCategory.TRACKS, 'id')
+    written_ids = [call.args[0]['id'].tolist() for call in writer.write.call_args_list]
+    assert written_ids == [[1, 2], [3]]
+    writer.close.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_stream_and_save_does_not_block_the_event_loop(setup_pipeline, tmp_path):
+    """
+    Test that opening the writer and reading the checkpoints, which read files, run outside the event loop thread.
+    """
+    pipeline, mock_storage, mock_fetcher = setup_pipeline
+    pipeline.incremental = True
+    pipeline.checkpoints = CheckpointStore(str(tmp_path))
+    mock_storage.read_watermark.return_value = pd.Timestamp("2024-10-01T12:30")
+    writer = mock_storage.open_writer.return_value
+    writer.max_charged_at = None
+    loop_thread = threading.get_ident()
+    threads = {}
+
+    def record_thread(name, result):
+        def call(*args):
+            threads[name] = threading.get_ident()
+            return result
+        return call
+
+    mock_storage.open_writer.side_effect = record_thread("open_writer", writer)
+    pipeline.checkpoints.get_watermark = record_thread("get_watermark", None)
+
+    async def iter_pages(endpoint, params=None, start_page=1):
+        yield [{"id": 1, "name": "Track1"}]
+
+    mock_fetcher.iter_pages = iter_pages
+
+    await pipeline.stream_and_save(DataCategory.TRACKS, 'id')
+
+    assert set(threads) == {"open_writer", "get_watermark"}
+    assert loop_thread not in threads.values()
+
+@pytest.mark.asyncio
+async def test_stream_and_save_fetch_failure(setup_pipeline):
+    """
+    Test that a fetch error during streaming is propagated and pending writes are not committed.
+    """
+    pipeline, mock_storage, mock_fetcher = setup_pipeline
+
+    async def iter_pages(endpoint, params=None, start_page=1):
+        yield [{"id": 1, "name": "Track1"}]
+        raise Exception('Fetch error')
+
+    mock_fetcher.iter_pages = iter_pages
+
+    with pytest.raises(Exception, match='Fetch error'):
+        await pipeline.stream_and_save(DataCategory.TRACKS, 'id')
+
+    mock_storage.open_writer.return_value.close.assert_not_called()
+
+
+@pytest.mark.asyncio
+@patch.object(DataPipeline, 'clean_data')
+async def test_fetch_and_save_incremental_uses_watermark(mock_clean_data, setup_pipeline):
+    """
+    Test that an incremental pipeline only requests the records changed since the storage watermark.
+    """
+    pipeline, mock_storage, mock_fetcher = setup_pipeline
+    pipeline.incremental = True
+    mock_storage.read_watermark.return_value = pd.Timestamp("2024-10-01T12:30")
+    mock_fetcher.fetch_all_data.return_value = MOCK_TRACKS
+    mock_clean_data.return_value = pd.DataFrame(MOCK_TRACKS)
+
+    await pipeline.fetch_and_save(DataCategory.TRACKS, 'id')
+
+    mock_storage.read_watermark.assert_called_once_with(DataCategory.TRACKS)
+    mock_fetcher.fetch_all_data.assert_called_once_with(
+        DataCategory.TRACKS.value,
+        params={'updated_since': '2024-10-01T12:30:00', 'created_since': '2024-10-01T12:30:00'}
+    )
+
+
+@pytest.mark.asyncio
+async def test_stream_and_save_resumes_from_checkpoint(setup_pipeline, tmp_path):
+    """
+    Test that an interrupted streamed sync resumes after the last persisted page, with the writer baseline of the first attempt.
+    """
+    pipeline, mock_storage, mock_fetcher = setup_pipeline
+    pipeline.chunk_size = 1
+    pipeline.checkpoints = CheckpointStore(str(tmp_path))
+    writer = mock_storage.open_writer.return_value
+    writer.durable_chunks = True
+    writer.max_charged_at = None
+    requested_pages = []
+
+    async def failing_iter_pages(endpoint, params=None, start_page=1):
+        requested_pages.append(start_page)
+        yield [{"id": 1, "name": "Track1"}]
+        yield [{"id": 2, "name": "Track2"}]
+        raise Exception('Fetch error')
+
+    mock_fetcher.iter_pages = failing_iter_pages
+    with pytest.raises(Exception, match='Fetch error'):
+        await pipeline.stream_and_save(DataCategory.TRACKS, 'id')
+
+    async def iter_pages(endpoint, params=None, start_page=1):
+        requested_pages.append(start_page)
+        yield [{"id": 3, "name": "Track3"}]
+
+    mock_fetcher.iter_pages = iter_pages
+    # The first attempt raised the storage watermark, the resumed sync must not compare against it
+    writer.max_charged_at = pd.Timestamp("2024-10-01T12:30")
+    await pipeline.stream_and_save(DataCategory.TRACKS, 'id')
+
+    assert requested_pages == [1, 3]
+    assert writer.max_charged_at is None
+    assert pipeline.checkpoints.get_watermark(DataCategory.TRACKS) is not None
+
+
+@pytest.mark.asyncio
+@patch.object(DataPipeline, 'clean_data')
+async def test_fetch_and_save_incremental_uses_checkpoint_watermark(mock_clean_data, setup_pipeline, tmp_path):
+    """
+    Test that the watermark of a complete sync is taken from the checkpoint store rather than the storage.
+    """
+    pipeline, mock_storage, mock_fetcher = setup_pipeline
+    pipeline.incremental = True
+    pipeline.checkpoints = CheckpointStore(str(tmp_path))
+    mock_storage.read_watermark.return_value = None
+    mock_fetcher.fetch_all_data.return_value = MOCK_TRACKS
+    mock_clean_data.return_value = pd.DataFrame(MOCK_TRACKS)
+
+    await pipeline.fetch_and_save(DataCategory.TRACKS, 'id')
+    watermark = pipeline.checkpoints.get_watermark(DataCategory.TRACKS)
+    mock_storage.read_watermark.return_value = watermark + pd.Timedelta(minutes=5)
+
+    await pipeline.fetch_and_save(DataCategory.TRACKS, 'id')
+
+    since = watermark.isoformat()
+    mock_fetcher.fetch_all_data.assert_called_with(
+        DataCategory.TRACKS.value,
+        params={'updated_since': since, 'created_since': since}
+    )
+
+
+@pytest.mark.asyncio
+@patch.object(DataPipeline, 'clean_data')
+async def test_fetch_and_save_ignores_checkpoint_without_stored_data(mock_clean_data, setup_pipeline, tmp_path):
+    """
+    Test that a checkpoint is reset and the category loaded in full when the storage holds no data for it,
+    e.g. after switching backends or deleting the dataset.
+    """
+    pipeline, mock_storage, mock_fetcher = setup_pipeline
+    pipeline.incremental = True
+    pipeline.checkpoints = CheckpointStore(str(tmp_path))
+    mock_fetcher.fetch_all_data.return_value = MOCK_TRACKS
+    mock_clean_data.return_value = pd.DataFrame(MOCK_TRACKS)
+    pipeline.checkpoints.start(DataCategory.TRACKS, None)
+    pipeline.checkpoints.complete(DataCategory.TRACKS)
+    mock_storage.read_watermark.return_value = None
+
+    await pipeline.fetch_and_save(DataCategory.TRACKS, 'id')
+
+    mock_fetcher.fetch_all_data.assert_called_once_with(DataCategory.TRACKS.value, params=None)
+    # The full load completed, its start time is the new watermark
+    assert CheckpointStore(str(tmp_path)).get_watermark(DataCategory.TRACKS) is not None
+
+@pytest.mark.asyncio
+async def test_fetch_and_save_records_metrics(setup_pipeline):
+    """
+    Test that fetch_and_save records the duration of each stage and the rows going through it.
+    """
+    pipeline, mock_storage, mock_fetcher = setup_pipeline
+    mock_fetcher.fetch_all_data.return_value = [{"id": 1, "name": "Track1"}, {"id": 1, "name": "Track1"}]
+    mock_storage.save_data.return_value = SaveResult(inserted=1)
+
+    await pipeline.fetch_and_save(DataCategory.TRACKS, 'id')
+
+    labels = {"category": DataCategory.TRACKS.value}
+    assert pipeline.metrics.get_counter("moovitamix_rows_total", stage="fetch", **labels) == 2
+    assert pipeline.metrics.get_counter("moovitamix_rows_total", stage="clean", **labels) == 1
+    assert pipeline.metrics.get_counter("moovitamix_rows_total", stage="inserted", **labels) == 1
+    assert pipeline.metrics.get_counter("moovitamix_rows_total", stage="updated", **labels) == 0
+    for stage in ("fetch", "clean", "save"):
+        assert pipeline.metrics.get_histogram("moovitamix_stage_duration_seconds", stage=stage, **labels).count == 1
+
+
+@pytest.mark.asyncio
+async def test_run_exports_metrics(setup_pipeline):
+    """
+    Test that the metrics are exported at the end of a run, even when it fails, before the error is raised.
+    """
+    pipeline, mock_storage, mock_fetcher = setup_pipeline
+    sink = MagicMock()
+    pipeline.metrics = Metrics([sink])
+    mock_fetcher.fetch_all_data.side_effect = Exception('Fetch error')
+
+    with pytest.raises(Exception, match='Fetch error'):
+        await pipeline.run()
+
+    sink.export.assert_called_once_with(pipeline.metrics)
+    assert pipeline.metrics.get_histogram("moovitamix_run_duration_seconds").count == 1
+
+
+def test_clean_data_with_category_uses_typed_schema():
+    """
+    Test that clean_data builds typed columns when the category is given, and still removes duplicates.
+    """
+    pipeline = DataPipeline(storage=MagicMock(), fetcher=AsyncMock())
+    data = [
+        {"id": 1, "name": "Track1", "genres": "Rock"},
+        {"id": 1, "name": "Track1", "genres": "Rock"},
+        {"id": 2, "name": None, "genres": "Pop"},
+    ]
+
+    cleaned_df = pipeline.clean_data(data, 'id', DataCategory.TRACKS)
+
+    assert cleaned_df["id"].tolist() == [1]
+    assert cleaned_df["id"].dtype == "int32"
+    assert isinstance(cleaned_df["genres"].dtype, pd.CategoricalDtype)
+
+
+@pytest.mark.parametrize("supports_list_columns", [False, True])
+def test_clean_data_explodes_listen_history(supports_list_columns):
+    """
+    Test that listen histories are exploded to one row per track, unless the storage keeps list columns.
+    """
+    storage = MagicMock(supports_list_columns=supports_list_columns)
+    pipeline = DataPipeline(storage=storage, fetcher=AsyncMock())
+    data = [
+        {"user_id": 1, "items": [10, 11], "created_at": "2024-09-01T10:00:00", "updated_at": "2024-10-01T10:00:00"},
+        {"user_id": 1, "items": [10, 11], "created_at": "2024-09-01T10:00:00", "updated_at": "2024-10-01T10:00:00"},
+    ]
+
+    cleaned_df = pipeline.clean_data(data, 'user_id', DataCategory.LISTEN_HISTORY)
+
+    if supports_list_columns:
+        assert cleaned_df["items"].tolist() == [[10, 11]]
+    else:
+        assert cleaned_df[["user_id", "track_id", "position"]].values.tolist() == [[1, 10, 0], [1, 11, 1]]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["csv", "parquet"])
+async def test_fetch_and_save_in_shards(backend, tmp_path):
+    """
+    Test that with several workers, the shards are cleaned in worker processes and every record is saved once.
+    """
+    pytest.importorskip("pyarrow")
+    from storage.csv_storage import CSVStorage
+    from storage.parquet_storage import ParquetStorage
+
+    storage = CSVStorage(str(tmp_path)) if backend == "csv" else ParquetStorage(str(tmp_path))
+    fetcher = AsyncMock()
+    fetcher.fetch_all_data.return_value = [
+        {"id": key, "name": f"Track{key}", "created_at": "2024-09-01T10:00:00", "updated_at": "2024-10-01T10:00:00"}
+        for key in [*range(100), *range(10)]
+    ]
+    pipeline = DataPipeline(storage=storage, fetcher=fetcher, workers=2)
+
+    try:
+        await pipeline.fetch_and_save(DataCategory.TRACKS, 'id')
+    finally:
+        pipeline._executor.shutdown()
+
+    loaded = storage.load_data(DataCategory.TRACKS, unique_key='id')
+    assert sorted(loaded['id'].tolist()) == list(range(100))
+    assert pipeline.metrics.get_counter("moovitamix_rows_total", category="tracks", stage="clean") == 100
+    assert pipeline.metrics.get_counter("moovitamix_rows_total", category="tracks", stage="inserted") == 100
+    assert pipeline.metrics.get_histogram("moovitamix_stage_duration_seconds", category="tracks", stage="clean").count == 2
+
+
+@pytest.mark.asyncio
+async def test_fetch_and_save_skips_unchanged_content(tmp_path):
+    """
+    Test that with a content index, records whose `updated_at` moved without any other change are not saved again.
+    """
+    from pipeline.content_index import ContentIndex
+    from storage.csv_storage import CSVStorage
+
+    storage = CSVStorage(str(tmp_path))
+    fetcher = AsyncMock()
+    pipeline = DataPipeline(storage=storage, fetcher=fetcher, content_index=ContentIndex(str(tmp_path)))
+
+    fetcher.fetch_all_data.return_value = [
+        {"id": key, "name": f"Track{key}", "created_at": "2024-09-01T10:00:00", "updated_at": "2024-09-01T10:00:00"}
+        for key in range(3)
+    ]
+    await pipeline.fetch_and_save(DataCategory.TRACKS, 'id')
+
+    fetcher.fetch_all_data.return_value = [
+        {"id": key, "name": "Renamed" if key == 1 else f"Track{key}", "created_at": "2024-09-01T10:00:00", "updated_at": "2099-01-01T10:00:00"}
+        for key in range(3)
+    ]
+    with patch.object(storage, "save_data", wraps=storage.save_data) as save_data:
+        await pipeline.fetch_and_save(DataCategory.TRACKS, 'id')
+
+    assert save_data.call_args.args[1]["id"].tolist() == [1]
+    assert pipeline.metrics.get_counter("moovitamix_rows_total", category="tracks", stage="unchanged") == 2
+    loaded = storage.load_data(DataCategory.TRACKS).sort_values("id")
+    assert loaded["name"].tolist() == ["Track0", "Renamed", "Track2"]
+
+
+@pytest.mark.asyncio
+@patch.object(DataPipeline, 'clean_data')
+async def test_run_with_write_behind_fetches_while_saving(mock_clean_data, setup_pipeline):
+    """
+    Test that with a write-behind queue, the next category is fetched while the previous one is saved,
+    and that every save is done when run returns.
+    """
+    from pipeline.write_behind import WriteBehindQueue
+
+    _, mock_storage, mock_fetcher = setup_pipeline
+    pipeline = DataPipeline(storage=mock_storage, fetcher=mock_fetcher, write_behind=WriteBehindQueue())
+    events = []
+
+    async def fetch_all_data(category, params=None):
+        events.append(f"fetch {category}")
+        await asyncio.sleep(0.05)
+        return MOCK_TRACKS
+
+    def save_data(category, data_df, key_field):
+        events.append(f"save {category.value}")
+        time.sleep(0.2)
+        events.append(f"saved {category.value}")
+
+    mock_fetcher.fetch_all_data.side_effect = fetch_all_data
+    mock_storage.save_data.side_effect = save_data
+    mock_clean_data.return_value = pd.DataFrame(MOCK_TRACKS)
+
+    await pipeline.run(parallel=False)
+
+    assert mock_storage.save_data.call_count == len(DataCategory)
+    assert events.index(f"fetch {DataCategory.USERS.value}") < events.index(f"saved {DataCategory.TRACKS.value}")
+    assert events[-1] == f"saved {list(DataCategory)[-1].value}"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("parallel", [False, True])
+async def test_run_only_selected_categories(parallel, setup_pipeline):
+    """
+    Test that run only ingests the given categories.
+    """
+    pipeline, mock_storage, mock_fetcher = setup_pipeline
+    mock_fetcher.fetch_all_data.return_value = []
+
+    await pipeline.run(parallel=parallel, categories=[DataCategory.USERS])
+
+    mock_fetcher.fetch_all_data.assert_called_once_with(DataCategory.USERS.value, params=None)
+
+
+@pytest.mark.asyncio
+async def test_stream_and_save_rerun_after_failure_keeps_updates(tmp_path):
+    """
+    Test that a streamed CSV sync failing midway does not move the watermark, so that a rerun still saves its updates.
+    """
+    from storage.csv_storage import CSVStorage
+
+    storage = CSVStorage(str(tmp_path))
+    file_path = tmp_path / f"{DataCategory.TRACKS.value}.csv"
+    pd.DataFrame({"id": [1], "name": ["Track1"], "charged_at": ["2024-10-01T00:00"]}).to_csv(file_path, index=False)
+    fetcher = AsyncMock()
+    pipeline = DataPipeline(storage=storage, fetcher=fetcher, chunk_size=1, incremental=True)
+    pages = [
+        [{"id": 2, "name": "Track2", "created_at": "2024-10-02T10:00:00", "updated_at": "2024-10-02T10:00:00"}],
+        [{"id": 1, "name": "Track1 v2", "created_at": "2024-09-01T10:00:00", "updated_at": "2024-10-02T10:00:00"}],
+    ]
+    requested_params = []
+
+    async def failing_iter_pages(endpoint, params=None, start_page=1):
+        requested_params.append(params)
+        for page in pages:
+            yield page
+        raise Exception('Fetch error')
+
+    fetcher.iter_pages = failing_iter_pages
+    with pytest.raises(Exception, match='Fetch error'):
+        await pipeline.stream_and_save(DataCategory.TRACKS, 'id')
+
+    assert pd.read_csv(file_path)["name"].tolist() == ["Track1"]
+    assert storage.read_watermark(DataCategory.TRACKS) == pd.Timestamp("2024-10-01T00:00")
+
+    async def iter_pages(endpoint, params=None, start_page=1):
+        requested_params.append(params)
+        for page in pages:
+            yield page
+
+    fetcher.iter_pages = iter_pages
+    await pipeline.stream_and_save(DataCategory.TRACKS, 'id')
+
+    assert requested_params[1] == requested_params[0]
+    saved = pd.read_csv(file_path).sort_values("id")
+    assert saved["name"].tolist() == ["Track1 v2", "Track2"]
+    assert not (tmp_path / f"{DataCategory.TRACKS.value}.csv.staging").exists()
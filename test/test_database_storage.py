@@ -0,0 +1,219 @@
+import sqlite3
+import pytest
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from pipeline.data_category import DataCategory
+from storage.database_storage import DatabaseStorage, DuckDBStorage, SQLiteStorage
+
+
+def duckdb_available():
+    try:
+        import duckdb  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+@pytest.fixture(params=[
+    SQLiteStorage,
+    pytest.param(DuckDBStorage, marks=pytest.mark.skipif(not duckdb_available(), reason="duckdb is not installed")),
+])
+def database_storage(request, tmp_path):
+    """
+    Fixture to initialize each database storage with a temporary directory.
+    """
+    return request.param(storage_dir=str(tmp_path / "test_data"))
+
+
+def make_tracks(ids, names, updated_at):
+    return pd.DataFrame({
+        "id": ids,
+        "name": names,
+        "created_at": pd.to_datetime(["2024-09-01"] * len(ids)),
+        "updated_at": pd.to_datetime([updated_at] * len(ids))
+    })
+
+
+def test_save_data_empty_df(database_storage):
+    """
+    Test that saving an empty DataFrame raises a ValueError.
+    """
+    with pytest.raises(ValueError, match="The data DataFrame is empty, nothing to save."):
+        database_storage.save_data(DataCategory.TRACKS, pd.DataFrame(), 'id')
+
+
+def test_save_data_upserts_newer_records(database_storage):
+    """
+    Test that records are inserted, updated when more recent, and left untouched when stale.
+    """
+    first = database_storage.save_data(DataCategory.TRACKS, make_tracks([1, 2], ["Track1", "Track2"], "2024-09-01"), "id")
+    second = database_storage.save_data(DataCategory.TRACKS, make_tracks([2, 3], ["Track2 v2", "Track3"], "2024-10-01"), "id")
+    stale = database_storage.save_data(DataCategory.TRACKS, make_tracks([2], ["Stale"], "2024-09-15"), "id")
+
+    loaded = database_storage.load_data(DataCategory.TRACKS, columns=["id", "name"]).sort_values("id")
+
+    assert loaded["id"].tolist() == [1, 2, 3]
+    assert loaded["name"].tolist() == ["Track1", "Track2 v2", "Track3"]
+    assert database_storage.read_watermark(DataCategory.TRACKS) is not None
+    assert (first.inserted, first.updated) == (2, 0)
+    assert (second.inserted, second.updated) == (1, 1)
+    assert (stale.inserted, stale.updated) == (0, 0)
+
+
+def make_history(user_ids, items, updated_at):
+    return pd.DataFrame({
+        "user_id": user_ids,
+        "items": items,
+        "created_at": pd.to_datetime(["2024-09-01"] * len(user_ids)),
+        "updated_at": pd.to_datetime([updated_at] * len(user_ids))
+    })
+
+
+def test_save_data_listen_history_one_row_per_track(database_storage):
+    """
+    Test that listen histories are stored with one row per track, and that a more recent history replaces all the rows of its user.
+    """
+    first = database_storage.save_data(DataCategory.LISTEN_HISTORY, make_history([1, 2], [[10, 11, 12], [20]], "2024-09-01"), "user_id")
+    second = database_storage.save_data(DataCategory.LISTEN_HISTORY, make_history([1, 3], [[13], [30, 31]], "2024-10-01"), "user_id")
+    stale = database_storage.save_data(DataCategory.LISTEN_HISTORY, make_history([2], [[99]], "2024-08-01"), "user_id")
+
+    loaded = database_storage.load_data(DataCategory.LISTEN_HISTORY, columns=["user_id", "track_id", "position"])
+    rows = sorted(loaded.itertuples(index=False, name=None))
+
+    assert rows == [(1, 13, 0), (2, 20, 0), (3, 30, 0), (3, 31, 1)]
+    assert (first.inserted, first.updated) == (4, 0)
+    assert (second.inserted, second.updated) == (2, 1)
+    assert (stale.inserted, stale.updated) == (0, 0)
+
+
+def test_listen_history_json_items_are_migrated(database_storage):
+    """
+    Test that a listen_history table holding JSON lists of tracks is converted to one row per track when the storage is opened.
+    """
+    with closing(database_storage._connect()) as connection:
+        connection.execute('DROP TABLE "listen_history"')
+        connection.execute(
+            'CREATE TABLE "listen_history" ("user_id" BIGINT, "items" TEXT, "created_at" TIMESTAMP, '
+            '"updated_at" TIMESTAMP, charged_at TIMESTAMP, PRIMARY KEY ("user_id"))'
+        )
+        connection.execute(
+            "INSERT INTO \"listen_history\" VALUES (1, '[10, 11]', '2024-09-01 00:00:00.000000', "
+            "'2024-09-01 00:00:00.000000', '2024-09-02 00:00:00.000000')"
+        )
+        connection.commit()
+
+    reopened = type(database_storage)(storage_dir=str(database_storage.storage_dir))
+    loaded = reopened.load_data(DataCategory.LISTEN_HISTORY, columns=["user_id", "track_id", "position"])
+
+    assert sorted(loaded.itertuples(index=False, name=None)) == [(1, 10, 0), (1, 11, 1)]
+    assert reopened.read_watermark(DataCategory.LISTEN_HISTORY) == pd.Timestamp("2024-09-02")
+
+
+def test_read_watermark_empty_table(database_storage):
+    """
+    Test that an empty table has no watermark.
+    """
+    assert database_storage.read_watermark(DataCategory.USERS) is None
+
+
+def test_save_categories_concurrently(database_storage):
+    """
+    Test that the categories can be saved from several threads at once into the same database file.
+    """
+    size = 2000
+    data = {
+        DataCategory.TRACKS: make_tracks(list(range(size)), ["Track"] * size, "2024-10-01"),
+        DataCategory.USERS: make_tracks(list(range(size)), ["User"] * size, "2024-10-01").rename(columns={"name": "first_name"}),
+        DataCategory.LISTEN_HISTORY: make_history(list(range(size)), [[1, 2]] * size, "2024-10-01"),
+    }
+
+    for _ in range(3):
+        with ThreadPoolExecutor(max_workers=len(data)) as executor:
+            futures = [executor.submit(database_storage.save_data, category, data_df, category.key_field) for category, data_df in data.items()]
+            results = [future.result() for future in futures]
+        data = {category: data_df.assign(updated_at=data_df["updated_at"] + pd.Timedelta(days=1)) for category, data_df in data.items()}
+
+    assert [result.updated for result in results] == [size, size, 2 * size]
+    assert len(database_storage.load_data(DataCategory.LISTEN_HISTORY)) == 2 * size
+
+
+def test_stream_writer_commits_each_chunk(database_storage):
+    """
+    Test that the database writer upserts and commits every chunk as it is written, without waiting for close().
+    """
+    writer = database_storage.open_writer(DataCategory.TRACKS, "id")
+    assert writer.durable_chunks
+
+    writer.write(make_tracks([1, 2], ["Track1", "Track2"], "2024-09-01"))
+    assert sorted(database_storage.load_data(DataCategory.TRACKS, columns=["id"])["id"].tolist()) == [1, 2]
+
+    writer.write(make_tracks([2, 3], ["Track2 v2", "Track3"], "2024-10-01"))
+    writer.close()
+
+    loaded = database_storage.load_data(DataCategory.TRACKS, columns=["id", "name"]).sort_values("id")
+    assert loaded["name"].tolist() == ["Track1", "Track2 v2", "Track3"]
+    assert (writer.result.inserted, writer.result.updated) == (3, 1)
+
+
+class PlanRecordingConnection(sqlite3.Connection):
+    """
+    SQLite connection recording the query plan of the statements reading the stored tables.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.plans = []
+
+    def execute(self, sql, *args):
+        if sql.startswith(("SELECT", "INSERT", "DELETE", "CREATE TEMP TABLE changed_keys")) and not sql.startswith("INSERT INTO batch"):
+            self.plans.append((sql, [row[3] for row in super().execute(f"EXPLAIN QUERY PLAN {sql}", *args)]))
+        return super().execute(sql, *args)
+
+
+class PlanRecordingSQLiteStorage(SQLiteStorage):
+    """
+    SQLite storage keeping the query plans recorded by each of its connections.
+    """
+
+    def __init__(self, storage_dir: str):
+        self.plans = []
+        super().__init__(storage_dir=storage_dir)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.database_path, timeout=30, isolation_level=None, factory=PlanRecordingConnection)
+        connection.plans = self.plans
+        return connection
+
+
+def test_save_data_does_not_scan_the_stored_table(tmp_path):
+    """
+    Test that the statements of a save look the batch keys up through the primary key instead of scanning the table.
+    """
+    storage = PlanRecordingSQLiteStorage(storage_dir=str(tmp_path))
+    batches = {
+        DataCategory.TRACKS: make_tracks([2, 3], ["Track2 v2", "Track3"], "2024-10-01"),
+        DataCategory.LISTEN_HISTORY: make_history([2, 3], [[20, 21], [30]], "2024-10-01"),
+    }
+    for category, data_df in batches.items():
+        storage.save_data(category, data_df, category.key_field)
+
+    for category, data_df in batches.items():
+        storage.plans.clear()
+        storage.save_data(category, data_df, category.key_field)
+
+        assert storage.plans
+        for sql, plan in storage.plans:
+            assert not [detail for detail in plan if detail.startswith(f"SCAN {category.value}")], (sql, plan)
+
+
+def test_incomplete_backend_cannot_be_instantiated(tmp_path):
+    """
+    Test that a database backend missing one of the abstract hooks fails when it is created, not when it saves.
+    """
+    class IncompleteStorage(DatabaseStorage):
+        def _connect(self):
+            return SQLiteStorage._connect(self)
+
+    with pytest.raises(TypeError, match="abstract"):
+        IncompleteStorage(storage_dir=str(tmp_path))
@@ -0,0 +1,53 @@
+import os
+import pytest
+from pipeline.http_cache import CachedResponse, HTTPCache
+
+URL = "http://testserver/tracks?page=1&size=100"
+
+
+@pytest.fixture
+def http_cache(tmp_path):
+    """
+    Fixture to initialize an HTTPCache in a temporary directory.
+    """
+    return HTTPCache(cache_dir=str(tmp_path), max_bytes=100)
+
+
+def test_put_and_get(http_cache):
+    """
+    Test that a stored response is returned with its ETag, and that unknown URLs miss.
+    """
+    http_cache.put(URL, '"abc"', b'{"items": []}')
+
+    assert http_cache.get(URL) == CachedResponse('"abc"', b'{"items": []}')
+    assert http_cache.get(f"{URL}&updated_since=2024-10-01") is None
+
+
+def test_least_recently_used_responses_are_evicted(http_cache):
+    """
+    Test that the least recently used responses are evicted once the cache exceeds its size.
+    """
+    # Each file holds 32 bytes: the ETag, a newline and the body
+    for page in range(1, 4):
+        http_cache.put(f"{URL}{page}", '"etag"', b"x" * 25)
+    http_cache.get(f"{URL}1")
+    http_cache.put(f"{URL}4", '"etag"', b"x" * 25)
+
+    assert http_cache.get(f"{URL}1") is not None
+    assert http_cache.get(f"{URL}2") is None
+    assert http_cache.get(f"{URL}4") is not None
+
+
+def test_cache_is_reloaded_in_usage_order(tmp_path, http_cache):
+    """
+    Test that a new instance finds the responses of the previous run and keeps their usage order.
+    """
+    http_cache.put(f"{URL}1", '"etag"', b"x" * 30)
+    http_cache.put(f"{URL}2", '"etag"', b"x" * 30)
+    os.utime(http_cache.cache_dir / http_cache._get_file_name(f"{URL}1"), (0, 0))
+
+    reopened_cache = HTTPCache(cache_dir=str(tmp_path), max_bytes=100)
+    reopened_cache.put(f"{URL}3", '"etag"', b"x" * 30)
+
+    assert reopened_cache.get(f"{URL}1") is None
+    assert reopened_cache.get(f"{URL}2") is not None
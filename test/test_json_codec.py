@@ -0,0 +1,30 @@
+import json
+import pytest
+from pipeline import json_codec
+
+
+def test_loads_bytes_and_str():
+    """
+    Test that the codec decodes bytes and str documents like the standard library.
+    """
+    document = '{"id": 1, "items": [1, 2], "name": "caf\\u00e9", "score": 1.5, "empty": null}'
+
+    assert json_codec.loads(document.encode()) == json.loads(document)
+    assert json_codec.loads(document) == json.loads(document)
+
+
+def test_loads_invalid_document():
+    """
+    Test that an invalid document raises a ValueError whatever the backend.
+    """
+    with pytest.raises(ValueError):
+        json_codec.loads(b'{"id": ')
+
+
+def test_stdlib_fallback(monkeypatch):
+    """
+    Test that the standard library is used when orjson is not installed.
+    """
+    monkeypatch.setattr(json_codec, "orjson", None)
+
+    assert json_codec.loads(b'[1, 2]') == [1, 2]
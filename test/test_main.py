@@ -0,0 +1,115 @@
+import importlib.util
+import subprocess
+import sys
+from pathlib import Path
+import pandas as pd
+import pytest
+from pipeline.data_category import DataCategory
+
+SRC_DIR = Path(__file__).resolve().parents[1] / "src"
+# Cumulative import time of the entry point, in microseconds. It was about 15ms after
+# deferring the heavy imports, importing pandas alone takes several hundred.
+IMPORT_BUDGET_US = 150_000
+
+
+def load_main():
+    """
+    Loads src/main.py under another name, `main` is also the module of the API.
+    """
+    spec = importlib.util.spec_from_file_location("pipeline_main", SRC_DIR / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure_import_us() -> int:
+    """
+    Measures the cumulative import time of the entry point in a fresh interpreter, with `-X importtime`.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=SRC_DIR, capture_output=True, text=True, check=True
+    )
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == "main":
+            return int(fields[1])
+    raise AssertionError(f"No import time reported for main:\n{completed.stderr}")
+
+
+def test_cold_start_stays_under_budget():
+    """
+    Test that importing the entry point does not import the heavy dependencies and stays under the import time budget.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-c", "import main, sys; print(sorted(set(sys.modules) & {'pandas', 'numpy', 'aiohttp', 'dotenv', 'pyarrow'}))"],
+        cwd=SRC_DIR, capture_output=True, text=True, check=True
+    )
+    assert completed.stdout.strip() == "[]"
+
+    # The best of a few runs, so that a busy machine does not make the test flaky
+    assert min(measure_import_us() for _ in range(3)) < IMPORT_BUDGET_US
+
+
+def test_help_does_not_run_the_pipeline():
+    """
+    Test that --help exits successfully and lists the commands.
+    """
+    completed = subprocess.run([sys.executable, "main.py", "--help"], cwd=SRC_DIR, capture_output=True, text=True)
+    assert completed.returncode == 0
+    for command in ("run", "compact", "bench"):
+        assert command in completed.stdout
+
+
+def test_parser_defaults_to_run():
+    """
+    Test that the command defaults to `run` and that categories can be repeated.
+    """
+    parser = load_main().build_parser()
+
+    assert parser.parse_args([]).command == "run"
+    args = parser.parse_args(["run", "--category", "users", "--category", "tracks"])
+    assert (args.command, args.category) == ("run", ["users", "tracks"])
+    with pytest.raises(SystemExit):
+        parser.parse_args(["run", "--category", "albums"])
+
+
+def test_compact_command_merges_deltas(tmp_path, monkeypatch):
+    """
+    Test that the compact command merges the delta segments of the selected category only.
+    """
+    from storage.csv_storage import CSVStorage
+
+    storage = CSVStorage(storage_dir=str(tmp_path), append_only=True)
+    for category, key in ((DataCategory.USERS, "id"), (DataCategory.TRACKS, "id")):
+        storage.save_data(category, pd.DataFrame({
+            "id": [1],
+            "name": ["Michelle"],
+            "created_at": pd.to_datetime(["2024-09-28"]),
+            "updated_at": pd.to_datetime(["2024-09-28"])
+        }), key)
+    monkeypatch.setenv("STORAGE_BACKEND", "csv")
+    monkeypatch.setenv("STORAGE_DIR", str(tmp_path))
+
+    assert load_main().cli(["compact", "--category", "users"]) == 0
+
+    assert (tmp_path / "users.csv").exists()
+    assert not list((tmp_path / "users.deltas").glob("delta-*.csv"))
+    assert list((tmp_path / "tracks.deltas").glob("delta-*.csv"))
+
+
+@pytest.mark.parametrize("error, exit_code", [(None, 0), (RuntimeError("Ingestion failed for: users"), 1), (KeyboardInterrupt(), 130)])
+def test_run_command_exit_code(error, exit_code, monkeypatch):
+    """
+    Test that the run command exits with a non-zero code when the pipeline fails or is interrupted.
+    """
+    main_module = load_main()
+
+    async def main(categories=None):
+        if error is not None:
+            raise error
+
+    monkeypatch.setattr(main_module, "main", main)
+
+    assert main_module.cli(["run"]) == exit_code
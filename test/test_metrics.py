@@ -0,0 +1,109 @@
+import json
+import pytest
+from unittest.mock import patch
+from pipeline.metrics import Histogram, JSONSummarySink, Metrics, PrometheusTextFileSink
+
+
+@pytest.fixture
+def metrics():
+    """
+    Fixture to initialize a Metrics registry with a few recorded values.
+    """
+    metrics = Metrics()
+    metrics.increment("moovitamix_rows_total", 10, category="tracks", stage="fetch")
+    metrics.increment("moovitamix_rows_total", 5, category="tracks", stage="fetch")
+    metrics.observe("moovitamix_stage_duration_seconds", 0.02, category="tracks", stage="fetch")
+    metrics.observe("moovitamix_stage_duration_seconds", 0.3, category="tracks", stage="fetch")
+    return metrics
+
+
+def test_counters_are_identified_by_labels(metrics):
+    """
+    Test that counters add up per set of labels, whatever the order of the labels.
+    """
+    assert metrics.get_counter("moovitamix_rows_total", stage="fetch", category="tracks") == 15
+    assert metrics.get_counter("moovitamix_rows_total", category="users", stage="fetch") == 0
+
+
+def test_histogram_buckets_and_quantiles():
+    """
+    Test that a histogram counts its observations in cumulative buckets and estimates quantiles from them.
+    """
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 2.0):
+        histogram.observe(value)
+
+    assert histogram.counts == [1, 3]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(3.25)
+    assert histogram.quantile(0.5) == 1.0
+    assert histogram.quantile(1.0) == 2.0
+    assert Histogram().quantile(0.5) is None
+
+
+def test_prometheus_text_file(metrics, tmp_path):
+    """
+    Test that the Prometheus sink writes counters and histograms in the text exposition format.
+    """
+    file_path = tmp_path / "metrics.prom"
+    PrometheusTextFileSink(str(file_path)).export(metrics)
+    lines = file_path.read_text().splitlines()
+
+    assert "# TYPE moovitamix_rows_total counter" in lines
+    assert 'moovitamix_rows_total{category="tracks",stage="fetch"} 15' in lines
+    assert "# TYPE moovitamix_stage_duration_seconds histogram" in lines
+    assert 'moovitamix_stage_duration_seconds_bucket{category="tracks",stage="fetch",le="0.025"} 1' in lines
+    assert 'moovitamix_stage_duration_seconds_bucket{category="tracks",stage="fetch",le="+Inf"} 2' in lines
+    assert 'moovitamix_stage_duration_seconds_count{category="tracks",stage="fetch"} 2' in lines
+
+
+def test_json_summary(metrics, tmp_path):
+    """
+    Test that the JSON sink writes the counters and a summary of each histogram.
+    """
+    file_path = tmp_path / "summary.json"
+    JSONSummarySink(str(file_path)).export(metrics)
+    summary = json.loads(file_path.read_text())
+
+    assert summary["counters"] == [
+        {"name": "moovitamix_rows_total", "labels": {"category": "tracks", "stage": "fetch"}, "value": 15}
+    ]
+    histogram = summary["histograms"][0]
+    assert histogram["count"] == 2
+    assert histogram["mean"] == pytest.approx(0.16)
+    assert histogram["max"] == pytest.approx(0.3)
+    assert histogram["p95"] == pytest.approx(0.3)
+
+
+def test_export_continues_after_sink_failure(metrics, tmp_path):
+    """
+    Test that a failing sink is logged and does not prevent the other sinks from exporting.
+    """
+    class FailingSink(JSONSummarySink):
+        def export(self, metrics):
+            raise OSError("disk full")
+
+    file_path = tmp_path / "summary.json"
+    metrics.sinks = [FailingSink(str(tmp_path / "unused.json")), JSONSummarySink(str(file_path))]
+
+    metrics.export()
+
+    assert file_path.exists()
+
+
+def test_failed_export_keeps_the_previous_file(metrics, tmp_path):
+    """
+    Test that a sink failing while writing leaves the previous file, and no temporary file, behind.
+    """
+    file_path = tmp_path / "summary.json"
+    sink = JSONSummarySink(str(file_path))
+    sink.export(metrics)
+    previous = file_path.read_text()
+
+    metrics.increment("moovitamix_rows_total", 1, category="users", stage="fetch")
+    with patch("pipeline.metrics.json.dump", side_effect=OSError("disk full")):
+        with pytest.raises(OSError, match="disk full"):
+            sink.export(metrics)
+
+    assert file_path.read_text() == previous
+    assert list(tmp_path.iterdir()) == [file_path]
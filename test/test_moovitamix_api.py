@@ -0,0 +1,182 @@
+import datetime
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.moovitamix_fastapi import main as api
+from src.moovitamix_fastapi.record_index import RecordIndex
+
+
+def make_record(id, created_at, updated_at):
+    return SimpleNamespace(id=id, created_at=created_at, updated_at=updated_at)
+
+
+@pytest.fixture
+def client():
+    return TestClient(api.app)
+
+
+def test_record_index_changed_since():
+    day = datetime.datetime(2024, 10, 1)
+    records = [
+        make_record(1, day, day + datetime.timedelta(days=3)),
+        make_record(2, day + datetime.timedelta(days=5), day + datetime.timedelta(days=5)),
+        make_record(3, day, day + datetime.timedelta(days=1)),
+    ]
+    index = RecordIndex(records, key="id")
+
+    assert index.changed_since() is records
+    assert [r.id for r in index.changed_since(updated_since=day + datetime.timedelta(days=2))] == [1, 2]
+    assert [r.id for r in index.changed_since(created_since=day + datetime.timedelta(days=2))] == [2]
+    assert [r.id for r in index.changed_since(updated_since=day + datetime.timedelta(days=4), created_since=day)] == [2]
+    assert [r.id for r in index.changed_since(updated_since=day + datetime.timedelta(days=10))] == []
+
+
+def test_record_index_accepts_timezone_aware_bounds():
+    day = datetime.datetime(2024, 10, 1)
+    index = RecordIndex([make_record(1, day, day)], key="id")
+
+    since = datetime.datetime(2024, 9, 30, tzinfo=datetime.timezone.utc)
+    assert [r.id for r in index.changed_since(updated_since=since)] == [1]
+
+
+def test_get_tracks_updated_since(client):
+    since = sorted(track.updated_at for track in api.tracks)[-10]
+
+    response = client.get("/tracks", params={"updated_since": since.isoformat(), "size": 100})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total"] == sum(track.updated_at > since for track in api.tracks)
+    assert all(item["updated_at"] > since.isoformat() for item in body["items"])
+
+
+def test_get_users_without_filter(client):
+    response = client.get("/users", params={"size": 10})
+
+    assert response.status_code == 200
+    assert response.json()["total"] == len(api.users)
+
+
+def test_record_index_page_after():
+    day = datetime.datetime(2024, 10, 1)
+    records = [make_record(id, day, day + datetime.timedelta(days=id % 3)) for id in range(1, 8)]
+    index = RecordIndex(records, key="id")
+
+    first, has_more = index.page_after(None, 3)
+    second, _ = index.page_after(index.sort_key(first[-1]), 3)
+    assert [r.id for r in first] == [3, 6, 1]
+    assert [r.id for r in second] == [4, 7, 2]
+    assert has_more
+
+    # A record updated between two pages moves after the position instead of shifting the next page
+    records[3].updated_at = day + datetime.timedelta(days=10)
+    index = RecordIndex(records, key="id")
+    second_after_update, _ = index.page_after(index.sort_key(first[-1]), 3)
+    assert [r.id for r in second_after_update] == [7, 2, 5]
+
+    created, has_more = index.page_after(None, 10, created_since=day - datetime.timedelta(days=1))
+    assert [r.id for r in created] == [r.id for r in index.by_updated_at]
+    assert not has_more
+
+
+
+def test_record_index_page_after_merges_bounds_once():
+    day = datetime.datetime(2024, 10, 1)
+    records = [make_record(id, day + datetime.timedelta(days=id % 5), day + datetime.timedelta(days=id % 7)) for id in range(1, 50)]
+    index = RecordIndex(records, key="id")
+    updated_since, created_since = day + datetime.timedelta(days=4), day + datetime.timedelta(days=3)
+
+    ids, after, has_more = [], None, True
+    with patch.object(index, "changed_since", wraps=index.changed_since) as changed_since:
+        while has_more:
+            page, has_more = index.page_after(after, 4, updated_since, created_since)
+            ids.extend(r.id for r in page)
+            after = index.sort_key(page[-1])
+
+    assert changed_since.call_count == 1
+    assert ids == [r.id for r in index.changed_since(updated_since, created_since)]
+
+def test_get_tracks_cursor_walks_every_record_once(client):
+    ids = []
+    cursor = None
+    while True:
+        params = {"limit": 300}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/tracks/cursor", params=params)
+        assert response.status_code == 200
+        body = response.json()
+        ids.extend(item["id"] for item in body["items"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert sorted(ids) == sorted(track.id for track in api.tracks)
+
+
+def test_get_users_cursor_invalid_cursor(client):
+    response = client.get("/users/cursor", params={"cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
+
+
+def test_export_listen_history_ndjson(client):
+    response = client.get("/export/listen_history", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["content-encoding"] == "gzip"
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(record["user_id"] for record in records) == sorted(entry.user_id for entry in api.listen_history)
+
+
+def test_export_unknown_category(client):
+    response = client.get("/export/albums")
+
+    assert response.status_code == 422
+
+
+def test_get_tracks_page_layout(client):
+    response = client.get("/tracks", params={"page": 2, "size": 30})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total"] == len(api.tracks)
+    assert (body["page"], body["size"], body["pages"]) == (2, 30, -(-len(api.tracks) // 30))
+    assert body["items"] == [track.model_dump(mode="json") for track in api.tracks[30:60]]
+
+
+def test_get_tracks_page_size_limit(client):
+    assert client.get("/tracks", params={"size": 101}).status_code == 422
+
+
+def test_openapi_documents_page_models(client):
+    schema = client.get("/openapi.json").json()
+
+    response_schema = schema["paths"]["/tracks"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert response_schema["$ref"].endswith("TracksOut_")
+
+
+def test_get_tracks_etag_not_modified(client):
+    response = client.get("/tracks", params={"page": 1, "size": 10})
+    etag = response.headers["etag"]
+
+    not_modified = client.get("/tracks", params={"page": 1, "size": 10}, headers={"If-None-Match": f"W/{etag}"})
+    other_page = client.get("/tracks", params={"page": 2, "size": 10}, headers={"If-None-Match": etag})
+
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+    assert other_page.status_code == 200
+    assert other_page.headers["etag"] != etag
+
+
+def test_get_users_cursor_etag(client):
+    response = client.get("/users/cursor", params={"limit": 5})
+
+    assert response.headers["cache-control"] == "no-cache"
+    assert client.get("/users/cursor", params={"limit": 5}, headers={"If-None-Match": response.headers["etag"]}).status_code == 304
@@ -0,0 +1,156 @@
+import pytest
+import pandas as pd
+from pipeline.data_category import DataCategory
+from pipeline.schemas import build_frame
+
+pytest.importorskip("pyarrow")
+
+from storage.parquet_storage import ParquetStorage
+
+
+@pytest.fixture
+def setup_parquet_storage(tmp_path):
+    """
+    Fixture to initialize ParquetStorage with a temporary directory.
+    """
+    storage_dir = tmp_path / "test_data"
+    storage = ParquetStorage(storage_dir=str(storage_dir))
+    return storage, storage_dir
+
+
+def make_tracks(ids, names, updated_at="2024-09-28"):
+    return pd.DataFrame({
+        "id": ids,
+        "name": names,
+        "created_at": pd.to_datetime(["2024-09-28"] * len(ids)),
+        "updated_at": pd.to_datetime([updated_at] * len(ids))
+    })
+
+
+def test_save_data_empty_df(setup_parquet_storage):
+    """
+    Test that saving an empty DataFrame raises a ValueError.
+    """
+    storage, _ = setup_parquet_storage
+
+    with pytest.raises(ValueError, match="The data DataFrame is empty, nothing to save."):
+        storage.save_data(DataCategory.TRACKS, pd.DataFrame(), 'id')
+
+
+def test_save_data_partitions_and_preserves_types(setup_parquet_storage):
+    """
+    Test that records are written under a load_date partition and read back with their types.
+    """
+    storage, storage_dir = setup_parquet_storage
+
+    storage.save_data(DataCategory.TRACKS, make_tracks([1, 2], ["Track1", "Track2"]), "id")
+
+    partitions = list((storage_dir / "tracks").glob("load_date=*"))
+    assert len(partitions) == 1
+
+    loaded = storage.load_data(DataCategory.TRACKS)
+    assert loaded["id"].tolist() == [1, 2]
+    assert pd.api.types.is_integer_dtype(loaded["id"])
+    assert pd.api.types.is_datetime64_any_dtype(loaded["created_at"])
+    assert pd.api.types.is_datetime64_any_dtype(loaded["charged_at"])
+
+
+def test_load_data_projection_and_filters(setup_parquet_storage):
+    """
+    Test that load_data only returns the requested columns and rows.
+    """
+    storage, _ = setup_parquet_storage
+    storage.save_data(DataCategory.TRACKS, make_tracks([1, 2, 3], ["Track1", "Track2", "Track3"]), "id")
+
+    loaded = storage.load_data(DataCategory.TRACKS, columns=["id"], filters=[("id", ">", 1)])
+
+    assert list(loaded.columns) == ["id"]
+    assert loaded["id"].tolist() == [2, 3]
+
+
+def test_save_data_keeps_latest_version(setup_parquet_storage):
+    """
+    Test that an updated record is appended and wins over its previous version on read.
+    """
+    storage, _ = setup_parquet_storage
+    first = storage.save_data(DataCategory.TRACKS, make_tracks([1, 2], ["Track1", "Track2"]), "id")
+
+    updated_at = (pd.Timestamp.now() + pd.Timedelta(days=1)).isoformat()
+    second = storage.save_data(DataCategory.TRACKS, make_tracks([2], ["Track2 v2"], updated_at=updated_at), "id")
+    # Unchanged records are not written again
+    storage.save_data(DataCategory.TRACKS, make_tracks([1], ["Track1"]), "id")
+
+    all_versions = storage.load_data(DataCategory.TRACKS)
+    latest = storage.load_data(DataCategory.TRACKS, unique_key="id").sort_values("id")
+
+    assert len(all_versions) == 3
+    assert latest["name"].tolist() == ["Track1", "Track2 v2"]
+    assert (first.inserted, first.updated) == (2, 0)
+    assert (second.inserted, second.updated) == (0, 1)
+
+
+def test_load_data_no_dataset(setup_parquet_storage):
+    """
+    Test that loading a category without data returns an empty DataFrame.
+    """
+    storage, _ = setup_parquet_storage
+
+    assert storage.load_data(DataCategory.USERS).empty
+    assert storage.read_watermark(DataCategory.USERS) is None
+
+
+def test_save_typed_frames_over_existing_dataset(setup_parquet_storage):
+    """
+    Test that chunks with categories and int32 ids can be appended to a dataset written with int64 ids and strings.
+    """
+    storage, _ = setup_parquet_storage
+    storage.save_data(DataCategory.TRACKS, make_tracks([1, 2], ["Track1", "Track2"]).assign(genres=["Rock", "Pop"]), "id")
+
+    updated_at = (pd.Timestamp.now() + pd.Timedelta(days=1)).isoformat()
+    typed_df = make_tracks([2, 3], ["Track2 v2", "Track3"], updated_at=updated_at).astype({"id": "int32"})
+    typed_df["genres"] = pd.Categorical(["Jazz", "Pop"])
+    storage.save_data(DataCategory.TRACKS, typed_df, "id")
+
+    latest = storage.load_data(DataCategory.TRACKS, unique_key="id").sort_values("id")
+
+    assert latest["id"].tolist() == [1, 2, 3]
+    assert latest["genres"].tolist() == ["Rock", "Jazz", "Pop"]
+
+
+def test_save_listen_history_list_column(setup_parquet_storage):
+    """
+    Test that an Arrow list column of tracks is stored as a Parquet list and read back along lists written from Python objects.
+    """
+    storage, _ = setup_parquet_storage
+    history_df = build_frame([
+        {"user_id": 1, "items": [10, 11], "created_at": "2024-09-28", "updated_at": "2024-09-28"}
+    ], DataCategory.LISTEN_HISTORY)
+    storage.save_data(DataCategory.LISTEN_HISTORY, history_df, "user_id")
+
+    updated_at = pd.Timestamp.now() + pd.Timedelta(days=1)
+    storage.save_data(DataCategory.LISTEN_HISTORY, pd.DataFrame({
+        "user_id": [2],
+        "items": [[20, 21, 22]],
+        "created_at": pd.to_datetime(["2024-09-28"]),
+        "updated_at": [updated_at]
+    }), "user_id")
+
+    latest = storage.load_data(DataCategory.LISTEN_HISTORY, unique_key="user_id").sort_values("user_id")
+
+    assert [list(items) for items in latest["items"]] == [[10, 11], [20, 21, 22]]
+
+
+def test_parts_are_written_atomically(setup_parquet_storage):
+    """
+    Test that a part is only visible once fully written, and that the temporary file of a crashed write is not read.
+    """
+    storage, storage_dir = setup_parquet_storage
+    storage.save_data(DataCategory.TRACKS, make_tracks([1, 2], ["Track1", "Track2"]), "id")
+
+    partition_dir = next((storage_dir / "tracks").glob("load_date=*"))
+    assert [path.suffix for path in partition_dir.iterdir()] == [".parquet"]
+
+    (partition_dir / "part-000000000000-deadbeef.parquet.tmp").write_bytes(b"PAR1")
+
+    assert storage.load_data(DataCategory.TRACKS, unique_key="id")["id"].tolist() == [1, 2]
+    assert storage.read_watermark(DataCategory.TRACKS) is not None
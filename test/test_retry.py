@@ -0,0 +1,114 @@
+import asyncio
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+import aiohttp
+import pytest
+from unittest.mock import MagicMock
+from pipeline.retry import AdaptiveConcurrencyLimiter, RetryPolicy, parse_retry_after
+
+
+def make_response_error(status, headers=None):
+    return aiohttp.ClientResponseError(MagicMock(), (), status=status, headers=headers)
+
+
+def test_parse_retry_after():
+    """
+    Test that Retry-After is parsed both as a number of seconds and as an HTTP date.
+    """
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+
+    assert parse_retry_after("5") == 5.0
+    assert 25 < parse_retry_after(format_datetime(retry_at, usegmt=True)) <= 30
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_exponential_backoff_without_jitter():
+    """
+    Test that the delay doubles with each attempt up to backoff_max, and that retries stop after max_retries.
+    """
+    policy = RetryPolicy(max_retries=4, backoff_base=1, backoff_max=5, jitter=False)
+    error = make_response_error(503)
+
+    assert [policy.get_delay(error, attempt) for attempt in range(5)] == [1, 2, 4, 5, None]
+
+
+def test_jitter_stays_below_the_bound():
+    """
+    Test that jittered delays are drawn between 0 and the exponential bound.
+    """
+    policy = RetryPolicy(backoff_base=1)
+    delays = [policy.get_delay(asyncio.TimeoutError(), 2) for _ in range(100)]
+
+    assert all(0 <= delay <= 4 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_only_transient_errors_are_retried():
+    """
+    Test that client errors other than 429 are not retried, unlike server and connection errors.
+    """
+    policy = RetryPolicy()
+
+    assert policy.get_delay(make_response_error(404), 0) is None
+    assert policy.get_delay(aiohttp.ClientError(), 0) is None
+    assert policy.get_delay(make_response_error(429), 0) is not None
+    assert policy.get_delay(aiohttp.ServerDisconnectedError(), 0) is not None
+
+
+def test_retry_after_is_honoured():
+    """
+    Test that the delay is at least the one asked by the API.
+    """
+    policy = RetryPolicy(backoff_base=0.1)
+
+    assert policy.get_delay(make_response_error(429, headers={"Retry-After": "7"}), 0) == 7.0
+
+
+@pytest.mark.asyncio
+async def test_limiter_decreases_once_per_window_and_increases_additively():
+    """
+    Test that concurrent failures halve the limit once, and that successes raise it back gradually.
+    """
+    limiter = AdaptiveConcurrencyLimiter(max_limit=8)
+    started = asyncio.Event()
+
+    async def failing_request():
+        async with limiter.acquire():
+            await started.wait()
+            raise aiohttp.ServerDisconnectedError()
+
+    tasks = [asyncio.create_task(failing_request()) for _ in range(4)]
+    await asyncio.sleep(0)
+    started.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert limiter.limit == 4
+
+    for _ in range(4):
+        async with limiter.acquire():
+            pass
+
+    assert 4.9 < limiter.limit < 5
+
+
+@pytest.mark.asyncio
+async def test_limiter_bounds_requests_in_flight():
+    """
+    Test that no more requests than the current limit run at the same time.
+    """
+    limiter = AdaptiveConcurrencyLimiter(max_limit=2)
+    in_flight = []
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        async with limiter.acquire():
+            in_flight.append(1)
+            peak = max(peak, len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.pop()
+
+    await asyncio.gather(*(request() for _ in range(6)))
+
+    assert peak == 2
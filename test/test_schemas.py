@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pipeline.data_category import DataCategory
+from pipeline.schemas import build_frame, explode_listen_history
+
+USERS = [
+    {"id": 1, "first_name": "Michelle", "last_name": "Taylor", "email": "m@example.com", "gender": "Female",
+     "favorite_genres": "Jazz", "created_at": "2024-09-01T10:00:00", "updated_at": "2024-10-01T10:00:00"},
+    {"id": 2, "first_name": "Peggy", "last_name": "Brooks", "email": "p@example.com", "gender": "Female",
+     "favorite_genres": "Rock", "created_at": "2024-09-02T10:00:00", "updated_at": "2024-10-02T10:00:00.123456"},
+]
+
+
+def test_build_frame_compact_dtypes():
+    """
+    Test that the columns are built with the compact dtypes of the schema.
+    """
+    df = build_frame(USERS, DataCategory.USERS)
+
+    assert df["id"].dtype == np.int32
+    assert isinstance(df["gender"].dtype, pd.CategoricalDtype)
+    assert isinstance(df["email"].dtype, pd.StringDtype)
+    assert pd.api.types.is_datetime64_dtype(df["updated_at"])
+    assert df["updated_at"].iloc[1] == pd.Timestamp("2024-10-02T10:00:00.123456")
+    assert list(df.columns) == list(USERS[0])
+
+
+def test_build_frame_drops_incomplete_records():
+    """
+    Test that records with a missing value are dropped, as with dropna.
+    """
+    records = [
+        {"user_id": 1, "items": [1, 2], "created_at": "2024-09-01T10:00:00", "updated_at": "2024-10-01T10:00:00"},
+        {"user_id": 2, "items": None, "created_at": "2024-09-01T10:00:00", "updated_at": "2024-10-01T10:00:00"},
+        {"user_id": 3, "items": [3], "created_at": "2024-09-01T10:00:00"},
+    ]
+
+    df = build_frame(records, DataCategory.LISTEN_HISTORY)
+
+    assert df["user_id"].tolist() == [1]
+    assert df["items"].tolist() == [[1, 2]]
+
+
+def test_build_frame_keeps_large_ids_and_unknown_fields():
+    """
+    Test that ids beyond int32 are kept in int64, and that fields outside the schema are kept.
+    """
+    df = build_frame([{"id": 2 ** 40, "name": "Track1", "rating": 4.5}], DataCategory.TRACKS)
+
+    assert df["id"].dtype == np.int64
+    assert df["rating"].tolist() == [4.5]
+
+
+def test_build_frame_invalid_id():
+    """
+    Test that a value that does not match the schema raises a ValueError.
+    """
+    with pytest.raises(ValueError):
+        build_frame([{"id": "abc"}], DataCategory.TRACKS)
+
+
+@pytest.mark.parametrize("typed", [True, False])
+def test_explode_listen_history(typed):
+    """
+    Test that listen histories are exploded to one row per track, from an Arrow list column or from Python lists.
+    """
+    records = [
+        {"user_id": 1, "items": [10, 11, 12], "created_at": "2024-09-01T10:00:00", "updated_at": "2024-10-01T10:00:00"},
+        {"user_id": 2, "items": [], "created_at": "2024-09-01T10:00:00", "updated_at": "2024-10-01T10:00:00"},
+        {"user_id": 3, "items": [30], "created_at": "2024-09-02T10:00:00", "updated_at": "2024-10-02T10:00:00"},
+    ]
+    history_df = build_frame(records, DataCategory.LISTEN_HISTORY) if typed else pd.DataFrame(records)
+
+    exploded_df = explode_listen_history(history_df)
+
+    assert list(exploded_df.columns) == ["user_id", "track_id", "position", "created_at", "updated_at"]
+    assert list(exploded_df[["user_id", "track_id", "position"]].itertuples(index=False, name=None)) == [
+        (1, 10, 0), (1, 11, 1), (1, 12, 2), (3, 30, 0)
+    ]
+    assert exploded_df["track_id"].dtype == np.int32
+    assert exploded_df["updated_at"].tolist()[-1] == history_df["updated_at"].iloc[2]
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+from pipeline.data_category import DataCategory
+from pipeline.sharding import clean_and_write_shard, get_shards, split_records
+from storage.storage import SaveResult, StorageWriter
+
+
+class RecordingWriter(StorageWriter):
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def write(self, chunk_df):
+        self.chunks.append(chunk_df)
+        self.result.inserted += len(chunk_df)
+
+    def close(self):
+        pass
+
+
+def test_get_shards_is_stable():
+    """
+    Test that keys are assigned to the same shard whatever their integer width, and that shards are within range.
+    """
+    shards = get_shards(list(range(1000)), 8)
+
+    assert shards.min() >= 0 and shards.max() < 8
+    assert get_shards(pd.array(range(1000), dtype="int32"), 8).tolist() == shards.tolist()
+    assert len(set(shards.tolist())) == 8
+
+    with pytest.raises(ValueError):
+        get_shards([1], 0)
+
+
+def test_split_records_groups_versions_of_a_key():
+    """
+    Test that all the versions of a key land in the same shard, in their original order.
+    """
+    records = [{"id": key % 50, "version": version} for version, key in enumerate(range(200))]
+    records.append({"name": "no key"})
+
+    shards = split_records(records, "id", 4)
+
+    assert len(shards) == 4
+    assert sum(len(shard) for shard in shards) == len(records)
+    shard_of_key = {}
+    for index, shard in enumerate(shards):
+        for record in shard:
+            assert shard_of_key.setdefault(record.get("id"), index) == index
+        versions = [record["version"] for record in shard if "version" in record]
+        assert versions == sorted(versions)
+
+
+def test_clean_and_write_shard():
+    """
+    Test that a shard is cleaned and returned, or written with the given writer.
+    """
+    records = [{"user_id": 1, "items": [10, 11]}, {"user_id": 1, "items": [10, 11]}, {"user_id": 2, "items": None}]
+
+    returned = clean_and_write_shard(records, "user_id", DataCategory.LISTEN_HISTORY, True)
+    written = clean_and_write_shard(records, "user_id", DataCategory.LISTEN_HISTORY, True, RecordingWriter())
+
+    assert returned.data_df[["user_id", "track_id", "position"]].values.tolist() == [[1, 10, 0], [1, 11, 1]]
+    assert returned.rows == written.rows == 2
+    assert written.data_df is None
+    assert written.result == SaveResult(inserted=2)
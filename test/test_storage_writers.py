@@ -0,0 +1,106 @@
+import pytest
+import pandas as pd
+from pipeline.data_category import DataCategory
+from storage.csv_buckets import CSVBucketWriter, CSVBuckets
+from storage.csv_storage import CSVStorage
+from storage.database_storage import SQLiteStorage
+from storage.storage import BufferedStorageWriter
+
+
+def open_csv(tmp_path):
+    storage = CSVStorage(storage_dir=str(tmp_path))
+    return lambda: storage.open_writer(DataCategory.TRACKS, "id"), lambda: storage.load_data(DataCategory.TRACKS)
+
+
+def open_csv_deltas(tmp_path):
+    storage = CSVStorage(storage_dir=str(tmp_path), append_only=True)
+    return lambda: storage.open_writer(DataCategory.TRACKS, "id"), lambda: storage.load_data(DataCategory.TRACKS)
+
+
+def open_csv_buckets(tmp_path):
+    directory = tmp_path / DataCategory.TRACKS.value
+    return lambda: CSVBucketWriter(CSVBuckets(directory, "id", 2)), lambda: CSVBuckets(directory, "id", 2).load()
+
+
+def open_parquet(tmp_path):
+    from storage.parquet_storage import ParquetStorage
+
+    storage = ParquetStorage(storage_dir=str(tmp_path))
+    return lambda: storage.open_writer(DataCategory.TRACKS, "id"), lambda: storage.load_data(DataCategory.TRACKS, unique_key="id")
+
+
+def open_sqlite(tmp_path):
+    storage = SQLiteStorage(storage_dir=str(tmp_path))
+    return lambda: storage.open_writer(DataCategory.TRACKS, "id"), lambda: storage.load_data(DataCategory.TRACKS)
+
+
+def open_buffered(tmp_path):
+    storage = CSVStorage(storage_dir=str(tmp_path))
+    return lambda: BufferedStorageWriter(storage, DataCategory.TRACKS, "id"), lambda: storage.load_data(DataCategory.TRACKS)
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+@pytest.fixture(params=[
+    open_csv,
+    open_csv_deltas,
+    open_csv_buckets,
+    pytest.param(open_parquet, marks=pytest.mark.skipif(not parquet_available(), reason="pyarrow is not installed")),
+    open_sqlite,
+    open_buffered,
+], ids=lambda open_storage: open_storage.__name__.removeprefix("open_"))
+def writer_storage(request, tmp_path):
+    """
+    Fixture returning a function opening a writer of tracks and a function loading the stored tracks, for each writer.
+    """
+    return request.param(tmp_path)
+
+
+def make_tracks(ids, names, created_at, updated_at):
+    return pd.DataFrame({
+        "id": ids,
+        "name": names,
+        "created_at": pd.to_datetime([created_at] * len(ids)),
+        "updated_at": pd.to_datetime([updated_at] * len(ids))
+    })
+
+
+def write_run(open_writer, chunks):
+    writer = open_writer()
+    for chunk in chunks:
+        writer.write(chunk)
+    writer.close()
+
+
+def test_writers_keep_the_latest_chunk_of_a_key(writer_storage):
+    """
+    Test that every writer keeps the version of the latest chunk when a key is written by several chunks of a run.
+    """
+    open_writer, load = writer_storage
+    day = pd.Timedelta(days=1)
+    now = pd.Timestamp.now()
+
+    write_run(open_writer, [
+        make_tracks([1, 2], ["Track1", "Track2"], "2024-09-01", "2024-09-01"),
+        make_tracks([2], ["Track2 v2"], "2024-09-01", "2024-09-02"),
+    ])
+
+    loaded = load().sort_values("id")
+    assert loaded["id"].tolist() == [1, 2]
+    assert loaded["name"].tolist() == ["Track1", "Track2 v2"]
+
+    write_run(open_writer, [
+        make_tracks([1], ["Track1 v2"], "2024-09-01", now + day),
+        make_tracks([3], ["Track3"], now + day, now + day),
+        make_tracks([1, 3], ["Track1 v3", "Track3 v2"], "2024-09-01", now + 2 * day),
+    ])
+
+    loaded = load().sort_values("id")
+    assert loaded["id"].tolist() == [1, 2, 3]
+    assert loaded["name"].tolist() == ["Track1 v3", "Track2 v2", "Track3 v2"]
@@ -0,0 +1,28 @@
+import pandas as pd
+from storage.upsert import upsert_records
+
+
+def test_upsert_records_replaces_and_inserts():
+    existing = pd.DataFrame({"id": [1, 2, 3], "name": ["a", "b", "c"]})
+    changes = pd.DataFrame({"id": [2, 4], "name": ["b2", "d"]})
+
+    result = upsert_records(existing, changes, "id")
+
+    assert sorted(result["id"].tolist()) == [1, 2, 3, 4]
+    assert result.set_index("id").loc[2, "name"] == "b2"
+
+
+def test_upsert_records_replaces_every_row_of_a_key():
+    existing = pd.DataFrame({"user_id": [1, 1, 2], "track_id": [10, 11, 20]})
+    changes = pd.DataFrame({"user_id": [1], "track_id": [12]})
+
+    result = upsert_records(existing, changes, "user_id")
+
+    assert result.sort_values("track_id")["track_id"].tolist() == [12, 20]
+
+
+def test_upsert_records_empty_inputs():
+    existing = pd.DataFrame({"id": [1], "name": ["a"]})
+
+    assert upsert_records(existing, existing.iloc[0:0], "id").equals(existing)
+    assert upsert_records(pd.DataFrame(), existing, "id").equals(existing)
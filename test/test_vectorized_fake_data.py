@@ -0,0 +1,51 @@
+import datetime
+
+import pytest
+
+from src.moovitamix_fastapi.vectorized_fake_data import VectorizedFakeDataGenerator
+
+NOW = datetime.datetime(2024, 10, 1, 12, 0, 0)
+
+
+@pytest.fixture(scope="module")
+def fake_data():
+    return VectorizedFakeDataGenerator(5000, seed=42, now=NOW).generate_fake_data()
+
+
+def test_generate_fake_data_sizes_and_unique_ids(fake_data):
+    tracks, users, listen_history = fake_data
+
+    assert len(tracks) == len(users) == len(listen_history) == 5000
+    assert len({track.id for track in tracks}) == 5000
+    assert len({user.id for user in users}) == 5000
+    assert [entry.user_id for entry in listen_history] == [user.id for user in users]
+
+
+def test_listen_history_items_are_distinct_known_tracks(fake_data):
+    tracks, _, listen_history = fake_data
+    track_ids = {track.id for track in tracks}
+
+    for entry in listen_history:
+        assert len(entry.items) == 5
+        assert len(set(entry.items)) == 5
+        assert set(entry.items) <= track_ids
+
+
+def test_timestamps_ranges(fake_data):
+    tracks, _, listen_history = fake_data
+
+    assert all(NOW - datetime.timedelta(days=2 * 365) <= track.created_at <= NOW for track in tracks)
+    assert all(NOW - datetime.timedelta(days=365) <= track.updated_at <= NOW for track in tracks)
+    assert all(entry.created_at <= entry.updated_at <= NOW for entry in listen_history)
+
+
+def test_same_seed_same_data():
+    first = VectorizedFakeDataGenerator(100, seed=7, now=NOW).generate_fake_data()
+    second = VectorizedFakeDataGenerator(100, seed=7, now=NOW).generate_fake_data()
+
+    assert first == second
+
+
+def test_tracks_per_user_cannot_exceed_tracks():
+    with pytest.raises(ValueError, match="tracks_per_user cannot be greater than the number of tracks."):
+        VectorizedFakeDataGenerator(3)
@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+from pipeline.write_behind import WriteBehindQueue
+
+
+@pytest.mark.asyncio
+async def test_writes_run_in_the_background_in_order():
+    """
+    Test that submit returns before its write is done, and that drain waits for every write in submission order.
+    """
+    queue = WriteBehindQueue(max_pending=2)
+    release = asyncio.Event()
+    done = []
+
+    async def write(name):
+        await release.wait()
+        done.append(name)
+
+    await queue.submit("tracks", lambda: write("tracks"))
+    await queue.submit("users", lambda: write("users"))
+    assert done == []
+
+    release.set()
+    await queue.drain()
+    assert done == ["tracks", "users"]
+
+
+@pytest.mark.asyncio
+async def test_drain_reports_failed_writes():
+    """
+    Test that a failed write does not stop the following ones, and is reported by drain.
+    """
+    queue = WriteBehindQueue()
+    done = []
+
+    async def fail():
+        raise ValueError("Save error")
+
+    async def write():
+        done.append("users")
+
+    await queue.submit("tracks", fail)
+    await queue.submit("users", write)
+
+    with pytest.raises(RuntimeError, match="tracks") as error:
+        await queue.drain()
+    assert isinstance(error.value.__cause__, ValueError)
+    assert done == ["users"]
+
+    # The queue can be used again after a drain
+    await queue.submit("users", write)
+    await queue.drain()
+    assert done == ["users", "users"]